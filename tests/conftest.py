@@ -0,0 +1,173 @@
+"""
+Shared fixtures: a local stand-in for the open data portal, and a cache using it.
+
+The stand-in serves each dataset the way the portal does: the full CSV
+download (with an ETag, answering a matching If-None-Match with 304) and the
+filtered, paged query API that winnipeg_data.incremental uses. Like the
+portal, the query API can answer rows with tied times in a different order
+on each request (shuffle_ties), unless they are also ordered by row id
+(`:id`, the row's position). Every request is recorded, so the tests can
+check what was downloaded.
+"""
+import hashlib
+import re
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from winnipeg_data.cache import DatasetCache
+from winnipeg_data.incremental import api_field_name
+from winnipeg_data.schemas import SCHEMAS, SOCRATA_TIMESTAMP, SODA_TIMESTAMP
+
+
+class Portal:
+    """The datasets to serve (id -> DataFrame of the portal's text values) and the requests made."""
+
+    def __init__(self, shuffle_ties=False):
+        self.datasets = {}
+        self.shuffle_ties = shuffle_ties
+        self.rng = np.random.default_rng(0)
+        # (path, status) of each request
+        self.requests = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), PortalHandler)
+        self.server.portal = self
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def paths(self, status=None):
+        return [path for path, s in self.requests if status is None or s == status]
+
+    def csv(self, dataset_id):
+        return self.datasets[dataset_id].to_csv(index=False).encode()
+
+    def etag(self, dataset_id):
+        return '"' + hashlib.sha256(self.csv(dataset_id)).hexdigest()[:16] + '"'
+
+    def query(self, dataset_id, params):
+        """Answer a query like `$where=time >= '...'&$order=time,:id&$limit=...&$offset=...`."""
+        frame = self.datasets[dataset_id]
+        fields = {api_field_name(column): column for column in frame}
+        fields[':id'] = ':id'
+        field, operator, since = re.fullmatch(r"(\w+) (>=?) '(.*)'", params['$where']).groups()
+        time_column = fields[field]
+        times = pd.to_datetime(frame[time_column], format=SCHEMAS[dataset_id].dates[time_column])
+        since = pd.Timestamp(since)
+        rows = frame.assign(**{time_column: times, ':id': np.arange(len(frame))})
+        rows = rows[times >= since if operator == '>=' else times > since]
+        if self.shuffle_ties:
+            rows = rows.sample(frac=1, random_state=self.rng)
+        rows = rows.sort_values([fields[f] for f in params['$order'].split(',')], kind='stable')
+        offset, limit = int(params['$offset']), int(params['$limit'])
+        rows = rows.iloc[offset:offset + limit].drop(columns=':id')
+        rows[time_column] = rows[time_column].dt.strftime(SODA_TIMESTAMP)
+        return rows.rename(columns=api_field_name).to_csv(index=False).encode()
+
+
+class PortalHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        portal = self.server.portal
+        url = urllib.parse.urlsplit(self.path)
+        download = re.fullmatch(r'/api/views/([\w-]+)/rows\.csv', url.path)
+        query = re.fullmatch(r'/resource/([\w-]+)\.csv', url.path)
+        dataset_id = (download or query).group(1) if download or query else None
+        if dataset_id not in portal.datasets:
+            self.reply(404, b'')
+        elif download and self.headers.get('If-None-Match') == portal.etag(dataset_id):
+            self.reply(304, b'')
+        elif download:
+            self.reply(200, portal.csv(dataset_id), {'ETag': portal.etag(dataset_id)})
+        else:
+            params = dict(urllib.parse.parse_qsl(url.query))
+            self.reply(200, portal.query(dataset_id, params))
+        portal.requests.append((url.path, self.status))
+
+    def reply(self, status, body, headers=None):
+        self.status = status
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def portal(request):
+    """A running stand-in portal with no datasets (indirect parameter: shuffle_ties)."""
+    portal = Portal(getattr(request, 'param', False))
+    thread = threading.Thread(target=portal.server.serve_forever, daemon=True)
+    thread.start()
+    yield portal
+    portal.server.shutdown()
+    portal.server.server_close()
+
+
+@pytest.fixture
+def cache(portal, tmp_path):
+    """A dataset cache in a temporary directory, fetching from the stand-in portal."""
+    return DatasetCache(tmp_path / 'cache', base_url=portal.url)
+
+
+def make_passups(n, seed=0, start='2019-01-01'):
+    """Make n pass-ups as the portal's CSV has them (one every few hours, in time order)."""
+    rng = np.random.default_rng(seed)
+    times = pd.Timestamp(start) + pd.to_timedelta(np.cumsum(rng.integers(1, 4*3600, n)), unit='s')
+    routes = rng.integers(1, 20, n)
+    return pd.DataFrame({
+        'Pass-Up ID': np.arange(n),
+        'Pass-Up Type': rng.choice(['Full Bus Pass-Up', 'Wheelchair User Pass-Up'], n, p=[0.9, 0.1]),
+        'Time': times.strftime(SOCRATA_TIMESTAMP),
+        'Route Number': routes,
+        'Route Name': [f'Route {r}' for r in routes],
+        'Route Destination': 'Downtown',
+        'Location': [f'POINT ({x:.6f} {y:.6f})'
+                     for x, y in zip(rng.uniform(-97.3, -97.0, n), rng.uniform(49.8, 50.0, n))],
+    })
+
+
+# Names for the synthetic tree inventories and ward boundaries
+TREE_SPECIES = ['American Elm', 'Green Ash', 'Bur Oak', 'Basswood', 'Siberian Elm']
+WARDS = ['Daniel McIntyre', 'Mynarski', 'Point Douglas', 'St. Boniface']
+
+
+def make_squares(names, columns=None, size=0.1, x0=-97.3, y0=49.8):
+    """Make a boundary layer of squares (`columns` a row, all in one by default), as the portal's CSV has it."""
+    columns = columns or len(names)
+    geometries = []
+    for i in range(len(names)):
+        left, bottom = x0 + i % columns * size, y0 + i // columns * size
+        corners = [(left, bottom), (left + size, bottom), (left + size, bottom + size),
+                   (left, bottom + size), (left, bottom)]
+        geometries.append('MULTIPOLYGON (((' + ', '.join(f'{x} {y}' for x, y in corners) + ')))')
+    return pd.DataFrame({'Name': names, 'the_geom': geometries})
+
+
+def make_trees(n, wards, nbhd, seed=0):
+    """
+    Make a tree inventory as the portal's CSV has it, over the given boundaries.
+
+    A few trees are outside them, and a few have no location or diameter.
+    """
+    rng = np.random.default_rng(seed)
+    x, y = rng.uniform(-97.31, -97.09, n), rng.uniform(49.79, 50.01, n)
+    locations = [f'POINT ({a:.6f} {b:.6f})' for a, b in zip(x, y)]
+    locations[:5] = ['', 'POINT (garbage)', '', '', 'POINT (-97.2 49.9)']
+    dbh = rng.gamma(4, 8, n).round().astype(int).astype(object)
+    dbh[rng.random(n) < 0.01] = None
+    return pd.DataFrame({
+        'tree_id': np.arange(n),
+        'nbhd': rng.choice([name.upper() for name in nbhd['Name']], n),
+        'park': None,
+        'ward': rng.choice(wards['Name'], n),
+        'botanical': None,
+        'common': rng.choice(TREE_SPECIES, n, p=[0.4, 0.3, 0.15, 0.1, 0.05]),
+        'dbh': dbh,
+        'the_geom': locations,
+    })
@@ -0,0 +1,83 @@
+"""Tests for the versioned dataset cache (winnipeg_data.cache)."""
+import pandas as pd
+import pytest
+
+from conftest import make_passups
+from winnipeg_data.cache import DatasetCache
+from winnipeg_data.schemas import SCHEMAS
+
+DATASET_ID = 'mer2-irmb'
+SCHEMA = SCHEMAS[DATASET_ID]
+
+
+def test_first_load_downloads_and_parses(portal, cache):
+    portal.datasets[DATASET_ID] = make_passups(50)
+    frame = cache.load(DATASET_ID, schema=SCHEMA)
+
+    assert len(frame) == 50
+    assert portal.paths(200) == [f'/api/views/{DATASET_ID}/rows.csv']
+    assert isinstance(frame['Route Name'].dtype, pd.CategoricalDtype)
+    assert cache.read_metadata(DATASET_ID)['etag'] == portal.etag(DATASET_ID)
+
+
+def test_unchanged_dataset_is_read_from_the_snapshot(portal, cache):
+    portal.datasets[DATASET_ID] = make_passups(50)
+    first = cache.load(DATASET_ID, schema=SCHEMA)
+    meta = cache.read_metadata(DATASET_ID)
+
+    second = cache.load(DATASET_ID, schema=SCHEMA)
+
+    # The second load only asks whether the dataset changed
+    assert [status for _, status in portal.requests] == [200, 304]
+    assert cache.read_metadata(DATASET_ID)['version'] == meta['version']
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_changed_dataset_gets_a_new_snapshot(portal, cache):
+    portal.datasets[DATASET_ID] = make_passups(50)
+    cache.load(DATASET_ID, schema=SCHEMA)
+    old = cache.read_metadata(DATASET_ID)
+
+    portal.datasets[DATASET_ID] = make_passups(60)
+    frame = cache.load(DATASET_ID, schema=SCHEMA)
+    new = cache.read_metadata(DATASET_ID)
+
+    assert len(frame) == 60
+    assert new['version'] != old['version']
+    # Only the current snapshot is kept
+    assert sorted(p.name for p in cache.dataset_dir(DATASET_ID).glob('*.parquet')) == [new['snapshot']]
+
+
+def test_max_age_skips_the_request(portal, tmp_path):
+    portal.datasets[DATASET_ID] = make_passups(50)
+    cache = DatasetCache(tmp_path, base_url=portal.url, max_age=3600)
+    cache.load(DATASET_ID, schema=SCHEMA)
+    cache.load(DATASET_ID, schema=SCHEMA)
+
+    assert len(portal.requests) == 1
+
+
+def test_snapshot_parsed_differently_is_not_reused(portal, cache):
+    portal.datasets[DATASET_ID] = make_passups(50)
+    cache.load(DATASET_ID, schema=SCHEMA)
+
+    # Same ETag, but read without the schema: downloaded and parsed again
+    frame = cache.load(DATASET_ID)
+
+    assert [status for _, status in portal.requests] == [200, 200]
+    assert frame['Time'].dtype == object
+
+
+def test_offline_uses_the_last_snapshot(portal, cache, tmp_path):
+    portal.datasets[DATASET_ID] = make_passups(50)
+    frame = cache.load(DATASET_ID, schema=SCHEMA)
+
+    # Nothing listens on port 1
+    offline = DatasetCache(cache.cache_dir, base_url='http://127.0.0.1:1', timeout=5)
+    with pytest.warns(UserWarning, match='Could not refresh'):
+        stale = offline.load(DATASET_ID, schema=SCHEMA)
+    pd.testing.assert_frame_equal(frame, stale)
+
+    # With no snapshot the error is raised
+    with pytest.raises(OSError):
+        DatasetCache(tmp_path / 'empty', base_url='http://127.0.0.1:1', timeout=5).load(DATASET_ID)
\ No newline at end of file
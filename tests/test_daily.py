@@ -0,0 +1,110 @@
+"""Tests for the prefix-sum daily counts (winnipeg_data.daily) against resample and rolling."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from winnipeg_data.daily import DailyIndex, DailyMatrix
+
+
+@pytest.fixture
+def times():
+    """Event times over a few years (a few missing), starting and ending mid-week."""
+    rng = np.random.default_rng(0)
+    seconds = rng.integers(0, 5*365*86400, 4000)
+    times = pd.DatetimeIndex(pd.Timestamp('2014-03-05 10:00') + pd.to_timedelta(seconds, unit='s'), name='Time')
+    return times.where(rng.random(len(times)) > 0.01)
+
+
+@pytest.fixture
+def daily(times):
+    """The daily totals the way the scripts used to get them."""
+    return pd.Series(1, index=times).loc[times.notna()].resample('D').size()
+
+
+@pytest.mark.parametrize('start, end', [(None, None), ('2015', '2015'), ('2017', '2019'),
+                                        ('2016-02-27', '2016-03-02'), ('2010', '2014-06'), ('2030', None)])
+def test_slices_match_resample(times, daily, start, end):
+    index = DailyIndex.from_times(times)
+
+    pd.testing.assert_series_equal(index.series(start, end), daily.loc[start:end])
+    assert index.total(start, end) == daily.loc[start:end].sum()
+    pd.testing.assert_series_equal(index.loc(start, end).series(), daily.loc[start:end])
+
+
+@pytest.mark.parametrize('start, end', [(None, None), ('2015', '2015'), ('2017', '2019')])
+def test_weekly_sums_match_resample(daily, times, start, end):
+    index = DailyIndex.from_times(times)
+
+    pd.testing.assert_series_equal(index.weekly(start, end), daily.resample('W').sum().loc[start:end])
+    pd.testing.assert_series_equal(index.weekly(start, end, kind='period'),
+                                   daily.to_period('D').resample('W').sum().loc[start:end])
+
+
+@pytest.mark.parametrize('window', [7, 4, 30])
+@pytest.mark.parametrize('start, end', [(None, None), ('2015', '2015'), ('2014-03', '2014-03')])
+def test_rolling_means_match_rolling(times, daily, window, start, end):
+    index = DailyIndex.from_times(times)
+
+    expected = daily.rolling(window, center=True).mean().loc[start:end]
+    pd.testing.assert_series_equal(index.rolling(window, start, end), expected)
+
+
+def test_values_and_yearly_totals_match_groupby(times):
+    values = np.random.default_rng(1).integers(0, 500, len(times))
+    frame = pd.DataFrame({'Count': values}, index=times).loc[times.notna()]
+
+    index = DailyIndex.from_times(times, values)
+
+    # (the index's totals have no name)
+    daily = frame['Count'].resample('D').sum().rename(None)
+    pd.testing.assert_series_equal(index.series(), daily)
+    # (pandas gives the years as int32)
+    pd.testing.assert_series_equal(index.yearly(), daily.groupby(daily.index.year).sum(), check_index_type=False)
+
+
+@pytest.fixture
+def routes(times):
+    """A route for each event (a few missing), one of them with no events at all."""
+    rng = np.random.default_rng(2)
+    names = np.array(['11', '16', '18', '21', '47', 'BLUE'], dtype=object)
+    routes = pd.Series(names[rng.choice(len(names), len(times), p=[0.3, 0.2, 0.2, 0.15, 0.1, 0.05])])
+    return pd.Categorical(routes.mask(rng.random(len(times)) < 0.01), categories=list(names) + ['999'])
+
+
+@pytest.fixture
+def route_days(times, routes):
+    """The daily totals for each route, the way pandas would get them."""
+    frame = pd.DataFrame({'Route Name': routes}, index=times).dropna()
+    daily = frame.groupby([pd.Grouper(freq='D'), 'Route Name'], observed=True).size().unstack(fill_value=0)
+    daily.columns = daily.columns.astype(object)
+    return daily.asfreq('D', fill_value=0).rename_axis(columns=None)
+
+
+def test_route_matrix_matches_resample(times, routes, route_days):
+    matrix = DailyMatrix.from_events(times, routes)
+
+    pd.testing.assert_index_equal(matrix.labels, route_days.columns)
+    # (the matrix stores the counts as int16)
+    pd.testing.assert_frame_equal(matrix.series(), route_days, check_dtype=False)
+    pd.testing.assert_frame_equal(matrix.weekly(), route_days.resample('W').sum())
+    pd.testing.assert_frame_equal(matrix.rolling(7, '2016', '2016'),
+                                  route_days.rolling(7, center=True).mean().loc['2016'])
+    # (pandas gives the years as int32)
+    pd.testing.assert_frame_equal(matrix.yearly(), route_days.groupby(route_days.index.year).sum(),
+                                  check_index_type=False)
+    pd.testing.assert_series_equal(matrix.ranking('2015', '2017'),
+                                   route_days.loc['2015':'2017'].sum().sort_values(ascending=False))
+
+
+def test_route_rows_match_one_route(times, routes, route_days):
+    matrix = DailyMatrix.from_events(times, routes)
+
+    # A route's row counts the same days as resampling its events alone
+    # (its own first and last day aside)
+    row = matrix.row('BLUE')
+    blue = pd.Series(1, index=times[(routes == 'BLUE') & times.notna()]).resample('D').size()
+    pd.testing.assert_series_equal(row.trimmed().series(), blue, check_dtype=False)
+    pd.testing.assert_series_equal(row.rolling(30), route_days['BLUE'].rolling(30, center=True).mean().rename(None))
+
+    pd.testing.assert_frame_equal(matrix.take(['47', '11']).rolling(7),
+                                  route_days[['47', '11']].rolling(7, center=True).mean())
\ No newline at end of file
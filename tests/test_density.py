@@ -0,0 +1,107 @@
+"""Tests for the kernel density estimates and bandwidth selection."""
+import numpy as np
+import pytest
+from scipy.special import logsumexp
+
+from winnipeg_data.bandwidth import score_bandwidth, scott_bandwidth, select_bandwidth
+from winnipeg_data.kde import binned_kde, error_bound, fine_spacing
+
+BANDWIDTHS = [100, 200, 400]
+
+
+@pytest.fixture
+def points():
+    """Points (in metres) in a few clusters, and the same points with some missing coordinates."""
+    rng = np.random.default_rng(0)
+    centres = rng.uniform(0, 5000, (4, 2))
+    x, y = (centres[rng.integers(0, 4, 400)] + rng.normal(0, 300, (400, 2))).T
+    with_missing_x = np.insert(x, [0, 100, 400, 400], [np.nan, 1000, np.inf, np.nan])
+    with_missing_y = np.insert(y, [0, 100, 400, 400], [2000, np.nan, 3000, np.nan])
+    return (x, y), (with_missing_x, with_missing_y)
+
+
+def test_binned_kde_leaves_out_missing_points(points):
+    (x, y), (x_missing, y_missing) = points
+    xgrid, ygrid = np.linspace(-1000, 6000, 71), np.linspace(-1000, 6000, 61)
+
+    density = binned_kde(x_missing, y_missing, 250, xgrid, ygrid)
+
+    np.testing.assert_array_equal(density, binned_kde(x, y, 250, xgrid, ygrid))
+    # ...and agrees with the exact estimate to within the error bound
+    exact = np.exp(-0.5*((xgrid[None, :, None] - x)**2 + (ygrid[:, None, None] - y)**2) / 250**2)
+    exact = exact.sum(axis=2) / (2*np.pi*250**2) / len(x)
+    _, fine = fine_spacing(xgrid[1] - xgrid[0], 250, 4)
+    assert np.abs(density - exact).max() <= error_bound(250, fine, fine)
+
+
+def test_scott_bandwidth_leaves_out_missing_points(points):
+    (x, y), (x_missing, y_missing) = points
+    assert np.isfinite(scott_bandwidth(x_missing, y_missing))
+    assert scott_bandwidth(x_missing, y_missing) == scott_bandwidth(x, y)
+
+
+@pytest.mark.parametrize('method', ['likelihood', 'lscv'])
+def test_select_bandwidth_leaves_out_missing_points(points, method):
+    (x, y), (x_missing, y_missing) = points
+
+    search = select_bandwidth(x_missing, y_missing, BANDWIDTHS, method=method, n_jobs=1)
+
+    expected = select_bandwidth(x, y, BANDWIDTHS, method=method, n_jobs=1)
+    assert np.isfinite(search.cv_results_['mean_test_score']).all()
+    np.testing.assert_allclose(search.cv_results_['mean_test_score'],
+                               expected.cv_results_['mean_test_score'])
+    assert search.best_params_ == expected.best_params_
+
+
+def test_select_bandwidth_samples_the_points_with_coordinates(points):
+    _, (x_missing, y_missing) = points
+    search = select_bandwidth(x_missing, y_missing, BANDWIDTHS, sample_size=100, n_jobs=1)
+    assert np.isfinite(search.cv_results_['mean_test_score']).all()
+    assert (search.cv_results_['ci_low'] < search.cv_results_['ci_high']).all()
+
+
+
+def exact_scores(x, y, bandwidth, method):
+    """Score every point by brute force, from every pair of points."""
+    squared_distances = (x[:, None] - x)**2 + (y[:, None] - y)**2
+    # (summed in log space, so that isolated points don't underflow)
+    log_kernels = -0.5*squared_distances / bandwidth**2
+    np.fill_diagonal(log_kernels, -np.inf)
+    log_loo = logsumexp(log_kernels, axis=1) - np.log((len(x) - 1) * 2*np.pi*bandwidth**2)
+    if method == 'likelihood':
+        return log_loo
+    loo = np.exp(log_loo)
+    wide = np.sqrt(2) * bandwidth
+    squared = np.exp(-0.5*squared_distances / wide**2).sum() / (2*np.pi*wide**2) / len(x)**2
+    return 2*loo - squared
+
+
+@pytest.mark.parametrize('method', ['likelihood', 'lscv'])
+@pytest.mark.parametrize('bandwidth, max_cells', [(200, 2048), (100, 2048), (50, 2048), (50, 64), (20, 64)])
+def test_scores_match_the_exact_scores(points, method, bandwidth, max_cells):
+    (x, y), _ = points
+
+    scores = score_bandwidth(x, y, bandwidth, method, max_cells=max_cells)
+
+    # On a grid fine enough for the kernel the scores are binned; with the grid
+    # capped at 64 cells a side they are too narrow for it and worked out exactly
+    # (the lscv scores are near zero, so the tolerances are relative to the
+    # largest: the kernels are cut off at 5 bandwidths, where they are about
+    # 4e-6 of their peak, and binning costs a few parts in a thousand)
+    expected = exact_scores(x, y, bandwidth, method)
+    scale = np.abs(expected).max()
+    if max_cells == 64:
+        np.testing.assert_allclose(scores, expected, rtol=0, atol=1e-5*scale)
+    else:
+        assert scores.mean() == pytest.approx(expected.mean(), abs=5e-3*scale)
+
+
+def test_narrow_bandwidths_are_picked_with_a_capped_grid(points):
+    (x, y), _ = points
+    bandwidths = [10, 20, 40, 80, 160]
+
+    search = select_bandwidth(x, y, bandwidths, max_cells=64, n_jobs=1)
+
+    expected = [exact_scores(x, y, h, 'likelihood').mean() for h in bandwidths]
+    np.testing.assert_allclose(search.cv_results_['mean_test_score'], expected, rtol=1e-3)
+    assert search.best_params_['bandwidth'] == bandwidths[int(np.argmax(expected))]
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""Tests for the incremental refresh of append-only datasets (winnipeg_data.incremental)."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import make_passups
+from winnipeg_data.cache import DatasetCache
+from winnipeg_data.incremental import refresh_dataset
+from winnipeg_data.temporal import BREAKDOWNS
+
+DATASET_ID = 'mer2-irmb'
+
+
+def assert_counts_equal(counts, expected):
+    assert sorted(counts.categories) == sorted(expected.categories)
+    for breakdown in BREAKDOWNS:
+        pd.testing.assert_series_equal(counts.get(breakdown), expected.get(breakdown))
+        for category in expected.categories:
+            pd.testing.assert_series_equal(counts.get(breakdown, category),
+                                           expected.get(breakdown, category))
+
+
+def test_refresh_matches_a_full_recount(portal, cache, tmp_path):
+    passups = make_passups(500)
+    portal.datasets[DATASET_ID] = passups[:300]
+    refresh_dataset(DATASET_ID, cache)
+
+    # Only the new rows are fetched, a page at a time
+    portal.datasets[DATASET_ID] = passups
+    portal.requests.clear()
+    frame, counts = refresh_dataset(DATASET_ID, cache, page_size=64)
+    assert portal.paths() == [f'/resource/{DATASET_ID}.csv'] * 4
+
+    # Compare with a full download and count into an empty cache
+    fresh = DatasetCache(tmp_path / 'fresh', base_url=portal.url)
+    expected_frame, expected_counts = refresh_dataset(DATASET_ID, fresh)
+    pd.testing.assert_frame_equal(frame, expected_frame, check_categorical=False)
+    assert_counts_equal(counts, expected_counts)
+
+    # With nothing new, the snapshot and stored counts are read back as they were left
+    portal.requests.clear()
+    stored_frame, stored = refresh_dataset(DATASET_ID, cache)
+    assert portal.paths() == [f'/resource/{DATASET_ID}.csv']
+    pd.testing.assert_frame_equal(stored_frame, frame)
+    assert_counts_equal(stored, expected_counts)
+
+
+def tied_passups(n, ties=7):
+    """Make n pass-ups with each time shared by `ties` of them (the portal's times are to the second)."""
+    passups = make_passups(n)
+    passups['Time'] = np.repeat(passups['Time'].to_numpy()[::ties], ties)[:n]
+    return passups
+
+
+def assert_matches_a_full_load(frame, counts, portal, tmp_path):
+    fresh = DatasetCache(tmp_path / 'fresh', base_url=portal.url)
+    expected_frame, expected_counts = refresh_dataset(DATASET_ID, fresh)
+    pd.testing.assert_frame_equal(frame, expected_frame, check_categorical=False)
+    assert_counts_equal(counts, expected_counts)
+
+
+@pytest.mark.parametrize('portal', [True], indirect=True, ids=['shuffle_ties'])
+def test_paging_through_tied_times(portal, cache, tmp_path):
+    # The first snapshot ends part way through a run of tied times, and the
+    # portal answers the tied rows in a different order on each request
+    passups = tied_passups(500)
+    portal.datasets[DATASET_ID] = passups[:300]
+    refresh_dataset(DATASET_ID, cache)
+
+    portal.datasets[DATASET_ID] = passups
+    frame, counts = refresh_dataset(DATASET_ID, cache, page_size=16)
+
+    assert len(portal.paths()) > 10
+    assert_matches_a_full_load(frame, counts, portal, tmp_path)
+
+
+def test_rows_published_later_at_the_high_water_mark(portal, cache, tmp_path):
+    passups = tied_passups(300)
+    portal.datasets[DATASET_ID] = passups
+    refresh_dataset(DATASET_ID, cache)
+
+    # Two more rows with the last time: a new one, and a copy of one already there
+    late = passups.iloc[[-1, -1]].assign(**{'Route Name': ['Route 99', passups['Route Name'].iloc[-1]]})
+    portal.datasets[DATASET_ID] = pd.concat([passups, late], ignore_index=True)
+    frame, counts = refresh_dataset(DATASET_ID, cache)
+
+    assert len(frame) == 302
+    assert_matches_a_full_load(frame, counts, portal, tmp_path)
+
+
+def test_snapshot_without_the_schema_is_downloaded_again(portal, cache):
+    portal.datasets[DATASET_ID] = make_passups(100)
+    cache.load(DATASET_ID)
+
+    frame, counts = refresh_dataset(DATASET_ID, cache)
+
+    assert portal.paths() == [f'/api/views/{DATASET_ID}/rows.csv'] * 2
+    assert pd.api.types.is_datetime64_any_dtype(frame['Time'])
+    assert counts.counts('year').sum() == 100
+
+
+def test_empty_snapshot_is_downloaded_again(portal, cache):
+    passups = make_passups(100)
+    portal.datasets[DATASET_ID] = passups[:0]
+    frame, _ = refresh_dataset(DATASET_ID, cache)
+    assert len(frame) == 0
+
+    # There is no high-water mark to query from, so everything is downloaded
+    portal.datasets[DATASET_ID] = passups
+    frame, counts = refresh_dataset(DATASET_ID, cache)
+
+    assert f'/resource/{DATASET_ID}.csv' not in portal.paths()
+    assert len(frame) == 100
+    assert counts.counts('year').sum() == 100
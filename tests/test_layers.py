@@ -0,0 +1,70 @@
+"""Tests for the shared reference layers and concurrent loading (winnipeg_data.layers)."""
+import pandas as pd
+import pytest
+
+from conftest import make_passups, make_squares
+from winnipeg_data import boundary_store, cache as cache_module, layers
+
+CITY_ID = '2nyq-f444'
+WARDS_ID = 't4cg-yaxs'
+PASSUPS_ID = 'mer2-irmb'
+
+
+@pytest.fixture
+def shared(portal, cache, monkeypatch):
+    """Make the stand-in portal's cache the shared one, with no layers loaded."""
+    monkeypatch.setattr(cache_module, '_default_cache', cache)
+    layers.clear()
+    portal.datasets[CITY_ID] = make_squares(['Winnipeg'])
+    portal.datasets[WARDS_ID] = make_squares(['Daniel McIntyre', 'Point Douglas', 'Mynarski'])
+    yield cache
+    layers.clear()
+
+
+def test_layer_is_loaded_once_and_copied(portal, shared):
+    city = layers.get_layer(CITY_ID)
+    city['Name'] = 'Changed'
+    again = layers.get_layer(CITY_ID)
+
+    assert portal.paths() == [f'/api/views/{CITY_ID}/rows.csv']
+    assert again['Name'].tolist() == ['Winnipeg']
+    assert again.crs == 'EPSG:4326'
+    # About 7.2 km by 11.1 km
+    assert again['Area'].iloc[0] == pytest.approx(80, rel=0.02)
+
+    projected = layers.get_layer(CITY_ID, crs='EPSG:32614')
+    assert projected.crs == 'EPSG:32614'
+    assert projected.area.iloc[0] / 1e6 == pytest.approx(again['Area'].iloc[0])
+
+
+def test_stored_layer_is_not_built_again(portal, shared, monkeypatch):
+    built = layers.get_layer(WARDS_ID)
+
+    # A new process (no shared layers) reads the finished layer from the store
+    layers.clear()
+    monkeypatch.setattr(boundary_store, 'build_layer', None)
+    stored = layers.get_layer(WARDS_ID)
+
+    assert [status for _, status in portal.requests] == [200, 304]
+    pd.testing.assert_frame_equal(pd.DataFrame(stored), pd.DataFrame(built))
+
+
+def test_failed_load_is_tried_again(portal, shared):
+    del portal.datasets[CITY_ID]
+    with pytest.raises(OSError):
+        layers.get_layer(CITY_ID)
+
+    portal.datasets[CITY_ID] = make_squares(['Winnipeg'])
+    assert layers.get_layer(CITY_ID)['Name'].tolist() == ['Winnipeg']
+
+
+def test_load_all_returns_datasets_then_layers(portal, shared):
+    portal.datasets[PASSUPS_ID] = make_passups(50)
+    passups, city, wards = layers.load_all([PASSUPS_ID], [CITY_ID, WARDS_ID])
+
+    assert len(passups) == 50 and pd.api.types.is_datetime64_any_dtype(passups['Time'])
+    assert city['Name'].tolist() == ['Winnipeg']
+    assert wards['Name'].tolist() == ['Daniel McIntyre', 'Point Douglas', 'Mynarski']
+    assert wards.geometry.is_valid.all()
+    # Each dataset is downloaded once
+    assert sorted(portal.paths(200)) == sorted(f'/api/views/{i}/rows.csv' for i in (PASSUPS_ID, CITY_ID, WARDS_ID))
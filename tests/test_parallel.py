@@ -0,0 +1,82 @@
+"""Tests that the partitioned steps (winnipeg_data.parallel) give the same results as one process."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import WARDS, make_passups, make_squares, make_trees
+from winnipeg_data import cache as cache_module, layers, passups, trees
+from winnipeg_data.parallel import run_partitioned, split
+from winnipeg_data.schemas import SCHEMAS
+from winnipeg_data.temporal import BREAKDOWNS, TemporalCounts, count_events
+
+CITY_ID = '2nyq-f444'
+
+
+def sum_partition(rows, context):
+    return np.bincount(rows['key'], rows['value'], context['n_keys'])
+
+
+@pytest.mark.parametrize('by_key', [False, True])
+def test_partial_results_add_up(by_key):
+    rng = np.random.default_rng(0)
+    columns = {'key': rng.integers(0, 7, 10000), 'value': rng.random(10000)}
+    order, partitions = split(10000, 2, columns['key'] if by_key else None)
+
+    partials = run_partitioned(sum_partition, columns, partitions, order, {'n_keys': 7}, processes=2)
+
+    assert len(partials) == len(partitions)
+    np.testing.assert_allclose(np.sum(partials, axis=0), np.bincount(columns['key'], columns['value']))
+
+
+def test_count_events_by_year_matches_one_pass():
+    frame = SCHEMAS['mer2-irmb'].convert(make_passups(5000))
+
+    counts = count_events(frame['Time'], frame['Pass-Up Type'], processes=2)
+
+    expected = TemporalCounts(frame['Time'], frame['Pass-Up Type'])
+    assert (counts.first_year, counts.first_day) == (expected.first_year, expected.first_day)
+    for breakdown in BREAKDOWNS:
+        for kind in expected.categories:
+            pd.testing.assert_series_equal(counts.get(breakdown, kind), expected.get(breakdown, kind))
+
+
+@pytest.mark.parametrize('partition_by', [None, 'ward'])
+@pytest.mark.parametrize('assign_by_geometry', [True, False])
+def test_tree_summary_matches_one_process(monkeypatch, partition_by, assign_by_geometry):
+    monkeypatch.setenv('WINNIPEG_DATA_MEMO_SIZE', '0')
+    wards = make_squares(WARDS, 2)
+    nbhd = make_squares([f'Neighbourhood {i}' for i in range(16)], 4, size=0.05)
+    frame = SCHEMAS[trees.TREE_ID].convert(make_trees(5000, wards, nbhd))
+
+    results = trees.summarize(frame, wards, nbhd, assign_by_geometry, processes=2, partition_by=partition_by)
+
+    expected = trees.summarize(frame, wards, nbhd, assign_by_geometry, processes=1)
+    for name in ['errors', 'outside_wards', 'outside_nbhds', 'trees_by_ward', 'trees_by_neighbourhood',
+                 'tree_species_stats', 'ward_stats', 'nbhd_stats', 'dbh_histograms']:
+        # (the merged means and variances can differ in the last few bits)
+        if isinstance(expected[name], pd.DataFrame):
+            pd.testing.assert_frame_equal(results[name], expected[name], check_exact=False, rtol=1e-12)
+        elif isinstance(expected[name], pd.Series):
+            pd.testing.assert_series_equal(results[name], expected[name], check_exact=False, rtol=1e-12)
+        else:
+            assert results[name] == expected[name]
+
+
+@pytest.mark.parametrize('partition_by', [None, 'year', 'Route Name'])
+def test_located_passups_match_one_process(portal, cache, monkeypatch, partition_by):
+    monkeypatch.setattr(cache_module, '_default_cache', cache)
+    layers.clear()
+    # The city covers only part of the pass-ups
+    portal.datasets[CITY_ID] = make_squares(['Winnipeg'], size=0.15)
+    frame = SCHEMAS[passups.DATASET_ID].convert(make_passups(5000)).set_index('Time')
+
+    located, _, errors = passups.locate(frame, processes=2, partition_by=partition_by)
+
+    expected, _, expected_errors = passups.locate(frame, processes=1)
+    layers.clear()
+    assert errors == expected_errors
+    assert 0 < len(located) < len(frame)
+    np.testing.assert_array_equal(located.index, expected.index)
+    np.testing.assert_array_equal(located.x, expected.x)
+    np.testing.assert_array_equal(located.y, expected.y)
+    assert located['Route Name'].equals(expected['Route Name'])
@@ -0,0 +1,109 @@
+"""Tests for the query service's parsing and answers (winnipeg_data.service)."""
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from winnipeg_data import service
+from winnipeg_data.service import QueryService, make_server
+
+DIMENSIONS = ['Pass-Up Type', 'Route Name']
+
+
+@pytest.fixture
+def passups():
+    rng = np.random.default_rng(0)
+    n = 2000
+    times = pd.Timestamp('2018-06-01') + pd.to_timedelta(rng.integers(0, 3*365*86400, n), unit='s')
+    times = times.where(rng.random(n) > 0.01)
+    return pd.DataFrame({
+        'Time': times,
+        'Pass-Up Type': rng.choice(['Full Bus Pass-Up', 'Wheelchair User Pass-Up'], n),
+        'Route Name': rng.choice(['Route 11', 'Route 18', 'Route 20'], n),
+    })
+
+
+@pytest.fixture
+def query_service(passups, monkeypatch):
+    monkeypatch.setattr(service, 'DATASETS', {'passups': (lambda: passups, 'Time', DIMENSIONS, None)})
+    return QueryService(['passups'])
+
+
+def test_parse_puts_the_query_in_a_standard_order(query_service):
+    first = query_service.parse('passups', {'route_name': ['Route 18', 'Route 11'],
+                                            'Pass-Up Type': ['Full Bus Pass-Up'],
+                                            'hour': ['8', '7'], 'by': ['year,hour']})
+    second = query_service.parse('passups', {'hour': ['7', '8'], 'by': ['year', 'hour'],
+                                             'pass_up_type': ['Full Bus Pass-Up'],
+                                             'Route Name': ['Route 11', 'Route 18']})
+
+    assert first == second
+    assert first == ('passups',
+                     (('Pass-Up Type', ('Full Bus Pass-Up',)), ('Route Name', ('Route 11', 'Route 18'))),
+                     (('hour', (7, 8)),), None, None, ('year', 'hour'))
+
+
+def test_parse_intersects_the_year_with_the_time_range(query_service):
+    year_first = query_service.parse('passups', {'year': ['2019'], 'start': ['2019-03-01']})
+    start_first = query_service.parse('passups', {'start': ['2019-03-01'], 'year': ['2019']})
+    assert year_first == start_first
+    assert year_first[3:5] == ('2019-03-01 00:00:00', '2020-01-01 00:00:00')
+
+    wider = query_service.parse('passups', {'end': ['2021-01-01'], 'year': ['2019']})
+    assert wider[3:5] == ('2019-01-01 00:00:00', '2020-01-01 00:00:00')
+
+
+def test_disjoint_time_ranges_match_nothing(query_service):
+    result = query_service.query('passups', {'year': ['2019'], 'start': ['2020-06-01'], 'by': ['hour']})
+    assert result['rows'] == []
+
+
+def test_unknown_names_are_errors(query_service):
+    with pytest.raises(ValueError, match='Unknown dimension'):
+        query_service.parse('passups', {'colour': ['red']})
+    with pytest.raises(ValueError, match='Unknown dimension'):
+        query_service.parse('passups', {'by': ['hour,colour']})
+    with pytest.raises(KeyError):
+        query_service.parse('trees', {})
+
+
+def test_counts_match_pandas(query_service, passups):
+    result = query_service.query('passups', {'route_name': ['Route 11', 'Route 20'], 'year': ['2019'],
+                                             'start': ['2019-04-01'], 'dayofweek': ['5', '6'],
+                                             'by': ['month,pass_up_type']})
+
+    times = passups['Time']
+    selected = passups[passups['Route Name'].isin(['Route 11', 'Route 20'])
+                       & (times >= '2019-04-01') & (times < '2020-01-01')
+                       & times.dt.dayofweek.isin([5, 6])]
+    expected = selected.groupby([selected['Time'].dt.month, 'Pass-Up Type']).size()
+    assert result['columns'] == ['month', 'pass_up_type', 'count']
+    assert result['rows'] == [[month, kind, count] for (month, kind), count in expected.items()]
+
+    # Asked again (differently), the answer comes from the cache
+    again = query_service.query('passups', {'by': ['month', 'pass_up_type'], 'dayofweek': ['6', '5'],
+                                            'start': ['2019-04-01'], 'year': ['2019'],
+                                            'Route Name': ['Route 20', 'Route 11']})
+    assert again['cached'] and again['rows'] == result['rows']
+
+
+def test_http_errors(query_service):
+    server = make_server(query_service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}'
+    try:
+        with urllib.request.urlopen(f'{url}/query/passups?by=year') as response:
+            rows = json.load(response)['rows']
+        assert sum(count for _, count in rows) == query_service.indexes['passups'].sorted_ns.size
+
+        for path, status in [('/query/passups?colour=red', 400), ('/query/trees', 404), ('/nowhere', 404)]:
+            with pytest.raises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen(url + path)
+            assert error.value.code == status
+    finally:
+        server.shutdown()
+        server.server_close()
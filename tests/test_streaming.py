@@ -0,0 +1,90 @@
+"""Tests for the chunked tree inventory statistics (winnipeg_data.streaming, trees.stream)."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import WARDS, make_squares, make_trees
+from winnipeg_data import trees
+from winnipeg_data.schemas import SCHEMAS
+from winnipeg_data.streaming import GroupStats
+
+@pytest.fixture
+def no_memo(monkeypatch):
+    monkeypatch.setenv('WINNIPEG_DATA_MEMO_SIZE', '0')
+
+
+@pytest.fixture
+def inventory(tmp_path):
+    """A tree inventory CSV and its ward and neighbourhood boundaries."""
+    wards = make_squares(WARDS, 2)
+    nbhd = make_squares([f'Neighbourhood {i}' for i in range(16)], 4, size=0.05)
+    path = tmp_path / 'trees.csv'
+    make_trees(3000, wards, nbhd).to_csv(path, index=False)
+    return path, wards, nbhd
+
+
+TABLES = ['errors', 'outside_wards', 'outside_nbhds', 'trees_by_ward', 'trees_by_neighbourhood',
+          'unknown_nbhds', 'missing_nbhds', 'densest_nbhds', 'tree_species_stats', 'ward_stats',
+          'nbhd_stats', 'dbh_histograms']
+
+
+def assert_same(streamed, expected):
+    if isinstance(expected, pd.DataFrame):
+        pd.testing.assert_frame_equal(streamed, expected, check_exact=False, rtol=1e-12)
+    elif isinstance(expected, pd.Series):
+        pd.testing.assert_series_equal(streamed, expected, check_exact=False, rtol=1e-12)
+    else:
+        assert streamed == expected
+
+
+@pytest.mark.parametrize('assign_by_geometry', [True, False])
+def test_stream_matches_the_in_memory_tables(inventory, no_memo, assign_by_geometry):
+    path, wards, nbhd = inventory
+    frame = SCHEMAS[trees.TREE_ID].read_csv(path)
+
+    streamed = trees.stream(chunksize=257, source=path, wards=wards, nbhd=nbhd,
+                            assign_by_geometry=assign_by_geometry)
+    expected = trees.summarize(frame, wards, nbhd, assign_by_geometry=assign_by_geometry)
+
+    for name in TABLES:
+        assert_same(streamed[name], expected[name])
+
+
+def test_stream_matches_pandas(inventory, no_memo):
+    path, wards, nbhd = inventory
+    frame = pd.read_csv(path)
+
+    streamed = trees.stream(chunksize=100, source=path, wards=wards, nbhd=nbhd, assign_by_geometry=False)
+
+    # The diameter statistics by species (the in-memory groupby the script used)
+    expected = frame.groupby('common')['dbh'].agg(['mean', 'std'])
+    pd.testing.assert_frame_equal(streamed['tree_species_stats'], expected,
+                                  check_exact=False, rtol=1e-12, check_names=False)
+    # The trees by ward label
+    assert streamed['trees_by_ward'].sort_index().to_dict() == frame['ward'].value_counts().to_dict()
+    # The diameter histograms (bins closed on the left)
+    for species, histogram in streamed['dbh_histograms'].iterrows():
+        diameters = frame.loc[frame['common'] == species, 'dbh'].dropna()
+        bins = pd.cut(diameters, trees.DBH_EDGES, right=False).value_counts(sort=False)
+        np.testing.assert_array_equal(histogram.to_numpy(), bins.to_numpy())
+
+
+def test_merged_group_stats_match_one_pass():
+    rng = np.random.default_rng(1)
+    labels = rng.choice(['a', 'b', 'c', 'd'], 1000)
+    labels[:10] = 'c'
+    values = rng.normal(100, 1e-3, 1000)
+    values[::50] = np.nan
+
+    whole = GroupStats(trees.DBH_EDGES)
+    whole.update(labels, values)
+    # (the first chunk has only one group, and the others see them in different orders)
+    merged = GroupStats(trees.DBH_EDGES)
+    for chunk in [slice(0, 10), slice(10, 600), slice(600, 1000)]:
+        part = GroupStats(trees.DBH_EDGES)
+        part.update(labels[chunk], values[chunk])
+        merged.merge(part)
+
+    expected = pd.Series(values).groupby(labels).agg(['size', 'count', 'mean', 'std'])
+    pd.testing.assert_frame_equal(merged.frame(), whole.frame(), check_exact=False, rtol=1e-12)
+    pd.testing.assert_frame_equal(whole.frame(), expected, check_exact=False, rtol=1e-9, check_dtype=False)
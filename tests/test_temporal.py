@@ -0,0 +1,62 @@
+"""Tests for the single-pass temporal breakdowns (winnipeg_data.temporal) against pandas."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from winnipeg_data.temporal import TemporalCounts
+
+TYPES = ['Full Bus Pass-Up', 'Wheelchair User Pass-Up']
+
+
+@pytest.fixture
+def passups():
+    """Pass-ups over a few years (at whole seconds, like the portal's), a few without a time or type."""
+    rng = np.random.default_rng(0)
+    n = 5000
+    seconds = rng.integers(0, 4*365*86400, n)
+    times = pd.DatetimeIndex(pd.Timestamp('2014-12-30') + pd.to_timedelta(seconds, unit='s'), name='Time')
+    times = times.where(rng.random(n) > 0.01)
+    kind = pd.Categorical(rng.choice(TYPES + [None], n, p=[0.85, 0.14, 0.01]), categories=TYPES)
+    return pd.DataFrame({'Pass-Up Type': kind}, index=times)
+
+
+def pandas_breakdowns(passups):
+    """
+    The breakdowns the way the scripts used to work them out.
+
+    (With missing times the groupby keys come out as floats, so the tests
+    don't compare the index types.)
+    """
+    index = passups.index.dropna()
+    return {
+        'time': passups.groupby(passups.index.time).size(),
+        'hour': passups.groupby(passups.index.hour).size(),
+        'month': passups.groupby(passups.index.month).size(),
+        'year': passups.groupby(passups.index.year).size(),
+        'dayofweek': passups.groupby(passups.index.dayofweek).size(),
+        'day': passups.loc[index].resample('D').size(),
+    }
+
+
+@pytest.mark.parametrize('breakdown', ['time', 'hour', 'month', 'year', 'dayofweek', 'day'])
+def test_breakdowns_match_groupby(passups, breakdown):
+    counts = TemporalCounts(passups.index, passups['Pass-Up Type'])
+
+    for kind in TYPES:
+        of_kind = passups[passups['Pass-Up Type'] == kind]
+        expected = pandas_breakdowns(of_kind)[breakdown]
+        pd.testing.assert_series_equal(counts.get(breakdown, kind), expected,
+                                       check_index_type=False)
+
+    # All the types together (the pass-ups without a type are left out)
+    expected = pandas_breakdowns(passups[passups['Pass-Up Type'].notna()])[breakdown]
+    pd.testing.assert_series_equal(counts.get(breakdown), expected,
+                                   check_index_type=False)
+
+
+def test_without_categories_every_timed_event_is_counted(passups):
+    counts = TemporalCounts(passups.index)
+    expected = pandas_breakdowns(passups)
+    for breakdown in ['hour', 'year', 'day']:
+        pd.testing.assert_series_equal(counts.get(breakdown), expected[breakdown],
+                                       check_index_type=False)
@@ -0,0 +1,94 @@
+"""Tests for the incident count tensor (winnipeg_data.tensor) against the pandas tables it replaces."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from winnipeg_data import incidents as incident_analysis
+from winnipeg_data.grouping import group_mode
+from winnipeg_data.temporal import TemporalCounts
+from winnipeg_data.tensor import CountTensor
+
+LIBRARIES = ['Millennium', 'St. Boniface', 'Henderson', 'Cornish']
+TYPES = ['Disturbance', 'Theft', 'Uncategorized', 'Vandalism']
+
+
+@pytest.fixture
+def incidents(monkeypatch):
+    """Library incidents as load gives them, a few with no library or type, and two in 2012."""
+    monkeypatch.setenv('WINNIPEG_DATA_MEMO_SIZE', '0')
+    rng = np.random.default_rng(0)
+    n = 3000
+    seconds = rng.integers(0, 6*365*86400, n)
+    times = pd.Timestamp('2013-01-01') + pd.to_timedelta(seconds, unit='s')
+    times = times[:-2].append(pd.DatetimeIndex(['2012-11-05 14:00', '2012-12-20 09:30']))
+    return pd.DataFrame({
+        'Location': pd.Categorical(rng.choice(LIBRARIES + [None], n, p=[0.5, 0.2, 0.15, 0.1, 0.05]),
+                                   categories=LIBRARIES),
+        'Type': pd.Categorical(rng.choice(TYPES + [None], n, p=[0.4, 0.3, 0.1, 0.15, 0.05]),
+                               categories=TYPES),
+        'Serious': pd.Categorical(rng.choice(['Yes', 'No'], n, p=[0.2, 0.8])),
+    }, index=pd.DatetimeIndex(times, name='Date'))
+
+
+def pandas_tables(incidents):
+    """The tables the way the analysis used to work them out (a groupby or pivot_table each)."""
+    tables = {
+        'by_library': incidents.groupby('Location', observed=True).size().sort_values(ascending=False),
+        'by_seriousness': incidents.groupby('Serious', observed=True).size(),
+        'serious_by_type': incidents[incidents.Serious == 'Yes'].groupby('Type', observed=True).size().sort_values(),
+        'by_type': incidents.groupby('Type', observed=True).size().sort_values(),
+        'by_year': incidents.groupby(incidents.index.year).size(),
+    }
+    incidents = incidents.sort_index().loc['2013':'2023']
+    # The tensor names its time dimensions after the parts
+    year = incidents.index.year.rename('year')
+    tables.update({
+        'by_month': incidents.groupby(incidents.index.month.rename('month')).size(),
+        'by_day_of_week': incidents.groupby(incidents.index.dayofweek.rename('dayofweek')).size(),
+        'by_hour': incidents.groupby(incidents.index.hour.rename('hour')).size(),
+        'most_common_incidents': group_mode(incidents['Location'], incidents['Type']),
+        'most_common_incidents_by_year': group_mode([incidents['Location'], year],
+                                                    incidents['Type']).unstack(level=0).fillna('-'),
+        'by_year_and_type': incidents.pivot_table(index=year, columns='Type', aggfunc='size',
+                                                  observed=True).fillna(0),
+        'by_year_and_library': incidents.pivot_table(index=year, columns='Location', aggfunc='size',
+                                                     observed=True).fillna(0),
+        'by_year_library_type': incidents.pivot_table(index=year, columns=['Location', 'Type'],
+                                                      aggfunc='size', observed=True).fillna(0),
+        'daily_incidents': incidents.resample('D').size(),
+    })
+    return tables
+
+
+def test_tables_match_pandas(incidents):
+    results = incident_analysis.summarize(incidents, TemporalCounts(incidents.index, incidents['Location']))
+
+    # pandas keys calendar fields as int32 where the tensor uses int64
+    for name, expected in pandas_tables(incidents).items():
+        if isinstance(expected, pd.DataFrame):
+            pd.testing.assert_frame_equal(results[name], expected, check_index_type=False, obj=name)
+        else:
+            pd.testing.assert_series_equal(results[name], expected, check_index_type=False, obj=name)
+
+
+
+def test_tensor_matches_groupby(incidents):
+    # A few events with no time are left out of the time dimensions only
+    times = incidents.index.to_series().mask(np.arange(len(incidents)) % 97 == 0)
+    events = incidents.assign(time=times.values, year=times.dt.year.values, hour=times.dt.hour.values)
+    tensor = CountTensor.from_events({column: events[column] for column in ['Location', 'Type', 'Serious']},
+                                     events['time'])
+    assert tensor.total() == len(events)
+
+    expected = events.groupby(['hour', 'Type'], observed=True).size()
+    expected.index = expected.index.set_levels(expected.index.levels[0].astype(np.int64), level=0)
+    pd.testing.assert_series_equal(tensor.marginal('hour', 'Type'), expected)
+
+    serious = events[events.Serious == 'Yes']
+    expected = serious.pivot_table(index='year', columns=['Location', 'Type'], aggfunc='size',
+                                   observed=True).fillna(0)
+    expected.index = expected.index.astype(np.int64)
+    pd.testing.assert_frame_equal(tensor.select(Serious='Yes').table('year', ['Location', 'Type']), expected)
+
+    pd.testing.assert_series_equal(tensor.mode(['Serious', 'Location'], 'Type'),
+                                   group_mode([events['Serious'], events['Location']], events['Type']))
\ No newline at end of file
@@ -0,0 +1,6 @@
+"""
+Shared helpers for the City of Winnipeg Open Data Portal exploration scripts.
+
+The datasets can be browsed here:
+https://data.winnipeg.ca/
+"""
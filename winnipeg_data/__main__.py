@@ -0,0 +1,6 @@
+"""Run the command line interface with python -m winnipeg_data."""
+import sys
+
+from winnipeg_data.cli import main
+
+sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Precomputed boundary layers: both projections, areas, bounding boxes and
+simplified versions for drawing.
+
+The first time a version of a polygon layer (the city, wards or
+neighbourhoods) is loaded, it is projected to EPSG:32614 (metres, for
+Manitoba), its areas and bounding boxes are worked out, and it is simplified
+to several levels of detail, each good to half a pixel when the layer is
+drawn that many pixels across. Everything is kept with the geometries in both
+latitude/longitude and metres (as WKB), in a parquet file next to the cached
+snapshot, so later runs read the finished layer instead of parsing the WKT and
+reprojecting it. A new snapshot of the dataset gets a new store file.
+
+The layers come back as GeoDataFrames in latitude/longitude, with the other
+projection and the simplified versions as extra geometry columns:
+with_crs switches between them without reprojecting, and a LayerPlot (a
+FigureSpec layer) draws the simplified version that suits the size of the
+axes it is drawn on.
+"""
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from winnipeg_data.cache import get_cache
+from winnipeg_data.schemas import SCHEMAS
+
+GEOGRAPHIC = 'EPSG:4326'
+PROJECTED = 'EPSG:32614'
+
+# Levels of detail, in pixels across the layer's larger side
+LEVELS = (250, 500, 1000, 2000, 4000)
+
+# Changes when the layout of the store files does
+FORMAT = hashlib.sha256(repr((GEOGRAPHIC, PROJECTED, LEVELS)).encode()).hexdigest()[:8]
+
+
+def geometry_column(crs, pixels=None):
+    """Get the name of the geometry column for a crs (and level of detail)."""
+    name = 'geom_' + crs.split(':')[-1]
+    return f'{name}_{pixels}px' if pixels else name
+
+
+def bounds_columns(crs):
+    return [f'{side}_{crs.split(":")[-1]}' for side in ('minx', 'miny', 'maxx', 'maxy')]
+
+
+def build_layer(layer):
+    """Work out both projections, the areas, bounding boxes and simplified versions of a layer."""
+    import geopandas as gpd
+
+    geographic = layer.geometry.to_crs(GEOGRAPHIC)
+    projected = geographic.to_crs(PROJECTED)
+    table = pd.DataFrame(layer.drop(columns=layer.geometry.name))
+
+    # Get the area of each polygon (in square kilometres)
+    table['Area'] = projected.area.to_numpy()/1e6
+
+    # Simplify in metres, to half a pixel at each level of detail
+    xmin, ymin, xmax, ymax = projected.total_bounds
+    size = max(xmax - xmin, ymax - ymin)
+    levels = {pixels: projected.simplify(size / pixels / 2) for pixels in LEVELS}
+
+    for crs, geometry in [(GEOGRAPHIC, geographic), (PROJECTED, projected)]:
+        table[geometry_column(crs)] = geometry.values
+        table[bounds_columns(crs)] = geometry.bounds.to_numpy()
+        for pixels, simplified in levels.items():
+            table[geometry_column(crs, pixels)] = simplified.to_crs(crs).values
+    return gpd.GeoDataFrame(table, geometry=geometry_column(GEOGRAPHIC))
+
+
+def write_layer(layer, path):
+    """Store a built layer, with its geometries as WKB."""
+    import shapely
+
+    table = pd.DataFrame(layer)
+    for column in table:
+        if column.startswith('geom_'):
+            table[column] = shapely.to_wkb(table[column].to_numpy())
+    tmp = path.with_suffix('.tmp')
+    table.to_parquet(tmp)
+    os.replace(tmp, path)
+
+
+def read_layer(path):
+    """Read a layer stored with write_layer."""
+    import geopandas as gpd
+    import shapely
+
+    table = pd.read_parquet(path)
+    for column in table:
+        if column.startswith('geom_'):
+            crs = 'EPSG:' + column.split('_')[1]
+            table[column] = gpd.GeoSeries(shapely.from_wkb(table[column].to_numpy()),
+                                          index=table.index, crs=crs)
+    return gpd.GeoDataFrame(table, geometry=geometry_column(GEOGRAPHIC))
+
+
+def load_layer(dataset_id, cache=None):
+    """
+    Load a polygon layer from the store, building it for a new snapshot.
+
+    Returns a GeoDataFrame in latitude/longitude.
+    """
+    from winnipeg_data.layers import as_layer
+
+    cache = cache or get_cache()
+    frame = cache.load(dataset_id, schema=SCHEMAS.get(dataset_id))
+    meta = cache.read_metadata(dataset_id)
+    directory = cache.dataset_dir(dataset_id)
+    path = directory / f'boundaries-{meta["version"]}-{FORMAT}.parquet'
+    if path.exists():
+        layer = read_layer(path)
+    else:
+        layer = build_layer(as_layer(frame))
+        write_layer(layer, path)
+        for old in directory.glob('boundaries-*.parquet'):
+            if old != path:
+                old.unlink()
+    layer.attrs['dataset_id'] = dataset_id
+    return layer
+
+
+def with_crs(layer, crs):
+    """
+    Get a layer in another crs, with the area (km²) of each polygon.
+
+    Layers from the store just switch to their stored geometries; any other
+    GeoDataFrame is reprojected.
+    """
+    if geometry_column(crs) in layer:
+        return layer.set_geometry(geometry_column(crs))
+    layer = layer.to_crs(crs)
+    if 'Area' not in layer:
+        layer['Area'] = layer.geometry.to_crs(PROJECTED).area/1e6
+    return layer
+
+
+def total_bounds(layer):
+    """Get (xmin, ymin, xmax, ymax) of a layer, from its precomputed bounding boxes if it has them."""
+    columns = bounds_columns(layer.crs.to_string())
+    if not all(c in layer for c in columns):
+        return layer.total_bounds
+    minx, miny, maxx, maxy = (layer[c].to_numpy() for c in columns)
+    return np.array([minx.min(), miny.min(), maxx.max(), maxy.max()])
+
+
+class LayerPlot:
+    """A layer to draw at the level of detail that suits the axes."""
+
+    def __init__(self, layer, outline=False):
+        self.layer = layer
+        # Draw the polygons' outlines rather than the polygons
+        self.outline = outline
+
+    def level(self, pixels):
+        """Get the coarsest stored version good enough for `pixels` pixels (or the full one)."""
+        name = self.layer.geometry.name
+        for level in LEVELS:
+            if level >= pixels and f'{name}_{level}px' in self.layer:
+                return f'{name}_{level}px'
+        return name
+
+    def plot(self, ax, **kwargs):
+        box = ax.get_window_extent()
+        layer = self.layer.set_geometry(self.level(max(box.width, box.height)))
+        if self.outline:
+            return layer.boundary.plot(ax=ax, **kwargs)
+        return layer.plot(ax=ax, **kwargs)
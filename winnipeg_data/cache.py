@@ -0,0 +1,214 @@
+"""
+Local on-disk cache for City of Winnipeg Open Data Portal datasets.
+
+Each dataset is keyed by its portal id (e.g. 'mer2-irmb' for transit pass-ups)
+and stored as a parquet snapshot next to a small JSON metadata file. Freshness
+is checked with a conditional request (ETag / Last-Modified), so a warm run
+skips both the download and the CSV parse. If the portal can't be reached the
+last snapshot is used instead.
+
+The portal address and cache location can be changed with the
+WINNIPEG_DATA_URL and WINNIPEG_DATA_CACHE environment variables, which makes it
+easy to point the cache at a local HTTP server.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import warnings
+from pathlib import Path
+
+import pandas as pd
+
+from winnipeg_data.schemas import SCHEMAS
+
+BASE_URL = os.environ.get('WINNIPEG_DATA_URL', 'https://data.winnipeg.ca')
+CACHE_DIR = Path(os.environ.get('WINNIPEG_DATA_CACHE',
+                                Path.home() / '.cache' / 'winnipeg-data'))
+
+
+def dataset_url(dataset_id, base_url=None):
+    """Get the full CSV download link for a dataset."""
+    base_url = (base_url or BASE_URL).rstrip('/')
+    return f'{base_url}/api/views/{dataset_id}/rows.csv?accessType=DOWNLOAD'
+
+
+def load_options(schema=None, **read_csv_kwargs):
+    """Describe how a snapshot is parsed, so one parsed differently isn't reused."""
+    options = repr(sorted(read_csv_kwargs.items()))
+    if schema is not None:
+        options = f'schema:{schema.fingerprint()}:{options}'
+    return options
+
+
+class DatasetCache:
+    """Versioned parquet snapshots of portal datasets, keyed by dataset id."""
+
+    def __init__(self, cache_dir=None, base_url=None, max_age=None, timeout=60):
+        self.cache_dir = Path(cache_dir or CACHE_DIR)
+        self.base_url = base_url or BASE_URL
+        # Skip even the conditional request if the snapshot was checked
+        # less than max_age seconds ago
+        self.max_age = max_age
+        self.timeout = timeout
+
+    def dataset_dir(self, dataset_id):
+        return self.cache_dir / dataset_id
+
+    def read_metadata(self, dataset_id):
+        """Get the stored metadata for a dataset, or None if it isn't cached."""
+        path = self.dataset_dir(dataset_id) / 'meta.json'
+        try:
+            with open(path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not (self.dataset_dir(dataset_id) / meta['snapshot']).exists():
+            return None
+        return meta
+
+    def write_metadata(self, dataset_id, meta):
+        path = self.dataset_dir(dataset_id) / 'meta.json'
+        tmp = path.with_suffix('.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, path)
+
+    def read_snapshot(self, dataset_id, meta):
+        return pd.read_parquet(self.dataset_dir(dataset_id) / meta['snapshot'])
+
+    def write_snapshot(self, dataset_id, frame, version):
+        """Store a frame as the snapshot for the given version."""
+        directory = self.dataset_dir(dataset_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f'{version}.parquet'
+        tmp = directory / (name + '.tmp')
+        frame.to_parquet(tmp)
+        os.replace(tmp, directory / name)
+        return name
+
+    def remove_old_snapshots(self, dataset_id, keep):
+        for path in self.dataset_dir(dataset_id).glob('*.parquet'):
+            if path.name != keep:
+                path.unlink()
+
+    def download(self, dataset_id, meta=None):
+        """
+        Download a dataset to a temporary file.
+
+        Returns (path, headers, sha256), or None if the server says the cached
+        snapshot described by meta is still current.
+        """
+        request = urllib.request.Request(dataset_url(dataset_id, self.base_url))
+        if meta is not None:
+            if meta.get('etag'):
+                request.add_header('If-None-Match', meta['etag'])
+            if meta.get('last_modified'):
+                request.add_header('If-Modified-Since', meta['last_modified'])
+
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and meta is not None:
+                return None
+            raise
+
+        # Hash the body while writing it to disk so the snapshot gets a
+        # content-based version
+        digest = hashlib.sha256()
+        with response, tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as f:
+            while True:
+                block = response.read(1 << 20)
+                if not block:
+                    break
+                digest.update(block)
+                f.write(block)
+        return f.name, response.headers, digest.hexdigest()
+
+    def load(self, dataset_id, schema=None, **read_csv_kwargs):
+        """
+        Get a dataset as a DataFrame, downloading it only if it has changed.
+
+        If a schema is given the CSV is parsed with it, otherwise any keyword
+        arguments are passed to pd.read_csv. A snapshot parsed with a different
+        schema or different arguments is not reused.
+        """
+        options = load_options(schema, **read_csv_kwargs)
+        meta = self.read_metadata(dataset_id)
+        if meta is not None and meta.get('options') != options:
+            meta = None
+
+        if (meta is not None and self.max_age is not None
+                and time.time() - meta['checked'] < self.max_age):
+            return self.read_snapshot(dataset_id, meta)
+
+        try:
+            result = self.download(dataset_id, meta)
+        except (urllib.error.URLError, OSError) as e:
+            # Work offline from the last snapshot if there is one
+            stale = self.read_metadata(dataset_id)
+            if stale is None or stale.get('options') != options:
+                raise
+            warnings.warn(f'Could not refresh {dataset_id} ({e}); '
+                          f'using the cached snapshot from {stale["fetched"]}')
+            return self.read_snapshot(dataset_id, stale)
+
+        if result is None:
+            meta['checked'] = time.time()
+            self.write_metadata(dataset_id, meta)
+            return self.read_snapshot(dataset_id, meta)
+
+        path, headers, digest = result
+        try:
+            if schema is not None:
+                frame = schema.read_csv(path, **read_csv_kwargs)
+            else:
+                frame = pd.read_csv(path, **read_csv_kwargs)
+        finally:
+            os.unlink(path)
+
+        version = digest[:16]
+        snapshot = self.write_snapshot(dataset_id, frame, version)
+        now = time.time()
+        self.write_metadata(dataset_id, {
+            'dataset_id': dataset_id,
+            'version': version,
+            'snapshot': snapshot,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'options': options,
+            'fetched': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now)),
+            'checked': now,
+        })
+        self.remove_old_snapshots(dataset_id, keep=snapshot)
+        return frame
+
+    def clear(self, dataset_id=None):
+        """Remove one cached dataset, or all of them."""
+        path = self.dataset_dir(dataset_id) if dataset_id else self.cache_dir
+        shutil.rmtree(path, ignore_errors=True)
+
+
+_default_cache = None
+
+
+def get_cache():
+    """Get the shared cache used by load_dataset."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = DatasetCache()
+    return _default_cache
+
+
+def load_dataset(dataset_id, **read_csv_kwargs):
+    """
+    Load a dataset through the shared local cache.
+
+    Datasets with a registered schema are parsed with their declared types.
+    """
+    return get_cache().load(dataset_id, schema=SCHEMAS.get(dataset_id),
+                            **read_csv_kwargs)
@@ -0,0 +1,168 @@
+"""
+Command line entry point: winnipeg-data passups|trees|incidents|counts|serve.
+
+Prints the text report for one of the analyses, and shows or renders its
+figures if asked to. `serve` starts the local query service instead (see
+winnipeg_data.service). The analysis module is only imported once its command
+is picked, and the heavy libraries (geopandas, shapely, scipy, matplotlib,
+seaborn) only once a stage needs them, so the text-only reports start in a
+fraction of a second. --import-times prints how long each stage took and
+which libraries it had to import.
+"""
+import argparse
+import builtins
+import importlib
+import os
+import sys
+import time
+
+COMMANDS = {
+    'passups': 'winnipeg_data.passups',
+    'trees': 'winnipeg_data.trees',
+    'incidents': 'winnipeg_data.incidents',
+    'counts': 'winnipeg_data.counts',
+}
+
+# Standard library modules are left out of the import report
+STDLIB = getattr(sys, 'stdlib_module_names', frozenset())
+
+
+class ImportTimer:
+    """Time the first import of each top-level package, stage by stage."""
+
+    def __init__(self):
+        self.stages = []
+        self.imports = {}
+        self.original = None
+
+    def __enter__(self):
+        self.original = builtins.__import__
+        builtins.__import__ = self.timed_import
+        return self
+
+    def __exit__(self, *exc):
+        builtins.__import__ = self.original
+
+    def timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        top = name.partition('.')[0]
+        if level or top in sys.modules or top in STDLIB:
+            return self.original(name, globals, locals, fromlist, level)
+        # Time includes the packages this one imports (like -X importtime's
+        # cumulative column)
+        start = time.perf_counter()
+        try:
+            return self.original(name, globals, locals, fromlist, level)
+        finally:
+            self.imports.setdefault(top, time.perf_counter() - start)
+
+    def stage(self, name, function, *args, **kwargs):
+        """Run one stage and record its time and the packages it imported."""
+        before = set(self.imports)
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        new = {p: self.imports[p] for p in self.imports if p not in before}
+        self.stages.append((name, seconds, new))
+        return result
+
+    def report(self, file=None, threshold=0.005):
+        """Print the stage times and the imports that took at least `threshold` seconds."""
+        file = file or sys.stderr
+        print('Stage           Seconds  Imported (cumulative seconds)', file=file)
+        for name, seconds, new in self.stages:
+            slow = sorted(((t, p) for p, t in new.items() if t >= threshold), reverse=True)
+            imports = ', '.join(f'{p} ({t:.2f})' for t, p in slow)
+            print(f'{name:<15} {seconds:7.2f}  {imports}', file=file)
+        total = sum(seconds for _, seconds, _ in self.stages)
+        print(f'{"total":<15} {total:7.2f}', file=file)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='winnipeg-data',
+        description='Explore the City of Winnipeg open data.')
+    parser.add_argument('command', choices=list(COMMANDS) + ['serve'],
+                        help='the analysis to run, or serve to answer queries')
+    parser.add_argument('--figures', metavar='DIR',
+                        help='render the figures to files in DIR/<command>')
+    parser.add_argument('--format', nargs='+', default=['png'], choices=['png', 'svg'],
+                        help='file formats for --figures (default: png)')
+    parser.add_argument('--processes', type=int,
+                        help='worker processes for the partitioned stages and --figures, '
+                             '0 for one per core (default: $WINNIPEG_DATA_PROCESSES, or one; '
+                             'one per core for --figures)')
+    parser.add_argument('--show', action='store_true',
+                        help='show the figures in windows')
+    parser.add_argument('--hotspots', action='store_true',
+                        help='also find and report the places where pass-ups pile up '
+                             '(passups only)')
+    parser.add_argument('--chunksize', type=int, metavar='ROWS',
+                        help='read the data ROWS rows at a time, keeping only running '
+                             'totals in memory (trees only)')
+    parser.add_argument('--import-times', action='store_true',
+                        help='report the time taken by each stage and import')
+    parser.add_argument('--port', type=int, default=8000,
+                        help='port for serve (default: 8000)')
+    parser.add_argument('--socket', metavar='PATH',
+                        help='answer queries on a Unix socket at PATH instead of a port')
+    return parser.parse_args(argv)
+
+
+def run(args, timer):
+    """Run the stages of one analysis."""
+    if args.command == 'serve':
+        from winnipeg_data.service import serve
+        serve(port=args.port, socket_path=args.socket)
+        return
+
+    module = timer.stage('import', importlib.import_module, COMMANDS[args.command])
+    if args.hotspots and not hasattr(module, 'locate_hotspots'):
+        raise SystemExit(f'winnipeg-data: {args.command} has no hotspots')
+    if (args.figures or args.show or args.hotspots) and hasattr(module, 'FIGURE_LAYERS'):
+        # Fetch the layers for the maps (and hotspots) while the data loads
+        from winnipeg_data.layers import prefetch
+        prefetch(module.FIGURE_LAYERS)
+    if args.chunksize:
+        if not hasattr(module, 'stream'):
+            raise SystemExit(f'winnipeg-data: {args.command} can\'t be read in chunks')
+        results = timer.stage('stream', module.stream, chunksize=args.chunksize)
+    else:
+        data = timer.stage('load', module.load)
+        if not isinstance(data, tuple):
+            data = (data,)
+        results = timer.stage('summarize', module.summarize, *data)
+    timer.stage('report', module.report, results)
+    if args.hotspots:
+        # Only asked for: it needs the locations, the boundary and the clustering
+        timer.stage('hotspots', module.locate_hotspots, results)
+        timer.stage('hotspot report', module.report_hotspots, results)
+    if not (args.figures or args.show):
+        return
+
+    specs = timer.stage('figures', module.figures, results)
+    from winnipeg_data import render
+    if args.figures:
+        directory = f'{args.figures}/{args.command}'
+        # (0 or no --processes means a worker per core)
+        timer.stage('render', render.render_figures, specs, directory,
+                    formats=args.format, processes=args.processes or None)
+        print(f'Wrote {len(specs)} figures to {directory}', file=sys.stderr)
+    if args.show:
+        timer.stage('show', render.show_figures, specs)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.processes is not None:
+        # The partitioned stages pick up the number of processes from here
+        # (see winnipeg_data.parallel)
+        os.environ['WINNIPEG_DATA_PROCESSES'] = str(args.processes)
+    with ImportTimer() as timer:
+        run(args, timer)
+    if args.import_times:
+        timer.report()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
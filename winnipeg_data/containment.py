@@ -0,0 +1,63 @@
+"""
+Fast point-in-boundary filtering for large point datasets.
+
+The boundary is rasterized once onto a regular grid. Points that fall in a
+cell lying entirely inside the boundary are accepted straight away, points in
+a cell entirely outside are rejected, and only the points in cells the
+boundary passes through are tested exactly against the (prepared) polygon.
+The result is the same as GeoSeries.within(polygon).
+"""
+import numpy as np
+import shapely
+
+OUTSIDE, INSIDE, EDGE = 0, 1, 2
+
+
+class BoundaryIndex:
+    """A polygon with a precomputed grid of inside/outside/edge cells."""
+
+    def __init__(self, polygon, cells=256):
+        self.polygon = polygon
+        shapely.prepare(polygon)
+
+        self.xmin, self.ymin, xmax, ymax = polygon.bounds
+        self.nx = self.ny = cells
+        self.dx = (xmax - self.xmin) / self.nx
+        self.dy = (ymax - self.ymin) / self.ny
+
+        # Build a box for every cell, padded slightly so that a point rounded
+        # into a neighbouring cell is still classified correctly
+        i, j = np.meshgrid(np.arange(self.nx), np.arange(self.ny))
+        x0 = self.xmin + i.ravel()*self.dx
+        y0 = self.ymin + j.ravel()*self.dy
+        pad_x, pad_y = 1e-6*self.dx, 1e-6*self.dy
+        boxes = shapely.box(x0 - pad_x, y0 - pad_y, x0 + self.dx + pad_x, y0 + self.dy + pad_y)
+
+        state = np.full(len(boxes), OUTSIDE, dtype=np.int8)
+        state[shapely.intersects(polygon, boxes)] = EDGE
+        state[shapely.contains_properly(polygon, boxes)] = INSIDE
+        self.state = state.reshape(self.ny, self.nx)
+
+    def contains_xy(self, x, y):
+        """Get a mask of the points strictly inside the boundary."""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        result = np.zeros(x.shape, dtype=bool)
+
+        with np.errstate(invalid='ignore'):
+            i = np.floor((x - self.xmin) / self.dx)
+            j = np.floor((y - self.ymin) / self.dy)
+        in_grid = (i >= 0) & (i < self.nx) & (j >= 0) & (j < self.ny)
+
+        state = np.full(x.shape, OUTSIDE, dtype=np.int8)
+        state[in_grid] = self.state[j[in_grid].astype(np.intp), i[in_grid].astype(np.intp)]
+
+        result[state == INSIDE] = True
+        edge = state == EDGE
+        result[edge] = shapely.contains_xy(self.polygon, x[edge], y[edge])
+        return result
+
+    def within(self, points):
+        """Get a mask of the point geometries strictly inside the boundary."""
+        points = np.asarray(points, dtype=object)
+        return self.contains_xy(shapely.get_x(points), shapely.get_y(points))
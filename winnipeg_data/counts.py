@@ -0,0 +1,156 @@
+"""
+The "Library People Counts" analysis (dataset g3zt-s3kr), in stages.
+
+load gets the weekly counts, summarize works out the tables (pandas only),
+report prints them and figures describes the charts (see
+winnipeg_data.render). Only pandas is imported until the figures are drawn.
+"""
+from winnipeg_data.cache import load_dataset
+from winnipeg_data.daily import DailyIndex
+from winnipeg_data.memo import memoize
+from winnipeg_data.render import FigureSpec
+
+DATASET_ID = 'g3zt-s3kr'
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul',
+          'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+
+def load():
+    """Load the weekly people counts, indexed by week, with a Library column."""
+    # Download (or reuse the cached copy of) the library people count data
+    counts = load_dataset(DATASET_ID)
+
+    # Set the week as the index
+    # (the count IDs are dropped and the weeks are parsed while loading)
+    counts = counts.set_index('Week End Date')
+
+    # Go through the description column and separate out the library name only
+    # The descriptions are categorical, so each distinct one is only split once
+    counts['Library'] = counts['Description'].map(lambda desc: " ".join(desc.split()[:-4]))
+    counts['Library'] = counts['Library'].astype('category')
+    return counts
+
+
+@memoize
+def summarize(counts):
+    """
+    Work out the visitor tables. Returns a dict of them by name.
+
+    The tables are kept on disk and reused while the counts are the same
+    (see winnipeg_data.memo).
+    """
+    results = {}
+
+    # Get the earliest recorded week for each library
+    # The earliest counts start from Jan. 2009, but only in two libraries
+    # All libraries have started counting by December 2010
+    results['first_week'] = counts.groupby('Library', observed=True).apply(
+        lambda x: x.index.min()).sort_values()
+
+    # Let's start the count in 2011 to make things fair
+    counts = counts.sort_index().loc['2011':]
+
+    # Get the number of total counts per year in each library
+    by_library_and_year = counts.pivot_table('Count', index=counts.index.year,
+                                             columns='Library', aggfunc='sum',
+                                             observed=True).fillna(0)
+    results['by_library_and_year'] = by_library_and_year
+
+    # Get the total number of visitors to each library
+    results['by_library'] = by_library_and_year.sum().sort_values(ascending=True)
+
+    # Group total visits by year
+    results['by_year'] = by_library_and_year.sum(axis=1)
+
+    # Get the number of visitors per month in each library
+    by_library_and_month = counts.pivot_table('Count', index=counts.index.month,
+                                              columns='Library', aggfunc='sum',
+                                              observed=True).fillna(0)
+    results['by_library_and_month'] = by_library_and_month
+
+    # Group total visits by month
+    results['by_month'] = by_library_and_month.sum(axis=1)
+
+    # Get total weekly visits over time
+    # The visits are totalled per day, with cumulative sums, so any week or
+    # range of dates is just a difference of them
+    results['visit_days'] = DailyIndex.from_times(counts.index, counts['Count'])
+    results['weekly_visits'] = results['visit_days'].weekly()
+
+    # Get a new table with all counts for a given library in a week merged into one row
+    weekly = counts.groupby([counts.index, 'Library'], observed=True)
+    weekly = weekly.agg({'Count': 'sum', 'Days Open': 'max'}).reset_index('Library')
+
+    # Get the number of open days per year for each library
+    days_open = weekly.pivot_table('Days Open', index=weekly.index.year,
+                                   columns='Library', aggfunc='sum',
+                                   observed=True).fillna(0)
+
+    # Get the average number of visitors per open day in each library
+    results['visits_per_day'] = by_library_and_year/days_open
+    return results
+
+
+def report(results):
+    """Print the text summary."""
+    print(results['first_week'])
+    print(results['by_library'].sort_values(ascending=False))
+    print(results['by_year'])
+
+
+def figures(results):
+    """Describe the charts."""
+    figures = []
+
+    # Show the total number of visitors by library
+    figures.append(FigureSpec('by_library', [(results['by_library'], {'kind': 'barh'})],
+                              xlabel='Number of visitors (millions)', ylabel='Library',
+                              title='Library Visitors Since 2011',
+                              xticks=[0, 2000000, 4000000, 6000000, 8000000],
+                              xticklabels=[0, 2, 4, 6, 8]))
+
+    # Show the total visitors per year
+    figures.append(FigureSpec('by_year', [(results['by_year'], {'kind': 'bar', 'rot': 45})],
+                              xlabel='Year', ylabel='Number of visitors (millions)',
+                              title='Yearly Library Visitors',
+                              yticks=[0, 500000, 1000000, 1500000, 2000000, 2500000],
+                              yticklabels=[0.0, 0.5, 1.0, 1.5, 2.0, 2.5]))
+
+    # Show the number of visitors per year for select libraries
+    library_list = ['St. Boniface', 'St. Vital']
+    figures.append(FigureSpec('by_year_selected',
+                              [(results['by_library_and_year'][library_list], {'kind': 'bar', 'rot': 45})],
+                              ylim=[0, 130000], xlabel='Year', ylabel='Number of visitors',
+                              title='Yearly Visitors for Selected Libraries',
+                              calls=[('legend', (), {'loc': 'best', 'title': 'Library'})]))
+
+    # Show the total visitors per month
+    figures.append(FigureSpec('by_month', [(results['by_month'], {'kind': 'bar', 'rot': 45})],
+                              xticklabels=MONTHS, xlabel='Month',
+                              ylabel='Number of visitors (millions)',
+                              title='Library Visitors by Month',
+                              yticks=[0, 500000, 1000000, 1500000, 2000000, 2500000],
+                              yticklabels=[0.0, 0.5, 1.0, 1.5, 2.0, 2.5]))
+
+    # Show the number of visitors each month for select libraries
+    library_list = ['St. Boniface', 'Cornish']
+    figures.append(FigureSpec('by_month_selected',
+                              [(results['by_library_and_month'][library_list], {'kind': 'bar', 'rot': 45})],
+                              xticklabels=MONTHS, ylim=[0, 115000], xlabel='Month',
+                              ylabel='Number of visitors',
+                              title='Library Visitors by Month for Selected Libraries',
+                              calls=[('legend', (), {'loc': 'best', 'title': 'Library'})]))
+
+    # Show total weekly visits for 2015
+    figures.append(FigureSpec('weekly_2015', [(results['visit_days'].weekly('2015', '2015'), {})],
+                              xlabel='Date', ylabel='Number of visitors',
+                              title='Weekly Library Visitors in 2015'))
+
+    # Show the average number of visitors per open day for St. Boniface and Millennium libraries
+    figures.append(FigureSpec('visits_per_day',
+                              [(results['visits_per_day'][['Millennium', 'St. Boniface']],
+                                {'kind': 'bar', 'rot': 45})],
+                              xlabel='Year', ylabel='Average number of visitors per day',
+                              title='Average Number of Visitors per Day',
+                              calls=[('legend', (), {'loc': 'best', 'title': 'Library'})]))
+    return figures
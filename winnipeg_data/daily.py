@@ -0,0 +1,242 @@
+"""
+Daily counts with cumulative sums, for fast date range, weekly and rolling queries.
+
+The charts of daily pass-ups, incidents and library visits used to be made by
+resampling and rolling a daily Series (resample('D').size(),
+resample('W').sum(), rolling(7, center=True).mean()) and then slicing it by
+year. A DailyIndex keeps a series as one contiguous array of daily totals
+starting at a day number (days since 1970-01-01), with the cumulative sums
+next to it. The total over any range of days is then the difference of two
+cumulative sums, and the weekly sums and centred moving averages are one
+vectorized difference over the whole range, or just the slice asked for.
+
+A DailyMatrix does the same for many series at once, e.g. the pass-ups on
+every route: one row of daily counts per route (as int16 when they fit),
+counted in one pass, with the cumulative sums along each row. The weekly
+sums, rolling averages and yearly totals of every route come from the same
+differences, taken along the rows, so they cost about the same as for a
+single series.
+
+Dates can be given as anything pd.Period understands, e.g. '2015' (the whole
+year), '2019-02' or '2019-02-27', or as Timestamps. The results come back as
+Series (or, for a DailyMatrix, DataFrames with a column per row) shaped like
+the pandas calls they replace.
+"""
+import numpy as np
+import pandas as pd
+
+NS_PER_DAY = 86400*10**9
+
+# 1970-01-01 was a Thursday, so day 3 was a Sunday
+SUNDAY = 3
+
+
+def day_number(date, end=False):
+    """Get the first (or last) day number of a date or period such as '2015'."""
+    if isinstance(date, str):
+        period = pd.Period(date)
+        date = period.end_time if end else period.start_time
+    return int(pd.Timestamp(date).value // NS_PER_DAY)
+
+
+class DailyIndex:
+    """Totals for each day from first_day on, with their cumulative sums."""
+
+    def __init__(self, counts, first_day, name=None):
+        counts = np.asarray(counts)
+        self.counts = counts
+        self.first_day = int(first_day)
+        self.name = name
+        # cumsum[..., i] is the total of the days before first_day + i
+        dtype = np.int64 if counts.dtype.kind in 'biu' else np.float64
+        self.cumsum = np.concatenate([np.zeros(counts.shape[:-1] + (1,), dtype=dtype),
+                                      np.cumsum(counts, axis=-1, dtype=dtype)], axis=-1)
+
+    @classmethod
+    def from_times(cls, times, values=None):
+        """
+        Total events (or values) per day, from the first to the last day with any.
+
+        Missing times are left out, as with resample('D').
+        """
+        times = pd.DatetimeIndex(times)
+        valid = ~times.isna()
+        days = times.asi8[valid] // NS_PER_DAY
+        if values is not None:
+            values = np.asarray(values)[valid]
+        if not len(days):
+            return cls(np.zeros(0, dtype=np.int64), 0, times.name)
+        first_day = days.min()
+        counts = np.bincount(days - first_day, weights=values)
+        if values is not None and values.dtype.kind in 'biu':
+            counts = counts.astype(np.int64)
+        return cls(counts, first_day, times.name)
+
+    @classmethod
+    def from_counts(cls, counts, first_day, name=None):
+        """Get the index of a daily count array, without the empty days at either end."""
+        return cls(counts, first_day, name).trimmed()
+
+    def like(self, counts, first_day):
+        """Get an index of other counts, with the same name."""
+        return DailyIndex(counts, first_day, self.name)
+
+    def label(self, values, index=None):
+        """Label totals (or, with an index, a total for each entry of the index)."""
+        return values if index is None else pd.Series(values, index=index)
+
+    def __len__(self):
+        return self.counts.shape[-1]
+
+    @property
+    def last_day(self):
+        return self.first_day + len(self) - 1
+
+    def days(self, start=None, end=None):
+        """Get the (first, last) day numbers of a date range, clipped to the index."""
+        first = self.first_day if start is None else max(day_number(start), self.first_day)
+        last = self.last_day if end is None else min(day_number(end, end=True), self.last_day)
+        return first, last
+
+    def total(self, start=None, end=None):
+        """Get the total over a date range (both ends included)."""
+        first, last = self.days(start, end)
+        if last < first:
+            return self.label(self.cumsum[..., 0])
+        return self.label(self.cumsum[..., last - self.first_day + 1] - self.cumsum[..., first - self.first_day])
+
+    def totals(self, first, last):
+        """Get the totals from each of the day numbers first to last (arrays, clipped to the index)."""
+        first = np.clip(first, self.first_day, self.last_day + 1) - self.first_day
+        last = np.clip(last, self.first_day - 1, self.last_day) - self.first_day
+        return np.where(last >= first, self.cumsum[..., last + 1] - self.cumsum[..., first], 0)
+
+    def loc(self, start=None, end=None):
+        """Get the index of a date range, like daily.loc[start:end]."""
+        first, last = self.days(start, end)
+        last = max(last, first - 1)
+        return self.like(self.counts[..., first - self.first_day:last - self.first_day + 1], first)
+
+    def trimmed(self):
+        """Leave out the empty days at either end, like resampling only the events in range."""
+        observed = np.flatnonzero(self.counts.reshape(-1, len(self)).any(axis=0))
+        if not len(observed):
+            return self.like(self.counts[..., :0], self.first_day)
+        return self.like(self.counts[..., observed[0]:observed[-1] + 1], self.first_day + observed[0])
+
+    def dates(self, days):
+        return pd.DatetimeIndex(np.asarray(days, dtype=np.int64)*NS_PER_DAY, name=self.name)
+
+    def date_range(self, first, last):
+        return pd.date_range(pd.Timestamp(first, unit='D'), periods=max(last - first + 1, 0),
+                             freq='D', name=self.name)
+
+    def series(self, start=None, end=None):
+        """Get the daily totals as a Series, like resample('D').size() or .sum()."""
+        first, last = self.days(start, end)
+        counts = self.counts[..., first - self.first_day:last - self.first_day + 1]
+        return self.label(counts, self.date_range(first, last))
+
+    def weekly(self, start=None, end=None, kind='timestamp'):
+        """
+        Get the weekly sums (weeks ending on Sunday), like resample('W').sum().
+
+        With kind='period' the weeks are labelled by period, like
+        resample('W', kind='period').sum(). Between start and end, the weeks
+        ending in the range are kept (or, for periods, those overlapping it),
+        as slicing the resampled Series does.
+        """
+        if not len(self):
+            index = self.dates([])
+            return self.label(np.zeros(self.counts.shape, dtype=self.cumsum.dtype),
+                              index.to_period('W') if kind == 'period' else index)
+        # Day numbers of the Sundays ending the weeks with any days in the index
+        ends = np.arange(self.first_day + (SUNDAY - self.first_day) % 7,
+                         self.last_day + (SUNDAY - self.last_day) % 7 + 1, 7)
+        if start is not None:
+            ends = ends[ends >= day_number(start)]
+        if end is not None:
+            ends = ends[ends - (6 if kind == 'period' else 0) <= day_number(end, end=True)]
+        sums = self.totals(ends - 6, ends)
+        index = self.dates(ends)
+        if kind == 'period':
+            return self.label(sums, index.to_period('W'))
+        return self.label(sums, pd.DatetimeIndex(index, freq='W-SUN'))
+
+    def rolling(self, window, start=None, end=None):
+        """
+        Get the centred moving average over `window` days, like rolling(window, center=True).mean().
+
+        Days too near either end of the index for a full window are NaN.
+        Only the days between start and end are worked out.
+        """
+        first, last = self.days(start, end)
+        days = np.arange(first, last + 1)
+        lower = days - window // 2
+        upper = lower + window - 1
+        means = self.totals(lower, upper) / window
+        means[..., (lower < self.first_day) | (upper > self.last_day)] = np.nan
+        return self.label(means, self.date_range(first, last))
+
+    def yearly(self):
+        """Get the total for each calendar year, like groupby(index.year).sum() of the daily totals."""
+        if not len(self):
+            return self.label(np.zeros(self.counts.shape, dtype=self.cumsum.dtype), pd.Index([], name=self.name))
+        years = np.arange(pd.Timestamp(self.first_day, unit='D').year,
+                          pd.Timestamp(self.last_day, unit='D').year + 1)
+        starts = np.array([day_number(str(year)) for year in years])
+        ends = np.append(starts[1:], day_number(str(years[-1] + 1))) - 1
+        return self.label(self.totals(starts, ends), pd.Index(years, name=self.name))
+
+
+class DailyMatrix(DailyIndex):
+    """Daily totals for several series at once (a row for each label), with their cumulative sums."""
+
+    def __init__(self, counts, first_day, labels, name=None):
+        super().__init__(counts, first_day, name)
+        self.labels = pd.Index(labels)
+
+    @classmethod
+    def from_events(cls, times, keys):
+        """
+        Count events per day for each key (e.g. route), from the first to the last day with any events.
+
+        Events with a missing time or key are left out, and so are keys with
+        no events. The counts are stored as int16 if they fit.
+        """
+        times = pd.DatetimeIndex(times)
+        keys = pd.Categorical(keys)
+        valid = ~times.isna() & (keys.codes >= 0)
+        days = times.asi8[valid] // NS_PER_DAY
+        codes = keys.codes[valid].astype(np.int64)
+        first_day = days.min() if len(days) else 0
+        n_days = int(days.max() - first_day + 1) if len(days) else 0
+
+        # Count every (key, day) pair with one bincount
+        counts = np.bincount(codes*n_days + (days - first_day), minlength=len(keys.categories)*n_days)
+        counts = counts.reshape(len(keys.categories), n_days)
+        observed = counts.any(axis=1)
+        dtype = np.int16 if counts.max(initial=0) <= np.iinfo(np.int16).max else np.int32
+        return cls(counts[observed].astype(dtype), first_day, keys.categories[observed], times.name)
+
+    def like(self, counts, first_day):
+        return DailyMatrix(counts, first_day, self.labels, self.name)
+
+    def label(self, values, index=None):
+        """Label totals by row (or, with an index, as a DataFrame with a column for each row)."""
+        if index is None:
+            return pd.Series(values, index=self.labels)
+        return pd.DataFrame(np.asarray(values).T, index=index, columns=self.labels)
+
+    def row(self, label):
+        """Get the daily totals for one label as a DailyIndex."""
+        return DailyIndex(self.counts[self.labels.get_loc(label)], self.first_day, self.name)
+
+    def take(self, labels):
+        """Get the rows for some of the labels."""
+        rows = self.labels.get_indexer(labels)
+        return DailyMatrix(self.counts[rows], self.first_day, self.labels[rows], self.name)
+
+    def ranking(self, start=None, end=None):
+        """Get the labels' totals over a date range, largest first."""
+        return self.total(start, end).sort_values(ascending=False)
\ No newline at end of file
@@ -0,0 +1,141 @@
+"""
+Vectorized per-group value counts, modes and top-k/top-n values.
+
+groupby(keys).apply(lambda x: x.groupby(column).size().idxmax()) runs a
+nested groupby in Python for every group. Here the group keys and the values
+are turned into integer codes, the count of every (group, value) pair is
+filled in by a single bincount, and the most common value(s) of every group
+are read off the resulting table with one argmax/argsort. The cost is one
+pass over the rows plus the size of the table, however many groups there
+are.
+
+top_n gives the n largest counts in every group in long form, like
+groupby(keys).apply(lambda x: x.groupby(column).size().sort_values(ascending=False)[:n]),
+from the observed (group, value) pairs and a single sort, so it doesn't need
+a table of every combination.
+
+Ties are broken by the order of the values: for a categorical column, the
+category order; otherwise sorted order. This matches idxmax on the nested
+groupby's counts, which returns the first of the tied values. (The order of
+tied counts from sort_values(ascending=False) depends on the sort algorithm
+and the number of values, so top_n only matches it up to ties.)
+"""
+import numpy as np
+import pandas as pd
+
+
+def factorize(values):
+    """Get integer codes (-1 for missing) and the distinct values, in sorted order."""
+    return pd.factorize(pd.Series(values), sort=True)
+
+
+def factorize_keys(keys):
+    """
+    Number the observed combinations of one or more group keys.
+
+    Returns (codes, index): the group code of every row (-1 if any key is
+    missing) and an index with one entry per observed group, sorted by the
+    keys, like the index of groupby(keys, observed=True).size().
+    """
+    if not isinstance(keys, list):
+        keys = [keys]
+    level_codes, levels = zip(*(factorize(key) for key in keys))
+    names = [getattr(key, 'name', None) for key in keys]
+
+    missing = np.zeros(len(level_codes[0]), dtype=bool)
+    for codes in level_codes:
+        missing |= codes < 0
+    combined = np.ravel_multi_index([codes[~missing] for codes in level_codes],
+                                    [len(level) for level in levels])
+
+    observed, inverse = np.unique(combined, return_inverse=True)
+    codes = np.full(len(missing), -1, dtype=np.intp)
+    codes[~missing] = inverse
+
+    positions = np.unravel_index(observed, [len(level) for level in levels])
+    if len(keys) == 1:
+        index = pd.Index(levels[0].take(positions[0]), name=names[0])
+    else:
+        index = pd.MultiIndex.from_arrays([level.take(p) for level, p in zip(levels, positions)],
+                                          names=names)
+    return codes, index
+
+
+def group_value_counts(keys, values):
+    """
+    Count every value in every group, in one pass.
+
+    Returns (table, index, labels): table[i, j] is the number of rows in
+    group index[i] with value labels[j].
+    """
+    groups, index = factorize_keys(keys)
+    codes, labels = factorize(values)
+    keep = (groups >= 0) & (codes >= 0)
+    size = len(index) * len(labels)
+    table = np.bincount(groups[keep]*len(labels) + codes[keep], minlength=size)
+    return table.reshape(len(index), len(labels)), index, labels
+
+
+def group_top_k(keys, values, k):
+    """
+    Get the k most common values in each group.
+
+    Returns a DataFrame indexed by group with columns 1 to k; groups with
+    fewer than k distinct values are padded with None.
+    """
+    table, index, labels = group_value_counts(keys, values)
+    # A stable sort on the negated counts keeps tied values in order
+    order = np.argsort(-table, axis=1, kind='stable')[:, :k]
+    found = np.take_along_axis(table, order, axis=1) > 0
+    top = np.asarray(labels, dtype=object)[order]
+    top[~found] = None
+    return pd.DataFrame(top, index=index, columns=range(1, top.shape[1] + 1))
+
+
+def group_mode(keys, values):
+    """Get the most common value in each group (the first one, if tied)."""
+    table, index, labels = group_value_counts(keys, values)
+    mode = np.asarray(labels, dtype=object)[table.argmax(axis=1)]
+    return pd.Series(mode, index=index)
+
+
+def count_pairs(keys, values):
+    """
+    Count the observed (group, value) pairs.
+
+    Returns (groups, codes, counts, index, labels), with one entry in groups,
+    codes and counts per pair, ordered by group and then by value.
+    """
+    groups, index = factorize_keys(keys)
+    codes, labels = factorize(values)
+    keep = (groups >= 0) & (codes >= 0)
+    pairs, counts = np.unique(groups[keep]*len(labels) + codes[keep], return_counts=True)
+    return pairs // len(labels), pairs % len(labels), counts, index, labels
+
+
+def top_n(keys, values, n=5):
+    """
+    Get the n most common values in each group, with their counts.
+
+    Returns a Series indexed by the group keys and the value, sorted by group
+    and then by count (largest first).
+    """
+    groups, codes, counts, index, labels = count_pairs(keys, values)
+
+    # One sort by group, then count; lexsort is stable, so tied values stay
+    # in value order
+    order = np.lexsort((-counts, groups))
+    groups, codes, counts = groups[order], codes[order], counts[order]
+
+    # Rank within each group and keep the first n
+    rank = np.arange(len(groups)) - np.searchsorted(groups, groups)
+    keep = rank < n
+    groups, codes, counts = groups[keep], codes[keep], counts[keep]
+
+    if isinstance(index, pd.MultiIndex):
+        arrays = [index.get_level_values(i).take(groups) for i in range(index.nlevels)]
+    else:
+        arrays = [index.take(groups)]
+    arrays.append(labels.take(codes))
+    names = list(index.names) + [getattr(values, 'name', None)]
+    return pd.Series(counts, index=pd.MultiIndex.from_arrays(arrays, names=names))
\ No newline at end of file
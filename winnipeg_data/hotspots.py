@@ -0,0 +1,148 @@
+"""
+Hotspots: the places where pass-ups (or any located points) pile up.
+
+The pass-up maps show every pass-up, but not a list of the places where they
+cluster. find_hotspots projects the points to metres (EPSG:32614) and
+clusters them DBSCAN-style: a location with at least min_points points
+within radius metres of it is a core location, core locations within radius
+of each other are in the same hotspot, and the other locations within radius
+of a core location join its hotspot (the nearest one). Everything else is
+left out.
+
+Pass-ups are recorded at stops, so many share a location. The points are
+merged into distinct locations (to the metre) with a count for each, and the
+clustering works on the locations, weighted by their counts. The neighbour
+queries are one bulk query of a KD-tree of the locations for all the pairs
+within radius (cKDTree.query_pairs), and the hotspots are the connected
+components of the core pairs (scipy.sparse.csgraph), so there is no pairwise
+distance matrix and the whole history takes a fraction of a second.
+
+Each hotspot comes back as a polygon (the convex hull of its locations,
+widened by half the radius) with the number of points in it, ranked from most
+to fewest, and the counts in each hotspot can be split by any label column
+(e.g. the pass-up type and route).
+"""
+import numpy as np
+import pandas as pd
+import shapely
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+PROJECTED = 'EPSG:32614'
+
+
+def project(x, y, crs='EPSG:4326'):
+    """Project coordinates to metres (EPSG:32614)."""
+    from pyproj import Transformer
+
+    transformer = Transformer.from_crs(crs, PROJECTED, always_xy=True)
+    return transformer.transform(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+
+
+def dbscan(x, y, radius, min_points, weights=None):
+    """
+    Cluster points (in metres) DBSCAN-style with a KD-tree.
+
+    A point is a core point if the points (or their weights) within radius of
+    it, itself included, come to at least min_points. Returns the hotspot of
+    each point, numbered from the largest (by weight) down, and -1 for the
+    points in none.
+    """
+    points = np.c_[x, y]
+    weights = np.ones(len(points)) if weights is None else np.asarray(weights, dtype=float)
+    if not len(points):
+        return np.zeros(0, dtype=np.intp)
+
+    # Find every pair of points within radius of each other in one query
+    pairs = cKDTree(points).query_pairs(radius, output_type='ndarray')
+    first, second = pairs[:, 0], pairs[:, 1]
+
+    # Add up the weight around each point
+    n = len(points)
+    density = weights + np.bincount(first, weights[second], n) + np.bincount(second, weights[first], n)
+    core = density >= min_points
+
+    # Join the core points within radius of each other
+    joined = core[first] & core[second]
+    graph = coo_matrix((np.ones(joined.sum()), (first[joined], second[joined])), shape=(n, n))
+    _, components = connected_components(graph, directed=False)
+    labels = np.where(core, components, -1).astype(np.intp)
+
+    # Add the other points within radius of a core point to the nearest one's hotspot
+    core_first, core_second = core[first] & ~core[second], core[second] & ~core[first]
+    border = np.r_[second[core_first], first[core_second]]
+    if len(border):
+        nearest = np.r_[first[core_first], second[core_second]]
+        distance = np.hypot(*(points[border] - points[nearest]).T)
+        order = np.lexsort((distance, border))
+        border, nearest = border[order], nearest[order]
+        closest = np.r_[True, border[1:] != border[:-1]]
+        labels[border[closest]] = labels[nearest[closest]]
+
+    # Number the hotspots from the largest down
+    clustered = labels >= 0
+    if not clustered.any():
+        return labels
+    _, codes = np.unique(labels[clustered], return_inverse=True)
+    sizes = np.bincount(codes, weights[clustered])
+    rank = np.empty(len(sizes), dtype=np.intp)
+    rank[np.argsort(-sizes, kind='stable')] = np.arange(len(sizes))
+    labels[clustered] = rank[codes]
+    return labels
+
+
+def find_hotspots(points, radius=100, min_points=50, split_by=()):
+    """
+    Find the hotspots of a PointTable (see the module docstring).
+
+    Returns the hotspots as a GeoDataFrame in the points' crs, indexed by rank
+    (1 for the most points), with the number of points ('Count'), distinct
+    locations ('Locations') and area in square kilometres ('Area'), and a
+    dict with a table of the counts in each hotspot for each column in
+    split_by (a column for each of its values, from most to fewest points).
+    """
+    import geopandas as gpd
+
+    # Project the points and merge the ones at the same location (to the metre)
+    valid = np.isfinite(points.x) & np.isfinite(points.y)
+    # (each location gets one integer key, and the keys are factorized by hashing)
+    x, y = project(points.x[valid], points.y[valid], points.crs)
+    x, y = np.round(x).astype(np.int64), np.round(y).astype(np.int64)
+    x0, y0 = x.min(initial=0), y.min(initial=0)
+    height = y.max(initial=0) - y0 + 1
+    inverse, keys = pd.factorize((x - x0)*height + (y - y0))
+    locations = np.c_[keys // height + x0, keys % height + y0].astype(float)
+    weights = np.bincount(inverse, minlength=len(keys))
+
+    # Cluster the locations, weighted by the number of points at each
+    location_labels = dbscan(locations[:, 0], locations[:, 1], radius, min_points, weights)
+    labels = np.full(len(points), -1, dtype=np.intp)
+    labels[valid] = location_labels[inverse]
+    n_hotspots = location_labels.max(initial=-1) + 1
+    index = pd.RangeIndex(1, n_hotspots + 1, name='Hotspot')
+
+    # Outline each hotspot: the convex hull of its locations, widened by half the radius
+    members = np.flatnonzero(location_labels >= 0)
+    members = members[np.argsort(location_labels[members], kind='stable')]
+    hulls = shapely.convex_hull(shapely.multipoints(locations[members], indices=location_labels[members]))
+    outlines = gpd.GeoSeries(shapely.buffer(hulls, radius/2), index=index, crs=PROJECTED)
+
+    # Count the points and locations in each hotspot
+    clustered = labels >= 0
+    hotspots = pd.DataFrame({'Count': np.bincount(labels[clustered], minlength=n_hotspots),
+                             'Locations': np.bincount(location_labels[members], minlength=n_hotspots),
+                             'Area': outlines.area.to_numpy()/1e6}, index=index)
+    hotspots = gpd.GeoDataFrame(hotspots, geometry=outlines.to_crs(points.crs))
+
+    # Split the counts by each label column, with one bincount of (hotspot, code) pairs
+    splits = {}
+    for name in split_by:
+        codes, categories = points.codes[name]
+        counted = clustered & (codes >= 0)
+        counts = np.bincount(labels[counted]*len(categories) + codes[counted],
+                             minlength=n_hotspots*len(categories)).reshape(n_hotspots, len(categories))
+        table = pd.DataFrame(counts, index=index, columns=pd.Index(categories, name=name))
+        totals = table.sum()
+        splits[name] = table[totals[totals > 0].sort_values(ascending=False, kind='stable').index]
+    return hotspots, splits
\ No newline at end of file
@@ -0,0 +1,268 @@
+"""
+The "Library Incidents" analysis (dataset ffe7-mwdv), in stages.
+
+load gets the incidents (fetching only the ones added since the last run),
+summarize works out the tables (pandas only), report prints them and figures
+describes the charts (see winnipeg_data.render).
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from winnipeg_data.daily import DailyIndex
+from winnipeg_data.incremental import refresh_dataset
+from winnipeg_data.memo import memoize
+from winnipeg_data.render import FigureSpec
+from winnipeg_data.tensor import CountTensor
+
+DATASET_ID = 'ffe7-mwdv'
+
+# The date that Millennium library implemented enhanced security screening
+MILLENNIUM_SCREENING = pd.Timestamp('2019-02-27')
+
+# The date that libraries first shut down due to COVID-19
+FIRST_LOCKDOWN = pd.Timestamp('2020-03-16')
+
+
+def load():
+    """
+    Load the incidents, indexed by date.
+
+    Returns the incidents and their TemporalCounts by library.
+    """
+    # Download the library incident data (only the incidents added since the last run)
+    # The incidents at each library are also counted by year, month, day, etc.
+    incidents, incident_counts = refresh_dataset(DATASET_ID)
+
+    # Set the date column as the index
+    # (the ID column is dropped and the dates are parsed while loading)
+    incidents = incidents.set_index('Date')
+
+    # Rename 'Other' incidents as 'Uncategorized'
+    # (a type renamed to one that's already there is merged with it, so the
+    # types are renamed and the codes mapped to the merged types, kept in
+    # alphabetical order as the text values were)
+    types = incidents['Type'].cat
+    renamed = types.categories.str.replace('Other', 'Uncategorized')
+    categories = renamed.unique().sort_values()
+    codes = np.append(categories.get_indexer(renamed), -1)[types.codes]
+    incidents['Type'] = pd.Categorical.from_codes(codes, categories=categories)
+    return incidents, incident_counts
+
+
+@memoize
+def summarize(incidents, incident_counts):
+    """
+    Work out the incident tables. Returns a dict of them by name.
+
+    The tables are kept on disk and reused while the incidents are the same
+    (see winnipeg_data.memo).
+    """
+    results = {}
+
+    # Get the earliest recorded incident for each library
+    results['first_incident'] = incidents.groupby('Location', observed=True).apply(
+        lambda x: x.index.min()).sort_values()
+
+    # Count the incidents by year, month, day of week, hour, library, type and
+    # seriousness in one pass
+    # Only the combinations that occur are kept, and every table below by
+    # any of these is a slice and sum of them rather than another scan
+    tensor = CountTensor.from_events({column: incidents[column] for column in ['Location', 'Type', 'Serious']},
+                                     incidents.index)
+    results['incident_tensor'] = tensor
+
+    # Sort the number of incidents by library
+    results['by_library'] = tensor.marginal('Location').sort_values(ascending=False)
+
+    # Group incidents by seriousness
+    results['by_seriousness'] = tensor.marginal('Serious')
+
+    # Get the serious incidents by type
+    results['serious_by_type'] = tensor.select(Serious='Yes').marginal('Type').sort_values()
+
+    # Sort incidents by type
+    results['by_type'] = tensor.marginal('Type').sort_values()
+
+    # Get the number of incidents by year
+    # (the tensor's year totals include the incidents with no library, which
+    # the stored counts by library leave out)
+    results['by_year'] = tensor.marginal('year').rename_axis(incidents.index.name)
+
+    # Get the incidents for the year 2012 (there are only two incidents recorded)
+    results['incidents_2012'] = incidents.loc['2012']
+
+    # Remove the year 2012 just to make things simpler (incomplete data)
+    incidents = incidents.sort_index().loc['2013':'2023'] # sorted to avoid deprecation warning
+    tensor = tensor.select(year=range(2013, 2024))
+
+    # Get the number of incidents by month, day of week, time of day and hour
+    # (the time of day, to the second, isn't one of the tensor's dimensions)
+    results['by_month'] = tensor.marginal('month')
+    results['by_day_of_week'] = tensor.marginal('dayofweek')
+    results['by_time'] = incidents.groupby(incidents.index.time).size()
+    results['by_hour'] = tensor.marginal('hour')
+
+    # Get the most common incident reported at each library
+    # (the first type in category order wins a tie)
+    results['most_common_incidents'] = tensor.mode('Location', 'Type')
+
+    # Get the most common incident reported at each library each year
+    # The type with the highest occurrence is picked for each library and year
+    most_common_incidents_by_year = tensor.mode(['Location', 'year'], 'Type')
+
+    # Unstack for ease of viewing
+    results['most_common_incidents_by_year'] = most_common_incidents_by_year.unstack(level=0).fillna('-')
+
+    # Get the number of incidents by year and type, by year and library, and
+    # by year, library, and type
+    # All three are sums of the same counts
+    results['by_year_and_type'] = tensor.table('year', 'Type')
+    results['by_year_and_library'] = tensor.table('year', 'Location')
+    results['by_year_library_type'] = tensor.table('year', ['Location', 'Type'])
+
+    # Get the daily number of incidents (from the first to the last day with any since 2013)
+    # All the incidents are counted, including the ones with no library
+    results['daily_incidents'] = DailyIndex.from_times(incidents.index).series()
+
+    # Get the daily number of incidents at the Millennium library
+    # The daily counts are kept with their cumulative sums, so the weekly sums
+    # for the charts are just differences of them
+    results['millennium_days'] = incident_counts.daily('Millennium').loc('2013', '2023')
+    results['daily_millennium_incidents'] = results['millennium_days'].series()
+    return results
+
+
+def report(results):
+    """Print the text summary."""
+    print(results['first_incident'])
+    print(results['by_seriousness'])
+    print(results['incidents_2012'])
+    print(results['most_common_incidents'])
+
+    # Show the most common incidents per year at Millennium library
+    print(results['most_common_incidents_by_year']['Millennium'])
+
+
+def annotation(date, days, text_height, arrow_height, text):
+    """Get the axes call for a red arrow pointing at a date."""
+    return ('annotate', (), dict(xytext=(date + datetime.timedelta(days=days), text_height),
+                                 xy=(date, arrow_height), text=text,
+                                 arrowprops=dict(color='red', arrowstyle='->'),
+                                 bbox=dict(pad=5, facecolor="none", edgecolor="none")))
+
+
+def figures(results):
+    """Describe the charts."""
+    figures = []
+
+    # Show the number of incidents for each library
+    figures.append(FigureSpec('by_library', [(results['by_library'].sort_values(ascending=True), {'kind': 'barh'})],
+                              xlabel='Number of incidents', ylabel='Library',
+                              title='Reported Library Incidents Since 2012'))
+
+    # Show only serious incidents
+    figures.append(FigureSpec('serious_by_type', [(results['serious_by_type'], {'kind': 'barh'})],
+                              xlabel='Number of incidents', ylabel='Incident type',
+                              title='Library Incidents Listed as "Serious" Since 2012',
+                              xticks=range(0, 25, 5)))
+
+    # Show total incidents by type
+    figures.append(FigureSpec('by_type', [(results['by_type'], {'kind': 'barh'})],
+                              xlabel='Number of incidents', ylabel='Incident type',
+                              title='Library Incidents Since 2012'))
+
+    # Show the number of incidents each year
+    figures.append(FigureSpec('by_year', [(results['by_year'].loc['2013':'2021'], {'kind': 'bar'})],
+                              xlabel='Year', ylabel='Number of incidents',
+                              title='Yearly Library Incidents'))
+
+    # Show the number of incidents each month
+    figures.append(FigureSpec('by_month', [(results['by_month'], {'kind': 'bar'})],
+                              xlabel='Month', ylabel='Number of incidents',
+                              title='Library Incidents by Month',
+                              xticklabels=['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul',
+                                           'Aug', 'Sep', 'Oct', 'Nov', 'Dec']))
+
+    # Show the number of incidents each day of the week
+    figures.append(FigureSpec('by_day_of_week', [(results['by_day_of_week'], {'kind': 'bar'})],
+                              xlabel='Day of week', ylabel='Number of incidents',
+                              title='Library Incidents by Day of Week',
+                              xticklabels=['Mon', 'Tues', 'Wed', 'Thurs', 'Fri', 'Sat', 'Sun']))
+
+    # Show the incidents by time of occurrence
+    hourly_ticks = 4*60*60*np.arange(6)
+    figures.append(FigureSpec('by_time', [(results['by_time'], {'xticks': hourly_ticks})],
+                              xlim=[0, 4*60*60*6], xlabel='Time of Day',
+                              ylabel='Number of incidents',
+                              title='Library Incidents by Time of Occurrence'))
+
+    # Show the hourly figures
+    figures.append(FigureSpec('by_hour', [(results['by_hour'], {})],
+                              xticks=[0, 4, 8, 12, 16, 20], xlim=[0, 23],
+                              xticklabels=['00:00', '04:00', '08:00', '12:00', '16:00', '20:00'],
+                              xlabel='Time of day', ylabel='Number of incidents',
+                              title='Hourly Library Incidents'))
+
+    # Pick a few types of incidents and show how they've varied over the years
+    incident_list = ['Inappropriate Behaviour', 'Intoxication', 'Assault']
+    figures.append(FigureSpec('by_year_and_type',
+                              [(results['by_year_and_type'][incident_list], {'kind': 'bar'})],
+                              ylim=[0, 300], xlabel='Year', ylabel='Number of incidents',
+                              title='Library Incidents Over Time',
+                              calls=[('legend', (), {'loc': 'best', 'title': 'Incident Type'})]))
+
+    # Pick a few libraries and show how incidents varied over the years
+    library_list = ['St. Vital', 'Louis Riel', 'Cornish']
+    figures.append(FigureSpec('by_year_and_library',
+                              [(results['by_year_and_library'][library_list], {'kind': 'bar'})],
+                              xlabel='Year', ylabel='Number of incidents',
+                              title='Library Incidents Over Time',
+                              calls=[('legend', (), {'loc': 'upper left', 'title': 'Library'})]))
+
+    # For Millennium library, pick a few types of incidents, and show how they've varied over time
+    incident_list = ['Inappropriate Behaviour', 'Intoxication', 'Uncategorized']
+    figures.append(FigureSpec('millennium_by_year_and_type',
+                              [(results['by_year_library_type']['Millennium'][incident_list], {'kind': 'bar'})],
+                              ylim=[0, 300], xlabel='Year', ylabel='Number of incidents',
+                              title='Library Incidents Over Time (Millennium Library)',
+                              calls=[('legend', (), {'loc': 'upper left', 'title': 'Incident Type'})]))
+
+    millennium_days = results['millennium_days']
+    screening_line = ('axvline', (), {'x': MILLENNIUM_SCREENING, 'linestyle': '--', 'color': 'r'})
+
+    # Sum the weekly incidents and show them for 2018 and 2019
+    figures.append(FigureSpec('millennium_weekly_2018_2019',
+                              [(millennium_days.weekly('2018', '2018'), {'panel': 0}),
+                               (millennium_days.weekly('2019', '2019'), {'panel': 1})],
+                              nrows=2, figsize=(10, 10),
+                              ylabel='Number of incidents', ylim=[0, 30],
+                              title='Weekly Incidents at Millennium Library in 2018 and 2019',
+                              calls=[('set_ylabel', ('Number of incidents',), {}),
+                                     ('set_ylim', ([0, 30],), {}),
+                                     screening_line,
+                                     annotation(MILLENNIUM_SCREENING, 10, 25, 22.5,
+                                                'enhanced screening begins')]))
+
+    # Alternatively, view the total weekly incidents for 2018 and 2019 on a single chart
+    figures.append(FigureSpec('millennium_weekly_2017_2019',
+                              [(millennium_days.weekly('2017', '2019', kind='period'), {})],
+                              figsize=(10, 5), ylabel='Number of incidents', ylim=[0, 25],
+                              title='Total Weekly Incidents at Millennium Library',
+                              calls=[screening_line,
+                                     annotation(MILLENNIUM_SCREENING, 20, 20, 15.5,
+                                                'enhanced screening begins')]))
+
+    # Show the total weekly incidents going from 2013 to 2021
+    figures.append(FigureSpec('millennium_weekly',
+                              [(millennium_days.weekly('2013', '2021'), {})],
+                              figsize=(30, 5), ylabel='Number of incidents', ylim=[0, 25],
+                              title='Weekly Incidents at Millennium Library',
+                              calls=[screening_line,
+                                     annotation(MILLENNIUM_SCREENING, 20, 20, 15.5,
+                                                'enhanced screening \nbegins'),
+                                     ('axvline', (), {'x': FIRST_LOCKDOWN, 'linestyle': '--', 'color': 'r'}),
+                                     annotation(FIRST_LOCKDOWN, 15, 15, 12.5,
+                                                'COVID-19 pandemic \nbegins')]))
+    return figures
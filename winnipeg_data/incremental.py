@@ -0,0 +1,189 @@
+"""
+Incremental refresh for the append-only datasets (pass-ups and incidents).
+
+These datasets only ever grow, so after the first full download only the rows
+from the stored high-water mark on are fetched, through a filtered and paged
+query on the portal's API. The pages are ordered by time and then by the
+portal's row id, so tied times can't move between pages. Rows stamped with
+the high-water mark itself are fetched again (more can be published later)
+and the ones already in the snapshot are dropped. The new rows are appended
+to the cached snapshot, and the stored temporal counts (see
+winnipeg_data.temporal) are updated with just the new rows rather than
+recomputed. The cost of a refresh scales with the number of new rows, not
+with the whole history.
+
+Rows are assumed to arrive in time order: a row stamped before the
+high-water mark that shows up later won't be picked up (a full reload with
+DatasetCache.clear() will).
+"""
+import hashlib
+import io
+import re
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from winnipeg_data.cache import get_cache, load_options
+from winnipeg_data.schemas import SCHEMAS, SODA_TIMESTAMP
+from winnipeg_data.temporal import TemporalCounts, count_events
+
+# Dataset id -> (time column, category column for the stored counts)
+APPEND_ONLY = {
+    'mer2-irmb': ('Time', 'Pass-Up Type'),
+    'ffe7-mwdv': ('Date', 'Location'),
+}
+
+
+def api_field_name(column):
+    """Get the API field name for a column (e.g. 'Pass-Up Type' -> 'pass_up_type')."""
+    return re.sub(r'[^0-9a-z]+', '_', column.lower()).strip('_')
+
+
+def query_url(base_url, dataset_id, where, order, limit, offset):
+    params = urllib.parse.urlencode({'$where': where, '$order': order,
+                                     '$limit': limit, '$offset': offset})
+    return f'{base_url.rstrip("/")}/resource/{dataset_id}.csv?{params}'
+
+
+def fetch_new_rows(dataset_id, columns, time_column, since, base_url, page_size=50000,
+                   timeout=60):
+    """
+    Fetch the rows stamped at or after `since`, a page at a time.
+
+    The API's field names are mapped back onto `columns`; any other fields
+    are dropped. Returns the raw (unconverted) rows.
+    """
+    field = api_field_name(time_column)
+    where = f"{field} >= '{since.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]}'"
+    # The portal doesn't keep tied rows in the same order from one request to
+    # the next, so the row id breaks the ties
+    order = f'{field},:id'
+    names = {api_field_name(c): c for c in columns}
+
+    pages = []
+    offset = 0
+    while True:
+        url = query_url(base_url, dataset_id, where, order, page_size, offset)
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            page = pd.read_csv(io.BytesIO(response.read()), dtype=str)
+        page = page[[f for f in page if f in names]].rename(columns=names)
+        pages.append(page)
+        if len(page) < page_size:
+            break
+        offset += page_size
+    return pd.concat(pages, ignore_index=True)
+
+
+def drop_seen(new_rows, snapshot, time_column, since):
+    """
+    Drop the fetched rows stamped with the high-water mark that the snapshot already has.
+
+    Identical rows are matched one for one, so a row repeated in the
+    dataset is kept as often as it is there.
+    """
+    at_mark = (new_rows[time_column] == since).to_numpy()
+    seen = snapshot[snapshot[time_column] == since]
+    if not at_mark.any() or not len(seen):
+        return new_rows
+
+    # Compare the rows by their text, so the categorical columns match too
+    columns = [c for c in snapshot if c in new_rows]
+    seen = pd.util.hash_pandas_object(seen[columns].astype(str), index=False)
+    fetched = pd.util.hash_pandas_object(new_rows.loc[at_mark, columns].astype(str), index=False)
+
+    # The nth copy of a row is new if the snapshot has fewer than n of them
+    copies = fetched.groupby(fetched).cumcount().to_numpy()
+    known = fetched.map(seen.value_counts()).fillna(0).to_numpy()
+    keep = np.ones(len(new_rows), dtype=bool)
+    keep[np.flatnonzero(at_mark)[copies < known]] = False
+    return new_rows[keep].reset_index(drop=True)
+
+
+def append_rows(snapshot, new_rows, categories):
+    """Append new rows, keeping the categorical columns categorical."""
+    frame = pd.concat([snapshot, new_rows], ignore_index=True)
+    for column in categories:
+        if column in frame and not isinstance(frame[column].dtype, pd.CategoricalDtype):
+            frame[column] = frame[column].astype('category')
+    return frame
+
+
+def refresh_dataset(dataset_id, cache=None, page_size=50000):
+    """
+    Load an append-only dataset, fetching only the rows added since last time.
+
+    Returns the full frame and its TemporalCounts (by the dataset's category
+    column), both kept up to date on disk.
+    """
+    cache = cache or get_cache()
+    schema = SCHEMAS[dataset_id]
+    time_column, category_column = APPEND_ONLY[dataset_id]
+    counts_path = cache.dataset_dir(dataset_id) / 'counts.npz'
+
+    meta = cache.read_metadata(dataset_id)
+    if meta is not None and meta.get('options') != load_options(schema):
+        # The snapshot was parsed with a different schema, so it isn't reused
+        meta = None
+    if meta is not None:
+        frame = cache.read_snapshot(dataset_id, meta)
+        since = frame[time_column].max()
+        if pd.isna(since):
+            # There is no high-water mark (the snapshot is empty, or has no times)
+            meta = None
+
+    if meta is None:
+        # First run (or nothing to carry on from): download everything
+        # (cache.load only skips the download if the server says the
+        # snapshot, parsed with the current schema, is still current)
+        frame = cache.load(dataset_id, schema=schema)
+        meta = cache.read_metadata(dataset_id)
+    else:
+        try:
+            new_rows = fetch_new_rows(dataset_id, frame.columns, time_column, since,
+                                      cache.base_url, page_size, cache.timeout)
+        except (urllib.error.URLError, OSError) as e:
+            warnings.warn(f'Could not refresh {dataset_id} ({e}); '
+                          f'using the cached snapshot from {meta["fetched"]}')
+            new_rows = None
+
+        if new_rows is not None and len(new_rows):
+            new_rows = schema.convert(new_rows, date_format=SODA_TIMESTAMP)
+            new_rows = drop_seen(new_rows, frame, time_column, since)
+
+        if new_rows is not None and len(new_rows):
+            frame = append_rows(frame, new_rows, schema.categories)
+
+            # The new version depends on the old one and the rows added to it
+            old_version = meta['version']
+            digest = hashlib.sha256(old_version.encode())
+            digest.update(pd.util.hash_pandas_object(new_rows, index=False).values.tobytes())
+            meta['version'] = digest.hexdigest()[:16]
+            meta['snapshot'] = cache.write_snapshot(dataset_id, frame, meta['version'])
+            cache.remove_old_snapshots(dataset_id, keep=meta['snapshot'])
+
+            if counts_path.exists() and meta.get('counts_version') == old_version:
+                counts = TemporalCounts.load(counts_path)
+                counts.merge(TemporalCounts(new_rows[time_column], new_rows[category_column]))
+                counts.save(counts_path)
+                meta['counts_version'] = meta['version']
+
+        if new_rows is not None:
+            meta['checked'] = time.time()
+            meta['fetched'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        cache.write_metadata(dataset_id, meta)
+
+    if meta.get('counts_version') == meta['version'] and counts_path.exists():
+        counts = TemporalCounts.load(counts_path)
+    else:
+        # Count the whole history (a year at a time on several processes, if
+        # WINNIPEG_DATA_PROCESSES is set)
+        counts = count_events(frame[time_column], frame[category_column])
+        counts.save(counts_path)
+        meta['counts_version'] = meta['version']
+        cache.write_metadata(dataset_id, meta)
+    return frame, counts
@@ -0,0 +1,96 @@
+"""
+Gridded Gaussian kernel density estimation by binning and FFT convolution.
+
+The points are linearly binned onto a grid a few times finer than the
+bandwidth, the binned counts are convolved with a sampled Gaussian kernel
+using an FFT, and the result is read off at the requested grid nodes. The cost
+depends on the size of the grid rather than on (points x grid nodes), so a
+200x200 density map of the whole tree inventory takes seconds.
+
+Error bound
+-----------
+The estimate is normalized the same way as sklearn's
+KernelDensity(kernel='gaussian').score_samples. Linear binning replaces each
+point's kernel with its bilinear interpolant between the surrounding grid
+nodes, so for fine grid spacings dx, dy the absolute error at any node is at
+most
+
+    (dx**2 + dy**2) / (8 * h**2) * peak,   peak = 1 / (2 * pi * h**2)
+
+plus exp(-truncate**2 / 2) * peak for cutting the kernel off at `truncate`
+bandwidths. With the default oversample=4 (dx, dy <= h/4) and truncate=5 this
+is under 1.6% of the height of a single kernel; see error_bound.
+"""
+import math
+
+import numpy as np
+from scipy.signal import fftconvolve
+
+
+def error_bound(bandwidth, dx, dy, truncate=5.0):
+    """Get the largest possible absolute error of binned_kde for a given fine grid."""
+    peak = 1 / (2*math.pi*bandwidth**2)
+    binning = (dx**2 + dy**2) / (8*bandwidth**2)
+    return (binning + math.exp(-truncate**2/2)) * peak
+
+
+def fine_spacing(spacing, bandwidth, oversample):
+    """Get the refinement factor and fine grid spacing for one axis."""
+    factor = max(1, math.ceil(spacing * oversample / bandwidth))
+    return factor, spacing / factor
+
+
+def linear_bin(x, y, x0, y0, dx, dy, shape):
+    """Spread each point over the four surrounding grid nodes."""
+    fx = (x - x0) / dx
+    fy = (y - y0) / dy
+    i = np.floor(fx).astype(np.intp)
+    j = np.floor(fy).astype(np.intp)
+    keep = (i >= 0) & (i < shape[1] - 1) & (j >= 0) & (j < shape[0] - 1)
+    i, j = i[keep], j[keep]
+    wx, wy = fx[keep] - i, fy[keep] - j
+
+    size = shape[0]*shape[1]
+    flat = j*shape[1] + i
+    counts = np.bincount(flat, (1 - wx)*(1 - wy), minlength=size)
+    counts += np.bincount(flat + 1, wx*(1 - wy), minlength=size)
+    counts += np.bincount(flat + shape[1], (1 - wx)*wy, minlength=size)
+    counts += np.bincount(flat + shape[1] + 1, wx*wy, minlength=size)
+    return counts.reshape(shape)
+
+
+def binned_kde(x, y, bandwidth, xgrid, ygrid, oversample=4, truncate=5.0):
+    """
+    Estimate a Gaussian kernel density on a regular grid.
+
+    xgrid and ygrid are evenly spaced (e.g. from np.linspace), and the result
+    has shape (len(ygrid), len(xgrid)), matching np.meshgrid(xgrid, ygrid).
+    Points with missing (non-finite) coordinates are left out.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    finite = np.isfinite(x) & np.isfinite(y)
+    x, y = x[finite], y[finite]
+    xgrid = np.asarray(xgrid, dtype=float)
+    ygrid = np.asarray(ygrid, dtype=float)
+    n = len(x)
+
+    # Refine the grid so that the spacing is at most bandwidth/oversample and
+    # every requested node is also a fine grid node
+    rx, dx = fine_spacing(xgrid[1] - xgrid[0], bandwidth, oversample)
+    ry, dy = fine_spacing(ygrid[1] - ygrid[0], bandwidth, oversample)
+
+    # Pad the grid so that points just outside it still contribute
+    px = math.ceil(truncate * bandwidth / dx)
+    py = math.ceil(truncate * bandwidth / dy)
+    shape = ((len(ygrid) - 1)*ry + 1 + 2*py, (len(xgrid) - 1)*rx + 1 + 2*px)
+    counts = linear_bin(x, y, xgrid[0] - px*dx, ygrid[0] - py*dy, dx, dy, shape)
+
+    kx = np.exp(-0.5*(np.arange(-px, px + 1)*dx / bandwidth)**2)
+    ky = np.exp(-0.5*(np.arange(-py, py + 1)*dy / bandwidth)**2)
+    density = fftconvolve(counts, np.outer(ky, kx), mode='same')
+    density = np.clip(density, 0, None) / (n * 2*math.pi*bandwidth**2)
+
+    rows = py + ry*np.arange(len(ygrid))
+    cols = px + rx*np.arange(len(xgrid))
+    return density[np.ix_(rows, cols)]
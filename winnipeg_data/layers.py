@@ -0,0 +1,108 @@
+"""
+Concurrent loading of datasets, and reference layers shared within a process.
+
+load_all fetches the datasets a run needs (e.g. the trees and the ward and
+neighbourhood boundaries) at the same time, in a bounded pool of threads, so
+the wait is about that of the slowest download rather than their sum. The
+downloads and the CSV parser release the GIL.
+
+Reference layers (the city, ward and neighbourhood boundaries) are loaded
+from the boundary store (see winnipeg_data.boundary_store) as soon as they
+arrive, in the same thread, and kept for the rest of the process: the trees
+and pass-up analyses get the same city boundary without downloading or
+parsing it twice. prefetch starts on layers that are only needed later (e.g.
+for the maps) in the background.
+
+Everything goes through winnipeg_data.cache, so WINNIPEG_DATA_URL can point it
+at a local file server.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from winnipeg_data.cache import load_dataset
+
+# Most downloads to run at once
+MAX_WORKERS = 4
+
+_pool = None
+_lock = threading.Lock()
+# Dataset id -> future of the layer
+_layers = {}
+
+
+def get_pool():
+    """Get the shared download pool."""
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='winnipeg-data')
+        return _pool
+
+
+def as_layer(frame, geometry='the_geom'):
+    """Get a dataset with a WKT geometry column as a GeoDataFrame (latitude/longitude)."""
+    import geopandas as gpd
+    from winnipeg_data.geometry import decode_geometries
+
+    if isinstance(frame, gpd.GeoDataFrame):
+        return frame
+    frame = frame.copy()
+    frame[geometry], _, _ = decode_geometries(frame[geometry])
+    return gpd.GeoDataFrame(frame, geometry=geometry).set_crs('EPSG:4326')
+
+
+def fetch_layer(dataset_id):
+    """Load a reference layer from the boundary store."""
+    from winnipeg_data.boundary_store import load_layer
+    return load_layer(dataset_id)
+
+
+def prefetch(dataset_ids):
+    """Start loading reference layers in the background, if they aren't already."""
+    pool = get_pool()
+    with _lock:
+        for dataset_id in dataset_ids:
+            if dataset_id not in _layers:
+                _layers[dataset_id] = pool.submit(fetch_layer, dataset_id)
+        return [_layers[dataset_id] for dataset_id in dataset_ids]
+
+
+def get_layer(dataset_id, crs=None):
+    """
+    Get a reference layer as a GeoDataFrame, loading it only once per process.
+
+    The layer is in latitude/longitude, or in the given crs (EPSG:4326 or
+    EPSG:32614 are precomputed). Returns a copy, so it can be changed freely.
+    """
+    future, = prefetch([dataset_id])
+    try:
+        layer = future.result()
+    except Exception:
+        # Let the next call try again
+        with _lock:
+            if _layers.get(dataset_id) is future:
+                del _layers[dataset_id]
+        raise
+    if crs is not None:
+        from winnipeg_data.boundary_store import with_crs
+        layer = with_crs(layer, crs)
+    return layer.copy()
+
+
+def load_all(dataset_ids, layer_ids=()):
+    """
+    Load several datasets and reference layers at the same time.
+
+    Returns the datasets (as DataFrames) followed by the layers (as parsed
+    GeoDataFrames), in the order given.
+    """
+    pool = get_pool()
+    prefetch(layer_ids)
+    datasets = [pool.submit(load_dataset, dataset_id) for dataset_id in dataset_ids]
+    return tuple(f.result() for f in datasets) + tuple(get_layer(i) for i in layer_ids)
+
+
+def clear():
+    """Forget the shared layers (e.g. after the cache has been refreshed)."""
+    with _lock:
+        _layers.clear()
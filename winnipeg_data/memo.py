@@ -0,0 +1,194 @@
+"""
+On-disk memoization of derived tables, keyed by the content of their inputs.
+
+The analysis stages (e.g. trees.summarize, incidents.summarize, the tree
+density bandwidth search) are pure functions of the datasets they're given and a few
+parameters, so when a report is run again on the same snapshots their results
+can be read back instead of worked out again. A stage wrapped with memoize is
+looked up by a hash of:
+
+- the contents of its arguments (every column and the index of a DataFrame,
+  geometries as WKB, numpy arrays, the package's own containers such as
+  PointTable and TemporalCounts, and plain parameters),
+- its name, and
+- the source of the winnipeg_data package, so changing the code starts afresh.
+
+A new snapshot of a dataset has different contents, so it gets a new key and
+the results for the old one are never used again. The results are pickled
+(numpy and pandas data as raw buffers) into the 'derived' directory of the
+dataset cache, and the least recently used ones are removed when the total
+goes over the size budget: WINNIPEG_DATA_MEMO_SIZE megabytes (256 by
+default, 0 to turn memoization off).
+"""
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Environment variable with the size budget, in megabytes
+SIZE_VARIABLE = 'WINNIPEG_DATA_MEMO_SIZE'
+DEFAULT_SIZE = 256
+
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """Get a hash of the package's source files."""
+    digest = hashlib.sha256()
+    for path in sorted(Path(__file__).parent.glob('*.py')):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def update_hash(digest, value):
+    """Add the contents of a value to a hash. Raises TypeError for values it can't hash."""
+    digest.update(type(value).__name__.encode())
+    if isinstance(value, pd.DataFrame):
+        digest.update(repr([(c, str(t)) for c, t in value.dtypes.items()]).encode())
+        update_hash(digest, value.index)
+        for column in value:
+            update_hash(digest, value[column])
+    elif isinstance(value, (pd.Series, pd.Index)):
+        if str(value.dtype) == 'geometry':
+            import shapely
+            digest.update(repr(value.crs).encode())
+            update_hash(digest, shapely.to_wkb(value.to_numpy()))
+        else:
+            digest.update(str(value.dtype).encode())
+            hashes = pd.util.hash_pandas_object(value, index=False).to_numpy()
+            digest.update(hashes.tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(f'{value.dtype}{value.shape}'.encode())
+        if value.dtype == object:
+            update_hash(digest, pd.Series(value.ravel()))
+        else:
+            digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            update_hash(digest, item)
+    elif isinstance(value, dict):
+        for key in sorted(value, key=repr):
+            digest.update(repr(key).encode())
+            update_hash(digest, value[key])
+    elif value is None or isinstance(value, (bool, int, float, str, bytes, np.generic)):
+        digest.update(repr(value).encode())
+    elif type(value).__module__.startswith('winnipeg_data.'):
+        # The package's own containers (PointTable, TemporalCounts, ...)
+        update_hash(digest, vars(value))
+    else:
+        raise TypeError(f"Can't hash a {type(value).__name__} for memoization")
+
+
+class MemoStore:
+    """Pickled results in a directory, evicted least recently used first."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return self.directory / f'{key}.pickle'
+
+    def get(self, key):
+        """Get a stored result, or raise KeyError."""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            raise KeyError(key) from None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # A damaged or outdated file is worked out again
+            path.unlink(missing_ok=True)
+            raise KeyError(key) from None
+        # Mark it as recently used
+        os.utime(path)
+        return value
+
+    def put(self, key, value):
+        """Store a result, then remove the least recently used ones over the budget."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(key)
+        tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used results until the rest fit the budget."""
+        entries = []
+        for path in self.directory.glob('*.pickle'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        for path in self.directory.glob('*.pickle'):
+            path.unlink(missing_ok=True)
+
+
+def get_store():
+    """Get the store in the dataset cache, or None if memoization is turned off."""
+    from winnipeg_data.cache import get_cache
+
+    megabytes = float(os.environ.get(SIZE_VARIABLE, DEFAULT_SIZE))
+    if megabytes <= 0:
+        return None
+    return MemoStore(get_cache().cache_dir / 'derived', int(megabytes * 2**20))
+
+
+def memoize(function=None, ignore=()):
+    """
+    Memoize a stage on disk, keyed by the contents of its arguments.
+
+    Arguments named in ignore (e.g. the number of processes) don't change
+    the result, so they're left out of the key. Calls with arguments that
+    can't be hashed just run the stage.
+    """
+    if function is None:
+        return functools.partial(memoize, ignore=ignore)
+    signature = inspect.signature(function)
+    name = f'{function.__module__}.{function.__qualname__}'
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        store = get_store()
+        if store is None:
+            return function(*args, **kwargs)
+
+        # Hash the arguments (with the defaults filled in) and the code
+        arguments = signature.bind(*args, **kwargs)
+        arguments.apply_defaults()
+        digest = hashlib.sha256(f'{name}:{code_version()}'.encode())
+        try:
+            for key, value in arguments.arguments.items():
+                if key not in ignore:
+                    digest.update(key.encode())
+                    update_hash(digest, value)
+        except TypeError:
+            return function(*args, **kwargs)
+        key = digest.hexdigest()
+
+        try:
+            return store.get(key)
+        except KeyError:
+            pass
+        result = function(*args, **kwargs)
+        store.put(key, result)
+        return result
+
+    return wrapper
\ No newline at end of file
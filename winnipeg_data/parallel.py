@@ -0,0 +1,152 @@
+"""
+Partitioned execution of per-row-range or per-key steps on several cores.
+
+The numeric columns a step needs (codes, coordinates, values, timestamps as
+integers) are copied once into shared memory, and a pool of worker processes
+attaches to them without copying or pickling the data. The rows are split
+into partitions, either by row ranges or by a key (ward, year, route), each
+worker runs the step on its partitions' rows, and the partial results (which
+should be mergeable, like GroupStats or TemporalCounts) are returned to be
+combined. Anything else a step needs (polygons, categories) is sent to each
+worker once, when it starts.
+
+The number of processes defaults to the WINNIPEG_DATA_PROCESSES environment
+variable (0 for one per core), or 1. With one process the partitions are run
+in this process, with no pool and no copies.
+
+Like render_figures, this has to be called from under an
+`if __name__ == '__main__'` guard on platforms that start worker processes by
+spawning (Windows, macOS).
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Environment variable with the default number of worker processes
+PROCESSES_VARIABLE = 'WINNIPEG_DATA_PROCESSES'
+
+
+class SharedArrays:
+    """Copies of numpy arrays in shared memory, freed on exit from a with block."""
+
+    def __init__(self, arrays):
+        self.blocks = []
+        # Column name -> (shared memory block name, dtype, shape)
+        self.specs = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+            self.blocks.append(block)
+            self.specs[name] = (block.name, array.dtype.str, array.shape)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+
+
+def attach(specs):
+    """Get views of shared arrays in a worker. Returns the arrays and their blocks."""
+    arrays, blocks = {}, []
+    for name, (block_name, dtype, shape) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        arrays[name] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+        blocks.append(block)
+    return arrays, blocks
+
+
+def default_processes():
+    """Get the number of worker processes to use when none is given."""
+    processes = int(os.environ.get(PROCESSES_VARIABLE, 1))
+    return processes or os.cpu_count()
+
+
+def partition_rows(n_rows, n_partitions):
+    """Split rows 0..n_rows into contiguous (start, stop) ranges."""
+    bounds = np.linspace(0, n_rows, max(1, min(n_partitions, n_rows)) + 1).astype(int)
+    return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def partition_by_key(codes, n_partitions):
+    """
+    Split rows so that all the rows with the same key are in one partition.
+
+    codes are integer key codes (e.g. categorical codes, or years). Returns
+    the row order (rows sorted by key) and (start, stop) ranges into it, with
+    keys spread over the partitions so each has about the same number of rows.
+    """
+    codes = np.asarray(codes)
+    order = np.argsort(codes, kind='stable')
+    keys = codes[order]
+    # Positions where a new key starts; a partition may only end at one
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    targets = np.linspace(0, len(codes), max(1, n_partitions) + 1)[1:-1]
+    cuts = np.unique(starts[np.clip(np.searchsorted(starts, targets), 0, len(starts) - 1)])
+    bounds = np.r_[0, cuts[cuts > 0], len(codes)]
+    return order, [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def split(n_rows, processes, keys=None, per_process=4):
+    """
+    Partition n_rows rows for `processes` processes: by row ranges, or by key.
+
+    Returns the row order (None for row ranges) and the partitions. A few
+    partitions per process even out the load when they take different times.
+    """
+    n_partitions = 1 if processes == 1 else per_process*processes
+    if keys is None:
+        return None, partition_rows(n_rows, n_partitions)
+    return partition_by_key(keys, n_partitions)
+
+
+# Worker state, set up once per process by init_worker
+_columns = None
+_blocks = None
+_context = None
+
+
+def init_worker(specs, context):
+    global _columns, _blocks, _context
+    _columns, _blocks = attach(specs)
+    _context = context
+
+
+def take(columns, partition, order):
+    """Get the rows of one partition from every column."""
+    start, stop = partition
+    rows = slice(start, stop) if order is None else order[start:stop]
+    return {name: column[rows] for name, column in columns.items() if name != 'order'}
+
+
+def run_partition(function, partition):
+    return function(take(_columns, partition, _columns.get('order')), _context)
+
+
+def run_partitioned(function, columns, partitions, order=None, context=None, processes=None):
+    """
+    Run function(rows, context) on each partition of the columns.
+
+    columns maps names to equal-length arrays; rows is the same mapping
+    restricted to one partition's rows. partitions are (start, stop) ranges
+    of rows, or of `order` (as from partition_by_key). function must be
+    importable by the workers (defined at module level). Returns the results
+    in partition order.
+    """
+    processes = processes or default_processes()
+    if processes == 1 or len(partitions) == 1:
+        return [function(take(columns, p, order), context) for p in partitions]
+
+    if order is not None:
+        columns = dict(columns, order=order)
+    with SharedArrays(columns) as shared:
+        with ProcessPoolExecutor(max_workers=min(processes, len(partitions)),
+                                 initializer=init_worker,
+                                 initargs=(shared.specs, context)) as pool:
+            futures = [pool.submit(run_partition, function, p) for p in partitions]
+            return [f.result() for f in futures]
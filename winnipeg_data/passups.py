@@ -0,0 +1,339 @@
+"""
+The "Transit Pass-ups" analysis (dataset mer2-irmb), in stages.
+
+load gets the pass-ups (fetching only the ones added since the last run),
+summarize works out the tables (pandas only), report prints them and figures
+describes the charts (see winnipeg_data.render). The maps and hotspots need
+the pass-up locations, which are only decoded and checked against the city
+boundary (with shapely and geopandas) by locate when they are asked for:
+locate_hotspots finds the hotspots (for `winnipeg-data passups --hotspots`
+and the maps) and report_hotspots prints them.
+"""
+import numpy as np
+import pandas as pd
+
+from winnipeg_data.daily import DailyMatrix
+from winnipeg_data.incremental import refresh_dataset
+from winnipeg_data.points import PointTable
+from winnipeg_data.raster import PointRaster
+from winnipeg_data.render import FigureSpec
+
+DATASET_ID = 'mer2-irmb'
+FULL_BUS = 'Full Bus Pass-Up'
+WHEELCHAIR = 'Wheelchair User Pass-Up'
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+WEEKDAYS = ['Mon', 'Tues', 'Wed', 'Thurs', 'Fri', 'Sat', 'Sun']
+
+# The pass-up columns kept with the located pass-ups
+LOCATED_COLUMNS = ['Pass-Up Type', 'Route Number', 'Route Name', 'Route Destination']
+
+# A hotspot is a place with at least HOTSPOT_MIN_PASSUPS pass-ups within
+# HOTSPOT_RADIUS metres of it (see winnipeg_data.hotspots)
+HOTSPOT_RADIUS = 100
+HOTSPOT_MIN_PASSUPS = 50
+
+# Reference layers the maps and hotspots need: the city boundary
+# (winnipeg_data.geometry). The CLI starts fetching them in the background
+FIGURE_LAYERS = ('2nyq-f444',)
+
+
+def load():
+    """
+    Load the pass-ups, indexed by time.
+
+    Returns the pass-ups and their TemporalCounts by pass-up type.
+    """
+    # Read the transit file (only the pass-ups added since the last run are downloaded)
+    # The times are parsed to datetimes while loading, and the pass-ups of each
+    # type are counted by time of day, hour, month, year, day of week and day,
+    # updating the stored counts with just the new pass-ups
+    passups, passup_counts = refresh_dataset(DATASET_ID)
+
+    # Set the time as index
+    passups = passups.set_index('Time')
+    return passups, passup_counts
+
+
+def summarize(passups, passup_counts):
+    """Work out the pass-up tables. Returns a dict of them by name."""
+    # Keep the pass-ups themselves for the maps and hotspots
+    results = {'passups': passups}
+
+    # Get the number of pass-up types
+    results['by_type'] = passups.groupby('Pass-Up Type', observed=True).size()
+
+    # Get the routes with the most pass-ups
+    results['by_route'] = passups.groupby('Route Name', observed=True).size().sort_values(ascending=False)
+
+    # Count the pass-ups on every route on every day in one pass
+    # The weekly sums, rolling averages and yearly totals of every route are
+    # then differences of the cumulative sums along each route's row
+    results['route_days'] = DailyMatrix.from_events(passups.index, passups['Route Name'])
+
+    # Get the pass-ups on every route each year, and each route's rank among
+    # all the routes in each year
+    results['by_route_and_year'] = results['route_days'].yearly()
+    results['route_ranks'] = results['by_route_and_year'].rank(axis=1, ascending=False, method='min')
+
+    # Analyze full bus pass-ups and wheelchair pass-ups separately
+    # Get full bus pass-ups by time of day, hour, month, year and day of week
+    for breakdown in ['time', 'hour', 'month', 'year', 'dayofweek']:
+        results[f'full_bus_by_{breakdown}'] = passup_counts.get(breakdown, FULL_BUS)
+
+    # Get the number of full bus pass-ups per day
+    # The daily counts are kept with their cumulative sums, so the weekly sums
+    # and rolling averages for the charts are just differences of them
+    results['full_bus_days'] = passup_counts.daily(FULL_BUS)
+    results['daily_full_bus'] = results['full_bus_days'].series()
+
+    # Repeat the above for wheelchair pass-ups only
+    for breakdown in ['month', 'year', 'dayofweek']:
+        results[f'wheelchair_by_{breakdown}'] = passup_counts.get(breakdown, WHEELCHAIR)
+    results['wheelchair_days'] = passup_counts.daily(WHEELCHAIR)
+    results['daily_wheelchair'] = results['wheelchair_days'].series()
+    return results
+
+
+def report(results):
+    """Print the text summary."""
+    # Show number of pass-up types
+    print(results['by_type'])
+
+    # Show which routes have the most pass-ups
+    print(results['by_route'][:10])
+
+
+def inside_partition(rows, context):
+    """Get the rows of one partition of pass-up locations that are inside the city."""
+    import shapely
+
+    city_limits = context['city_limits']
+    shapely.prepare(city_limits.polygon)
+    return rows['row'][city_limits.contains_xy(rows['x'], rows['y'])]
+
+
+def locate(passups, processes=None, partition_by=None):
+    """
+    Get the pass-ups with a location inside the city as a PointTable.
+
+    The locations are checked against the boundary in partitions (row
+    ranges, or the pass-ups of each 'year' or each value of the partition_by
+    column, e.g. 'Route Name') on `processes` worker processes (see
+    winnipeg_data.parallel). Returns the located pass-ups, the city
+    boundary and the number of locations that couldn't be parsed.
+    """
+    from winnipeg_data.containment import BoundaryIndex
+    from winnipeg_data.geometry import decode_points, load_boundary
+    from winnipeg_data.parallel import default_processes, run_partitioned, split
+
+    # Get the coordinates from the GPS data
+    # Invalid GPS data is left missing and counted
+    x, y, valid, errors = decode_points(passups['Location'])
+
+    # Let's try to eliminate points outside of Winnipeg
+    # Load the Winnipeg boundary file and convert to a GeoDataFrame
+    wpg_borders = load_boundary()
+
+    # Find the data points that are inside the city of Winnipeg boundary
+    # The boundary is rasterized first so only points near its edge need an exact test
+    city_limits = BoundaryIndex(wpg_borders.geometry.iloc[0])
+    columns = {'x': x, 'y': y, 'row': np.arange(len(passups))}
+    processes = processes or default_processes()
+    if partition_by == 'year':
+        keys = passups.index.year.to_numpy()
+    elif partition_by:
+        keys = pd.factorize(passups[partition_by])[0]
+    else:
+        keys = None
+    order, partitions = split(len(passups), processes, keys)
+    inside = np.zeros(len(passups), dtype=bool)
+    for rows in run_partitioned(inside_partition, columns, partitions, order,
+                                {'city_limits': city_limits}, processes):
+        inside[rows] = True
+
+    # Keep the pass-ups inside the city in a compact table (coordinates, with
+    # the pass-up type and route as codes, indexed by time); shapely points
+    # are only made if they're asked for
+    located = PointTable.from_frame(passups, x, y, LOCATED_COLUMNS)[inside]
+
+    # For simplicity, just remove all missing values
+    located = located.dropna()
+    return located, wpg_borders, errors
+
+
+def hotspot_table(located):
+    """
+    Find the places where pass-ups pile up.
+
+    Returns the hotspots (a GeoDataFrame of their outlines, ranked by number
+    of pass-ups) and a table of them with their pass-ups of each type and the
+    route with the most.
+    """
+    from winnipeg_data.hotspots import find_hotspots
+
+    # Cluster the pass-up locations, and count the pass-ups of each type and
+    # on each route in every hotspot
+    hotspots, splits = find_hotspots(located, HOTSPOT_RADIUS, HOTSPOT_MIN_PASSUPS,
+                                     split_by=['Pass-Up Type', 'Route Name'])
+    table = hotspots[['Count', 'Locations', 'Area']].join(splits['Pass-Up Type'])
+    table['Top Route'] = splits['Route Name'].idxmax(axis=1) if len(table) else []
+    return hotspots, table
+
+
+def locate_hotspots(results):
+    """
+    Locate the pass-ups and find the hotspots, adding them to the results.
+
+    This is only done once: the hotspot report and the maps share them.
+    """
+    if 'hotspots' not in results:
+        # Get the pass-ups located inside the city (and the boundary, for the maps)
+        # Invalid GPS data is left out and counted
+        results['located'], results['wpg_borders'], results['errors'] = locate(results['passups'])
+
+        # Find the places where pass-ups pile up
+        results['hotspots'], results['hotspot_summary'] = hotspot_table(results['located'])
+    return results
+
+
+def report_hotspots(results):
+    """Print the hotspots found by locate_hotspots."""
+    print(f"{results['errors']} pass-up locations could not be parsed")
+
+    # Show the places with the most pass-ups
+    print(f"{len(results['hotspots'])} pass-up hotspots")
+    print(results['hotspot_summary'][:10])
+
+
+def time_figures(results, kind, label):
+    """Describe the charts for one type of pass-up."""
+    figures = []
+
+    # Plot the time of day and hourly figures (full bus pass-ups only)
+    if f'{kind}_by_time' in results:
+        hourly_ticks = 4*60*60*np.arange(6)
+        figures.append(FigureSpec(f'{kind}_by_time', [(results[f'{kind}_by_time'], {'xticks': hourly_ticks})],
+                                  xlabel='Time of Day', ylabel='Number of pass-ups',
+                                  title=f'{label} Pass-ups by Time of Occurrence'))
+    if f'{kind}_by_hour' in results:
+        figures.append(FigureSpec(f'{kind}_by_hour', [(results[f'{kind}_by_hour'], {})],
+                                  xticks=[0, 4, 8, 12, 16, 20], xlim=[0, 23],
+                                  xticklabels=['00:00', '04:00', '08:00', '12:00', '16:00', '20:00'],
+                                  xlabel='Hour of occurrence', ylabel='Number of pass-ups',
+                                  title=f'{label} Pass-ups by Hour'))
+
+    # Plot the monthly figures
+    figures.append(FigureSpec(f'{kind}_by_month', [(results[f'{kind}_by_month'], {'kind': 'bar'})],
+                              xticklabels=MONTHS, xlabel='Month', ylabel='Number of pass-ups',
+                              title=f'{label} Pass-ups by Month'))
+
+    # Plot the yearly figures
+    figures.append(FigureSpec(f'{kind}_by_year', [(results[f'{kind}_by_year'], {'kind': 'bar'})],
+                              xlabel='Year', ylabel='Number of pass-ups',
+                              title=f'Yearly {label} Pass-ups'))
+
+    # Plot the day of week figures
+    figures.append(FigureSpec(f'{kind}_by_day_of_week', [(results[f'{kind}_by_dayofweek'], {'kind': 'bar'})],
+                              xticklabels=WEEKDAYS, xlabel='Day of week',
+                              ylabel='Number of Pass-ups',
+                              title=f'{label} Pass-ups by Day of Week'))
+
+    # Plot the daily pass-ups
+    daily = results[f'daily_{kind}']
+    figures.append(FigureSpec(f'{kind}_daily', [(daily, {})],
+                              xlabel='Date', ylabel='Number of pass-ups',
+                              title=f'Daily {label} Pass-ups'))
+
+    # Sum and plot weekly pass-ups
+    days = results[f'{kind}_days']
+    figures.append(FigureSpec(f'{kind}_weekly', [(days.weekly(kind='period'), {})],
+                              xlabel='Date', ylabel='Number of pass-ups',
+                              title=f'Weekly {label} Pass-ups'))
+
+    # Create a 7-day rolling average for total daily pass-ups, and for 2015 only
+    figures.append(FigureSpec(f'{kind}_rolling', [(days.rolling(7), {})],
+                              ylabel='Number of pass-ups', xlabel='Date',
+                              title=f'7-day Rolling Average of {label} Pass-Ups'))
+    figures.append(FigureSpec(f'{kind}_rolling_2015', [(days.rolling(7, '2015', '2015'), {})],
+                              ylabel='Number of pass-ups', xlabel='Date',
+                              title=f'7-day Rolling Average of {label} Pass-Ups (2015)'))
+    return figures
+
+
+def figures(results):
+    """Describe the charts and maps."""
+    from winnipeg_data.boundary_store import LayerPlot
+
+    figures = time_figures(results, 'full_bus', 'Full Bus')
+    figures += time_figures(results, 'wheelchair', 'Wheelchair')
+
+    # Show the trend on the routes with the most pass-ups, as 7-day rolling
+    # averages and yearly totals
+    top_routes = results['by_route'].index[:5]
+    figures.append(FigureSpec('top_routes_rolling',
+                              [(results['route_days'].take(top_routes).rolling(7), {'linewidth': 0.8})],
+                              figsize=(12, 5), xlabel='Date', ylabel='Number of pass-ups',
+                              title='7-day Rolling Average of Pass-Ups on the Busiest Routes',
+                              calls=[('legend', (), {'loc': 'upper left', 'title': 'Route'})]))
+    figures.append(FigureSpec('top_routes_by_year',
+                              [(results['by_route_and_year'][top_routes], {'kind': 'bar'})],
+                              xlabel='Year', ylabel='Number of pass-ups',
+                              title='Yearly Pass-Ups on the Busiest Routes',
+                              calls=[('legend', (), {'loc': 'upper left', 'title': 'Route'})]))
+
+    # Show where transit pass-ups happen in Winnipeg
+    # The pass-ups are binned into the pixels of each map and drawn as one
+    # image under the city boundary, rather than as a marker per pass-up
+    # (the boundary is simplified to the detail the figure needs)
+    locate_hotspots(results)
+    located, wpg_borders = results['located'], results['wpg_borders']
+    boundary = (LayerPlot(wpg_borders, outline=True), {'edgecolor': 'k'})
+    x, y, kind = located.x, located.y, located['Pass-Up Type']
+    full_bus = (kind == FULL_BUS).to_numpy()
+    wheelchair = (kind == WHEELCHAIR).to_numpy()
+    figures.append(FigureSpec('map_all', [boundary, (PointRaster(x, y), {})],
+                              axis_off=True, title='Winnipeg Transit Bus Pass-ups'))
+
+    # Show where full bus pass-ups happen
+    figures.append(FigureSpec('map_full_bus',
+                              [boundary, (PointRaster(x[full_bus], y[full_bus], color='r'), {})],
+                              axis_off=True, title='Full Bus Pass-ups'))
+
+    # Show where wheelchair pass-ups happen
+    figures.append(FigureSpec('map_wheelchair',
+                              [boundary, (PointRaster(x[wheelchair], y[wheelchair], color='r'), {})],
+                              axis_off=True, title='Wheelchair User Pass-ups'))
+
+    # Show both types of pass-ups on one map
+    # (each pixel gets the mix of the two colours of the pass-ups in it)
+    both_types = PointRaster(x, y, categories=kind, colors={FULL_BUS: 'b', WHEELCHAIR: 'r'})
+    legend_entries = [('scatter', ([], []), {'c': colour, 'label': label})
+                      for colour, label in zip(['r', 'b'], ['Wheelchair User', 'Full Bus'])]
+    figures.append(FigureSpec('map_both_types',
+                              [boundary, (both_types, {})],
+                              figsize=(10, 6), axis_off=True,
+                              calls=legend_entries + [('legend', (), {'frameon': False,
+                                                                       'title': 'Pass-up Type',
+                                                                       'loc': 'lower right',
+                                                                       'fontsize': 'small'})],
+                              title='Winnipeg Transit Pass-ups'))
+
+    # Show the places where pass-ups pile up, numbered from the most pass-ups
+    hotspots, hotspot_summary = results['hotspots'], results['hotspot_summary']
+    if len(hotspots):
+        centres = hotspots.geometry.representative_point()[:10]
+        labels = [('annotate', (str(rank),), {'xy': (point.x, point.y), 'fontsize': 'small'})
+                  for rank, point in centres.items()]
+        figures.append(FigureSpec('map_hotspots',
+                                  [boundary, (hotspots, {'column': 'Count', 'cmap': 'Reds', 'edgecolor': 'r',
+                                                         'linewidth': 1, 'legend': True})],
+                                  figsize=(10, 6), axis_off=True, calls=labels,
+                                  title='Winnipeg Transit Pass-up Hotspots'))
+
+        # Show the mix of pass-up types in the busiest hotspots
+        types = hotspot_summary.drop(columns=['Count', 'Locations', 'Area', 'Top Route'])[:10]
+        figures.append(FigureSpec('hotspots_by_type', [(types[::-1], {'kind': 'barh', 'stacked': True})],
+                                  xlabel='Number of pass-ups', ylabel='Hotspot',
+                                  title='Pass-ups in the Busiest Hotspots by Type',
+                                  calls=[('legend', (), {'loc': 'lower right', 'title': 'Pass-up Type'})]))
+    return figures
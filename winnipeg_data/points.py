@@ -0,0 +1,179 @@
+"""
+Compact tables of point locations (trees, pass-ups) with coded labels.
+
+A GeoDataFrame of the tree inventory keeps a shapely Point object for every
+tree, the coordinates again as Longitude/Latitude columns and every other
+column of the inventory, which comes to several hundred bytes a tree. A
+PointTable keeps only what the analyses use: the coordinates as two
+contiguous float arrays, each label column as small integer codes with its
+categories, and any numeric columns as they are; 20 to 30 bytes a point.
+
+Selecting a column gives a Series (categorical for the coded columns) over
+the same arrays, and selecting rows with a mask gives a smaller PointTable,
+so the groupby and plotting steps run on it as they did on the GeoDataFrame.
+The spatial steps (winnipeg_data.spatial_join, winnipeg_data.containment)
+work on the coordinate arrays directly, and shapely points are only made
+when they are asked for (geometry, to_geodataframe). Iterating gives a
+lightweight PointRow view of each point.
+"""
+import numpy as np
+import pandas as pd
+
+
+def code_dtype(n_categories):
+    """Get the smallest integer dtype that can hold codes for n categories (and -1)."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+class PointRow:
+    """A view of one point of a PointTable."""
+
+    __slots__ = ('table', 'position')
+
+    def __init__(self, table, position):
+        self.table = table
+        self.position = position
+
+    @property
+    def x(self):
+        return self.table.x[self.position]
+
+    @property
+    def y(self):
+        return self.table.y[self.position]
+
+    @property
+    def geometry(self):
+        import shapely
+        return shapely.Point(self.x, self.y)
+
+    def __getitem__(self, name):
+        return self.table.value(name, self.position)
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={self[name]!r}' for name in self.table.columns)
+        return f'PointRow(x={self.x}, y={self.y}, {fields})'
+
+
+class PointTable:
+    """Point coordinates with coded label columns and numeric columns."""
+
+    def __init__(self, x, y, codes=None, values=None, index=None, names=('Longitude', 'Latitude'),
+                 crs='EPSG:4326'):
+        self.x = np.ascontiguousarray(x)
+        self.y = np.ascontiguousarray(y)
+        # Name -> (integer codes, -1 for missing, and the categories)
+        self.codes = dict(codes or {})
+        # Name -> numeric array
+        self.values = dict(values or {})
+        self.index = pd.RangeIndex(len(self.x)) if index is None else pd.Index(index)
+        # Column names for the coordinates
+        self.names = tuple(names)
+        self.crs = crs
+
+    @classmethod
+    def from_frame(cls, frame, x, y, columns, dtype=np.float64, **kwargs):
+        """
+        Get the points of a DataFrame, keeping only the given columns.
+
+        Label columns (categorical or text) are stored as codes and numeric
+        columns as they are. The coordinates are stored as dtype (float32
+        halves their size, to within a metre in latitude/longitude).
+        """
+        codes, values = {}, {}
+        for name in columns:
+            column = frame[name]
+            if isinstance(column.dtype, pd.CategoricalDtype) or column.dtype == object:
+                categorical = column.astype('category').cat
+                codes[name] = (categorical.codes.to_numpy().astype(code_dtype(len(categorical.categories))),
+                               categorical.categories)
+            else:
+                values[name] = column.to_numpy()
+        return cls(np.asarray(x, dtype=dtype), np.asarray(y, dtype=dtype), codes, values,
+                   index=frame.index, **kwargs)
+
+    def __len__(self):
+        return len(self.x)
+
+    @property
+    def columns(self):
+        return list(self.codes) + list(self.values)
+
+    def column(self, name):
+        """Get a column as a Series (categorical for the coded columns)."""
+        if name in self.codes:
+            codes, categories = self.codes[name]
+            values = pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(categories))
+        elif name in self.values:
+            values = self.values[name]
+        elif name in self.names:
+            values = self.y if self.names.index(name) else self.x
+        else:
+            raise KeyError(name)
+        return pd.Series(values, index=self.index, name=name, copy=False)
+
+    def value(self, name, position):
+        """Get the value of a column for one point."""
+        if name in self.codes:
+            codes, categories = self.codes[name]
+            code = codes[position]
+            return categories[code] if code >= 0 else None
+        return self.values[name][position]
+
+    def take(self, rows):
+        """Get the points at the given positions (or where a boolean mask is True)."""
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        codes = {name: (codes[rows], categories) for name, (codes, categories) in self.codes.items()}
+        values = {name: values[rows] for name, values in self.values.items()}
+        return PointTable(self.x[rows], self.y[rows], codes, values, self.index[rows], self.names, self.crs)
+
+    def __getitem__(self, key):
+        """Get a column by name, or the points selected by a mask or positions."""
+        if isinstance(key, str):
+            return self.column(key)
+        return self.take(key)
+
+    def __iter__(self):
+        return (PointRow(self, position) for position in range(len(self)))
+
+    def row(self, position):
+        return PointRow(self, position)
+
+    def valid(self):
+        """Get a mask of the points with coordinates and no missing labels or values."""
+        valid = np.isfinite(self.x) & np.isfinite(self.y)
+        for codes, _ in self.codes.values():
+            valid &= codes >= 0
+        for values in self.values.values():
+            valid &= ~pd.isna(values)
+        return valid
+
+    def dropna(self):
+        """Leave out the points with missing coordinates, labels or values."""
+        return self.take(self.valid())
+
+    def geometry(self):
+        """Make the shapely points, as a GeoSeries (None for missing coordinates)."""
+        import geopandas as gpd
+        import shapely
+
+        points = shapely.points(self.x, self.y)
+        points[~(np.isfinite(self.x) & np.isfinite(self.y))] = None
+        return gpd.GeoSeries(points, index=self.index, crs=self.crs)
+
+    def to_geodataframe(self, geometry='geometry'):
+        """Make a GeoDataFrame of the points and columns."""
+        import geopandas as gpd
+
+        frame = pd.DataFrame({name: self.column(name) for name in self.columns}, index=self.index)
+        return gpd.GeoDataFrame(frame, geometry=self.geometry().rename(geometry))
+
+    def memory_usage(self):
+        """Get the number of bytes held by the table's arrays."""
+        arrays = [self.x, self.y] + [codes for codes, _ in self.codes.values()] + list(self.values.values())
+        return sum(array.nbytes for array in arrays) + self.index.memory_usage()
\ No newline at end of file
@@ -0,0 +1,110 @@
+"""
+Dense point maps drawn as a single image.
+
+Plotting hundreds of thousands of points with gdf.plot(markersize=0.05) makes
+a matplotlib artist for each one, so drawing time and memory grow with the
+number of points. A PointRaster is plotted instead as one image layer: when
+it is drawn, the points are binned with a bincount onto a pixel grid the size
+of the axes (at the figure's resolution), and the counts in each pixel
+(optionally per category) are turned into colours. Drawing then costs the
+same however many points there are.
+
+PointRaster has a .plot(ax=...) method, so it can be a FigureSpec layer. It
+takes the current axes limits as its extent, so it should come after the
+layer that sets the map's limits (e.g. the city boundary); the image is drawn
+under the other layers.
+"""
+import numpy as np
+
+
+def pixel_counts(x, y, extent, shape, codes=None, n_categories=1):
+    """
+    Count the points in each pixel of a grid, per category.
+
+    extent is (xmin, xmax, ymin, ymax) and shape is (rows, columns), with the
+    first row at ymin. codes gives each point's category (0 to
+    n_categories - 1, or -1 to leave it out). Returns an array of shape
+    (n_categories, rows, columns).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    xmin, xmax, ymin, ymax = extent
+    n_rows, n_columns = shape
+    with np.errstate(invalid='ignore'):
+        i = np.floor((x - xmin) / (xmax - xmin) * n_columns)
+        j = np.floor((y - ymin) / (ymax - ymin) * n_rows)
+    keep = (i >= 0) & (i < n_columns) & (j >= 0) & (j < n_rows)
+    if codes is None:
+        codes = np.zeros(len(x), dtype=np.intp)
+    codes = np.asarray(codes)
+    keep &= codes >= 0
+
+    pixel = (codes[keep]*n_rows + j[keep].astype(np.intp))*n_columns + i[keep].astype(np.intp)
+    counts = np.bincount(pixel, minlength=n_categories*n_rows*n_columns)
+    return counts.reshape(n_categories, n_rows, n_columns)
+
+
+class PointRaster:
+    """Points to draw as one image, binned to the pixels of the axes."""
+
+    def __init__(self, x, y, how='log', categories=None, colors=None, color='C0',
+                 cmap=None, min_alpha=0.4):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        # 'count' or 'log' (log(1 + count)) sets the colour scale
+        if how not in ('count', 'log'):
+            raise ValueError(f'Unknown aggregation {how!r}')
+        self.how = how
+        # With categories (one per point) and a colour for each category,
+        # each pixel gets the mix of its points' colours
+        if categories is None:
+            self.codes, self.colors = None, [color]
+        else:
+            self.codes = np.full(len(self.x), -1, dtype=np.intp)
+            for code, category in enumerate(colors):
+                self.codes[np.asarray(categories) == category] = code
+            self.colors = list(colors.values())
+        # With a colour map, pixels are coloured by their count instead, and
+        # otherwise busier pixels are more opaque
+        self.cmap = cmap
+        self.min_alpha = min_alpha
+
+    def scale(self, counts):
+        return np.log1p(counts) if self.how == 'log' else counts.astype(float)
+
+    def image(self, extent, shape):
+        """Get the RGBA image (rows, columns, 4) of the points over extent."""
+        from matplotlib import colormaps
+        from matplotlib.colors import Normalize, to_rgb
+
+        counts = pixel_counts(self.x, self.y, extent, shape, self.codes, len(self.colors))
+        total = counts.sum(axis=0)
+        empty = total == 0
+        values = self.scale(total)
+        level = values / values.max() if values.max() > 0 else values
+
+        if self.cmap is not None:
+            image = colormaps[self.cmap](Normalize(values[~empty].min(initial=0), values.max())(values))
+        else:
+            image = np.empty(total.shape + (4,))
+            colors = np.array([to_rgb(c) for c in self.colors])
+            with np.errstate(invalid='ignore', divide='ignore'):
+                image[..., :3] = np.tensordot(counts, colors, axes=(0, 0)) / total[..., None]
+            image[..., 3] = self.min_alpha + (1 - self.min_alpha)*level
+        image[empty] = 0
+        return image
+
+    def plot(self, ax, zorder=0, **kwargs):
+        """Draw the points on ax as one image covering the current axes limits."""
+        # Get the size of the axes in pixels (after fixing its aspect ratio)
+        ax.apply_aspect()
+        box = ax.get_window_extent()
+        shape = (max(1, int(round(box.height))), max(1, int(round(box.width))))
+
+        xlim, ylim = ax.get_xlim(), ax.get_ylim()
+        extent = (min(xlim), max(xlim), min(ylim), max(ylim))
+        ax.imshow(self.image(extent, shape), extent=extent, origin='lower',
+                  interpolation='nearest', aspect=ax.get_aspect(), zorder=zorder, **kwargs)
+        ax.set_xlim(xlim)
+        ax.set_ylim(ylim)
+        return ax
@@ -0,0 +1,144 @@
+"""
+Figure specs and headless, parallel rendering.
+
+Each figure is described by a FigureSpec: the data layers to plot (anything
+with a .plot(ax=...) method, e.g. a Series or GeoDataFrame), the axes
+settings (title, labels, ticks, limits) and any extra calls on the axes. The
+specs can either be drawn interactively, or rendered to PNG/SVG files by a
+pool of worker processes using the non-interactive Agg backend, with a
+manifest of what was written. Rendering the full report set is then bound by
+the number of cores rather than by drawing one figure after another.
+
+Set the WINNIPEG_DATA_FIGURES environment variable to a directory to make
+output_figures render there instead of showing the figures.
+
+On platforms that start worker processes by spawning (Windows, macOS),
+render_figures has to be called from under an `if __name__ == '__main__'`
+guard.
+"""
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+
+class FigureSpec:
+    """Everything needed to draw one figure."""
+
+    def __init__(self, name, layers, figsize=None, nrows=1, axis_off=False,
+                 calls=(), **settings):
+        # Used for the output file names
+        self.name = name
+        # A list of (data, plot kwargs) pairs, drawn in order. A 'panel'
+        # kwarg picks the subplot when nrows > 1.
+        self.layers = list(layers)
+        self.figsize = figsize
+        self.nrows = nrows
+        self.axis_off = axis_off
+        # Extra (method, args, kwargs) or (method, args, kwargs, panel) calls
+        # on the axes, made after the settings (on the last panel by default)
+        self.calls = list(calls)
+        # Axes settings, applied in order as ax.set_<name>(value) on the
+        # first panel (e.g. title='...', xticks=[...], ylim=[0, 30])
+        self.settings = settings
+
+    @property
+    def title(self):
+        return self.settings.get('title')
+
+    def draw(self):
+        """Draw the figure with pyplot and return it."""
+        import matplotlib.pyplot as plt
+
+        fig, axes = plt.subplots(self.nrows, figsize=self.figsize, squeeze=False)
+        axes = axes[:, 0]
+        for data, kwargs in self.layers:
+            kwargs = dict(kwargs)
+            ax = axes[kwargs.pop('panel', 0)]
+            data.plot(ax=ax, **kwargs)
+
+        for name, value in self.settings.items():
+            getattr(axes[0], f'set_{name}')(value)
+        if self.axis_off:
+            for ax in axes:
+                ax.axis('off')
+        for call in self.calls:
+            method, args, kwargs = call[:3]
+            ax = axes[call[3] if len(call) > 3 else -1]
+            getattr(ax, method)(*args, **kwargs)
+        return fig
+
+
+def init_worker():
+    """Set up a worker process for headless rendering."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import seaborn as sns
+    sns.set()
+
+
+def render_figure(spec, directory, formats=('png',), dpi=100):
+    """Draw one spec and save it in each format. Returns its manifest entry."""
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    fig = spec.draw()
+    files = []
+    for fmt in formats:
+        path = Path(directory) / f'{spec.name}.{fmt}'
+        fig.savefig(path, format=fmt, dpi=dpi)
+        files.append(path.name)
+    plt.close(fig)
+    return {'name': spec.name, 'title': spec.title, 'files': files,
+            'seconds': round(time.perf_counter() - start, 3)}
+
+
+def render_figures(specs, directory, formats=('png',), processes=None, dpi=100):
+    """
+    Render specs to files in a pool of worker processes (one per core if
+    processes is None or 0).
+
+    Writes manifest.json in the directory and returns its entries, in the
+    order of the specs.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    names = [spec.name for spec in specs]
+    if len(set(names)) != len(names):
+        raise ValueError('Figure spec names must be unique')
+
+    with ProcessPoolExecutor(max_workers=processes or None, initializer=init_worker) as pool:
+        futures = [pool.submit(render_figure, spec, directory, formats, dpi) for spec in specs]
+        entries = [f.result() for f in futures]
+
+    with open(directory / 'manifest.json', 'w') as f:
+        json.dump({'figures': entries}, f, indent=2)
+    return entries
+
+
+def show_figures(specs):
+    """Draw every spec in this process and show them."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    sns.set()
+
+    for spec in specs:
+        spec.draw()
+    plt.show()
+
+
+def output_figures(specs, subdirectory=None):
+    """
+    Show the figures, or render them if WINNIPEG_DATA_FIGURES is set.
+
+    When rendering, the files go in the given subdirectory of the output
+    directory.
+    """
+    directory = os.environ.get('WINNIPEG_DATA_FIGURES')
+    if not directory:
+        show_figures(specs)
+        return None
+    if subdirectory:
+        directory = Path(directory) / subdirectory
+    return render_figures(specs, directory)
@@ -0,0 +1,168 @@
+"""
+Typed schemas for the open data feeds used by the exploration scripts.
+
+Each schema declares the column types up front so the CSV parser doesn't have
+to guess: string dimensions become categoricals, dates are parsed with an
+explicit format, counts are stored as narrow integers, and unused columns are
+never read at all. Values that don't fit the declared type are reported
+instead of being silently turned into missing values.
+"""
+import hashlib
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Timestamp format used by the portal's CSV exports
+SOCRATA_TIMESTAMP = '%m/%d/%Y %I:%M:%S %p'
+
+# Timestamp format used by the portal's query API
+SODA_TIMESTAMP = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+class DatasetSchema:
+    """Column types for one portal dataset."""
+
+    def __init__(self, dataset_id, categories=(), integers=None, dates=None,
+                 drop=()):
+        self.dataset_id = dataset_id
+        self.categories = list(categories)
+        # Column name -> narrowest integer dtype that holds the values
+        self.integers = dict(integers or {})
+        # Column name -> strptime format
+        self.dates = dict(dates or {})
+        self.drop = set(drop)
+
+    def fingerprint(self):
+        """Get a short hash that changes whenever the schema does."""
+        text = repr((sorted(self.categories), sorted(self.integers.items()),
+                     sorted(self.dates.items()), sorted(self.drop)))
+        return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+    def csv_options(self, path):
+        """Get the read_csv options for a file, checking its header."""
+        header = pd.read_csv(path, nrows=0).columns
+        missing = [c for c in self.categories + list(self.integers) + list(self.dates)
+                   if c not in header]
+        if missing:
+            warnings.warn(f'{self.dataset_id}: declared columns not in the file: {missing}')
+
+        dtype = {c: 'category' for c in self.categories if c in header}
+        return {'usecols': lambda c: c not in self.drop, 'dtype': dtype}
+
+    def read_csv(self, path, **kwargs):
+        """Read a CSV file using this schema."""
+        frame = pd.read_csv(path, **self.csv_options(path), **kwargs)
+        return self.convert(frame)
+
+    def iter_csv(self, path, chunksize=100000, **kwargs):
+        """
+        Read a CSV file (or URL) using this schema, a chunk of rows at a time.
+
+        The categorical columns of each chunk only have the categories seen in
+        that chunk.
+        """
+        with pd.read_csv(path, chunksize=chunksize, **self.csv_options(path), **kwargs) as reader:
+            for chunk in reader:
+                yield self.convert(chunk)
+
+    def convert(self, frame, date_format=None):
+        """
+        Convert the columns of an already-read frame to the declared types.
+
+        date_format overrides the declared date formats, for rows that come
+        from a source with a different timestamp format.
+        """
+        frame = frame.drop(columns=[c for c in frame if c in self.drop])
+        for column in self.categories:
+            if column in frame and not isinstance(frame[column].dtype, pd.CategoricalDtype):
+                frame[column] = frame[column].astype('category')
+
+        errors = {}
+        for column, fmt in self.dates.items():
+            if column in frame:
+                frame[column], errors[column] = parse_dates(frame[column], date_format or fmt)
+        for column, int_dtype in self.integers.items():
+            if column in frame:
+                frame[column], errors[column] = parse_integers(frame[column], int_dtype)
+
+        errors = {c: rows for c, rows in errors.items() if len(rows)}
+        frame.attrs['parse_errors'] = {c: len(rows) for c, rows in errors.items()}
+        if errors:
+            details = ', '.join(f'{c}: {len(rows)} rows (e.g. {rows[:5].tolist()})'
+                                for c, rows in errors.items())
+            warnings.warn(f'{self.dataset_id}: values that failed to parse: {details}')
+        return frame
+
+
+def parse_dates(column, fmt):
+    """
+    Parse a column of dates with an explicit format.
+
+    Returns the parsed column and the row positions that failed to parse.
+    """
+    parsed = pd.to_datetime(column, format=fmt, errors='coerce')
+    failed = np.flatnonzero(parsed.isna().to_numpy() & column.notna().to_numpy())
+    return parsed, failed
+
+
+def parse_integers(column, dtype):
+    """
+    Parse a column of counts into a narrow integer dtype.
+
+    Columns with missing or fractional values are kept as float32 rather
+    than truncated. Returns the parsed column and the row positions that
+    failed to parse.
+    """
+    values = pd.to_numeric(column, errors='coerce')
+    failed = np.flatnonzero(values.isna().to_numpy() & column.notna().to_numpy())
+
+    if values.isna().any() or not (values == np.floor(values)).all():
+        return values.astype('float32'), failed
+    info = np.iinfo(dtype)
+    if len(values) and (values.min() < info.min or values.max() > info.max):
+        dtype = 'int64'
+    return values.astype(dtype), failed
+
+
+SCHEMAS = {
+    # Transit pass-ups
+    'mer2-irmb': DatasetSchema(
+        'mer2-irmb',
+        categories=['Pass-Up Type', 'Route Number', 'Route Name', 'Route Destination'],
+        dates={'Time': SOCRATA_TIMESTAMP},
+        drop=['Pass-Up ID'],
+    ),
+    # Library incidents
+    'ffe7-mwdv': DatasetSchema(
+        'ffe7-mwdv',
+        categories=['Location', 'Type', 'Serious'],
+        dates={'Date': SOCRATA_TIMESTAMP},
+        drop=['ID'],
+    ),
+    # Library people counts
+    'g3zt-s3kr': DatasetSchema(
+        'g3zt-s3kr',
+        categories=['Description'],
+        integers={'Count': 'int32', 'Days Open': 'int8'},
+        dates={'Week End Date': SOCRATA_TIMESTAMP},
+        drop=['ID'],
+    ),
+    # Tree inventory
+    'h923-dxid': DatasetSchema(
+        'h923-dxid',
+        categories=['common', 'ward', 'nbhd'],
+        integers={'dbh': 'int16'},
+        drop=['x', 'y', 'ded_tag_no', 'street', 'st_from', 'st_to'],
+    ),
+    # Ward boundaries
+    't4cg-yaxs': DatasetSchema(
+        't4cg-yaxs',
+        drop=['Councillor', 'Phone', 'Asst', 'AsstPhone', 'Community', 'Clerk',
+              'ClerkPhone', 'Website', 'Number'],
+    ),
+    # Neighbourhood boundaries
+    'xaux-29zr': DatasetSchema('xaux-29zr'),
+    # City of Winnipeg boundary
+    '2nyq-f444': DatasetSchema('2nyq-f444'),
+}
@@ -0,0 +1,374 @@
+"""
+A local query service for filtered, grouped counts of the datasets.
+
+The pass-ups, incidents, library counts and trees are loaded once, and each
+gets a DatasetIndex: for every dimension (route, pass-up type, library,
+incident type, ward, ...) the rows holding each value, as sorted row numbers,
+and the rows in time order. A query's filters pick out their rows from these
+lists (intersecting them, smallest first, and cutting time ranges out by
+binary search), so only the matching rows are ever touched; they are then
+grouped by dimensions or parts of the time (year, month, day of week, hour,
+date) with one np.unique. Answers are kept in an LRU cache, so asking again
+takes no work at all.
+
+The service speaks HTTP, on a TCP port or a Unix socket:
+
+    GET /datasets
+    GET /query/passups?route_name=Route 11&year=2019&by=hour
+    GET /query/incidents?location=Millennium&start=2019-02-27&by=type
+    GET /query/trees?ward=Daniel McIntyre&by=common
+
+Filters are column=value (repeat for several values), using the column's
+name or its lower_case_name; year, month (1-12), dayofweek (0 = Monday) and
+hour filter on the time, and start/end give a time range (end excluded;
+with a single year too, the time is in both ranges).
+by is a comma separated list of dimensions and time parts. The answer is
+JSON with one row per group: the group keys and the number of rows (and the
+sum and mean of the value column, for the trees' diameters and the library
+visitor counts).
+"""
+import functools
+import json
+import os
+import socket
+import sys
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+NS_PER_SECOND = 10**9
+SECONDS_PER_DAY = 86400
+NAT = np.iinfo(np.int64).min
+TIME_PARTS = ('year', 'month', 'dayofweek', 'hour', 'date')
+
+
+def load_passups():
+    from winnipeg_data import passups
+    return passups.load()[0].reset_index()
+
+
+def load_incidents():
+    from winnipeg_data import incidents
+    return incidents.load()[0].reset_index()
+
+
+def load_counts():
+    from winnipeg_data import counts
+    return counts.load().reset_index()
+
+
+def load_trees():
+    from winnipeg_data import trees
+    from winnipeg_data.cache import load_dataset
+    return load_dataset(trees.TREE_ID)
+
+
+# Name -> (loader, time column, dimensions, value column)
+DATASETS = {
+    'passups': (load_passups, 'Time', ['Pass-Up Type', 'Route Number', 'Route Name', 'Route Destination'], None),
+    'incidents': (load_incidents, 'Date', ['Location', 'Type', 'Serious'], None),
+    'counts': (load_counts, 'Week End Date', ['Library', 'Description'], 'Count'),
+    'trees': (load_trees, None, ['ward', 'nbhd', 'common'], 'dbh'),
+}
+
+
+def field_name(column):
+    """Get the lower_case_name of a column (e.g. 'Route Name' -> 'route_name')."""
+    from winnipeg_data.incremental import api_field_name
+    return api_field_name(column)
+
+
+def time_parts(ns, part):
+    """Get one part of int64 nanosecond timestamps."""
+    seconds = ns // NS_PER_SECOND
+    if part == 'hour':
+        return seconds % SECONDS_PER_DAY // 3600
+    if part == 'dayofweek':
+        # 1970-01-01 was a Thursday
+        return (seconds // SECONDS_PER_DAY + 3) % 7
+    months = ns.astype('datetime64[ns]').astype('datetime64[M]').astype(np.int64)
+    if part == 'month':
+        return months % 12 + 1
+    if part == 'year':
+        return months // 12 + 1970
+    # date: days since 1970-01-01
+    return seconds // SECONDS_PER_DAY
+
+
+class DatasetIndex:
+    """Row lists by dimension value and by time, for one dataset."""
+
+    def __init__(self, frame, dimensions, time=None, value=None):
+        self.rows = len(frame)
+        self.dimensions = list(dimensions)
+        self.time = time
+        self.value_name = value
+
+        # For each dimension, the rows sorted by value, and where each value's rows start
+        # (values are matched and reported as strings)
+        self.codes, self.labels, self.postings = {}, {}, {}
+        for column in self.dimensions:
+            codes, labels = pd.factorize(frame[column], sort=True)
+            order = np.argsort(codes, kind='stable')
+            starts = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+            self.codes[column] = codes
+            self.labels[column] = pd.Index(np.asarray(labels).astype(str))
+            self.postings[column] = (order, starts)
+
+        # The rows in time order (missing times are left out)
+        if time is not None:
+            times = pd.DatetimeIndex(frame[time])
+            self.ns = times.asi8
+            order = np.flatnonzero(~times.isna())
+            self.time_order = order[np.argsort(self.ns[order], kind='stable')]
+            self.sorted_ns = self.ns[self.time_order]
+        self.value = None if value is None else frame[value].to_numpy(dtype=float)
+
+    def column(self, name):
+        """Find a dimension by its name or lower_case_name."""
+        for column in self.dimensions:
+            if name in (column, field_name(column)):
+                return column
+        raise ValueError(f'Unknown dimension {name!r}')
+
+    def matching(self, column, values):
+        """Get the sorted rows holding any of the values in a dimension."""
+        order, starts = self.postings[column]
+        positions = self.labels[column].get_indexer(list(values))
+        runs = [order[starts[p]:starts[p + 1]] for p in positions if p >= 0]
+        if not runs:
+            return np.zeros(0, dtype=np.intp)
+        return runs[0] if len(runs) == 1 else np.sort(np.concatenate(runs))
+
+    def between(self, start, end):
+        """Get the sorted rows with a time in [start, end)."""
+        if self.time is None:
+            raise ValueError('This dataset has no time column')
+        first = 0 if start is None else np.searchsorted(self.sorted_ns, pd.Timestamp(start).value)
+        last = len(self.sorted_ns) if end is None else np.searchsorted(self.sorted_ns, pd.Timestamp(end).value)
+        return np.sort(self.time_order[first:last])
+
+    def select(self, filters, start=None, end=None):
+        """Get the sorted rows that pass every filter (None for all of them)."""
+        selections = [self.matching(column, values) for column, values in filters]
+        if start is not None or end is not None:
+            selections.append(self.between(start, end))
+        if not selections:
+            return None
+        selections.sort(key=len)
+        rows = selections[0]
+        for other in selections[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    def keys(self, name, rows):
+        """Get the group codes and labels of the rows for a dimension or time part."""
+        if name in TIME_PARTS:
+            if self.time is None:
+                raise ValueError('This dataset has no time column')
+            ns = self.ns if rows is None else self.ns[rows]
+            valid = ns != NAT
+            values, inverse = np.unique(time_parts(ns[valid], name), return_inverse=True)
+            codes = np.full(len(ns), -1, dtype=np.intp)
+            codes[valid] = inverse
+            if name == 'date':
+                values = [str(np.datetime64(int(v), 'D')) for v in values]
+            else:
+                values = [int(v) for v in values]
+            return codes, values
+        column = self.column(name)
+        codes = self.codes[column] if rows is None else self.codes[column][rows]
+        return codes, self.labels[column].tolist()
+
+    def group(self, rows, by):
+        """Count the rows (and sum their values) in each group. Returns (columns, rows)."""
+        n = self.rows if rows is None else len(rows)
+        level_codes, level_labels = [], []
+        for name in by:
+            codes, labels = self.keys(name, rows)
+            level_codes.append(codes)
+            level_labels.append(labels)
+
+        keep = np.ones(n, dtype=bool)
+        for codes in level_codes:
+            keep &= codes >= 0
+        if by:
+            combined = np.ravel_multi_index([c[keep] for c in level_codes],
+                                            [max(1, len(labels)) for labels in level_labels])
+        else:
+            combined = np.zeros(keep.sum(), dtype=np.intp)
+        groups, inverse, counts = np.unique(combined, return_inverse=True, return_counts=True)
+
+        columns = list(by) + ['count']
+        stats = [counts.tolist()]
+        if self.value is not None:
+            values = self.value if rows is None else self.value[rows]
+            values = values[keep]
+            valid = ~np.isnan(values)
+            sums = np.bincount(inverse[valid], values[valid], minlength=len(groups))
+            n_valid = np.bincount(inverse[valid], minlength=len(groups))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = sums / n_valid
+            columns += ['sum', 'mean']
+            stats += [sums.tolist(), [None if np.isnan(m) else m for m in means]]
+
+        if by:
+            positions = np.unravel_index(groups, [max(1, len(labels)) for labels in level_labels])
+            keys = [[labels[p] for p in level] for labels, level in zip(level_labels, positions)]
+        else:
+            keys = []
+        return columns, [list(row) for row in zip(*keys, *stats)]
+
+
+class QueryService:
+    """Loaded datasets, their indexes and an LRU cache of query results."""
+
+    def __init__(self, datasets=None, cache_size=1024):
+        self.indexes = {}
+        for name in datasets or DATASETS:
+            loader, time_column, dimensions, value = DATASETS[name]
+            self.indexes[name] = DatasetIndex(loader(), dimensions, time_column, value)
+        self.run = functools.lru_cache(maxsize=cache_size)(self.answer)
+
+    def describe(self):
+        """Describe the datasets, their dimensions and the cache."""
+        info = self.run.cache_info()
+        return {'datasets': {name: {'rows': index.rows, 'time': index.time, 'value': index.value_name,
+                                    'dimensions': {c: field_name(c) for c in index.dimensions}}
+                             for name, index in self.indexes.items()},
+                'cache': {'hits': info.hits, 'misses': info.misses, 'size': info.currsize}}
+
+    def parse(self, dataset, params):
+        """
+        Turn query parameters (name -> list of values) into a hashable query.
+
+        The filters and groupings are put in a standard order, so the same
+        query asked differently is answered from the cache.
+        """
+        if dataset not in self.indexes:
+            raise KeyError(dataset)
+        index = self.indexes[dataset]
+        filters, parts = {}, {}
+        # The time ranges asked for (start/end, and a single year), which are intersected
+        starts, ends = [], []
+        by = ()
+        for name, values in params.items():
+            if name == 'by':
+                by = tuple(b for value in values for b in value.split(',') if b)
+                for b in by:
+                    if b not in TIME_PARTS:
+                        index.column(b)
+            elif name == 'start':
+                starts.append(pd.Timestamp(values[-1]))
+            elif name == 'end':
+                ends.append(pd.Timestamp(values[-1]))
+            elif name == 'year' and len(values) == 1:
+                # A single year is a time range, which the time index can cut out
+                year = int(values[0])
+                starts.append(pd.Timestamp(year, 1, 1))
+                ends.append(pd.Timestamp(year + 1, 1, 1))
+            elif name in TIME_PARTS:
+                parts[name] = tuple(sorted(int(v) for v in values))
+            else:
+                filters[index.column(name)] = tuple(sorted(values))
+        start = str(max(starts)) if starts else None
+        end = str(min(ends)) if ends else None
+        return (dataset, tuple(sorted(filters.items())), tuple(sorted(parts.items())), start, end, by)
+
+    def answer(self, query):
+        """Work out the answer to a parsed query."""
+        dataset, filters, parts, start, end, by = query
+        index = self.indexes[dataset]
+        rows = index.select(filters, start, end)
+        for part, values in parts:
+            if index.time is None:
+                raise ValueError('This dataset has no time column')
+            # Other time parts are checked on the selected rows only
+            selected = np.arange(index.rows) if rows is None else rows
+            ns = index.ns[selected]
+            keep = (ns != NAT) & np.isin(time_parts(ns, part), values)
+            rows = selected[keep]
+        columns, groups = index.group(rows, by)
+        return {'dataset': dataset, 'columns': columns, 'rows': groups}
+
+    def query(self, dataset, params):
+        """Answer a query given as parameters, from the cache if it was asked before."""
+        hits = self.run.cache_info().hits
+        start = time.perf_counter()
+        result = dict(self.run(self.parse(dataset, params)))
+        result['cached'] = self.run.cache_info().hits > hits
+        result['seconds'] = round(time.perf_counter() - start, 6)
+        return result
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """Answers GET /datasets and GET /query/<dataset>?... with JSON."""
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        path = url.path.strip('/').split('/')
+        service = self.server.service
+        try:
+            if path == ['datasets']:
+                self.reply(200, service.describe())
+            elif len(path) == 2 and path[0] == 'query':
+                params = urllib.parse.parse_qs(url.query, keep_blank_values=True)
+                self.reply(200, service.query(path[1], params))
+            else:
+                self.reply(404, {'error': f'Unknown path {url.path}'})
+        except KeyError as e:
+            self.reply(404, {'error': f'Unknown dataset {e}'})
+        except ValueError as e:
+            self.reply(400, {'error': str(e)})
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'local'
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        self.socket.bind(self.server_address)
+        self.server_name, self.server_port = 'localhost', 0
+
+
+def make_server(service, port=8000, host='127.0.0.1', socket_path=None):
+    """Make an HTTP server for the service, on a TCP port or a Unix socket."""
+    if socket_path is not None:
+        server = UnixHTTPServer(socket_path, QueryHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.service = service
+    return server
+
+
+def serve(port=8000, host='127.0.0.1', socket_path=None, datasets=None, cache_size=1024):
+    """Load the datasets and answer queries until interrupted."""
+    service = QueryService(datasets, cache_size)
+    server = make_server(service, port, host, socket_path)
+    where = socket_path or f'http://{host}:{server.server_port}'
+    print(f'Answering queries on {where}', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path is not None:
+            os.unlink(socket_path)
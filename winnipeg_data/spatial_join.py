@@ -0,0 +1,50 @@
+"""
+Assign points to the polygons that contain them (e.g. trees to wards).
+
+The polygons go into an STRtree and the points are queried against it in
+bulk, a chunk at a time, so memory stays bounded however many points there
+are.
+"""
+import numpy as np
+import pandas as pd
+import shapely
+
+
+def points_in_polygons(x, y, polygons, chunk_size=250000):
+    """
+    Get the position of the polygon containing each point.
+
+    Points that no polygon contains (or with missing coordinates) get -1. If
+    polygons overlap, a point is assigned to one of them.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    polygons = np.asarray(polygons, dtype=object)
+    tree = shapely.STRtree(polygons)
+
+    assignment = np.full(len(x), -1, dtype=np.intp)
+    for start in range(0, len(x), chunk_size):
+        stop = start + chunk_size
+        rows = np.flatnonzero(np.isfinite(x[start:stop]) & np.isfinite(y[start:stop]))
+        points = shapely.points(x[start:stop][rows], y[start:stop][rows])
+        point_index, polygon_index = tree.query(points, predicate='within')
+        assignment[start + rows[point_index]] = polygon_index
+    return assignment
+
+
+def count_by_polygon(assignment, labels):
+    """
+    Count the points assigned to each polygon.
+
+    Returns a Series indexed by the polygon labels, sorted from most to fewest
+    points. Polygons with no points are included with a count of zero.
+    """
+    assignment = np.asarray(assignment)
+    counts = np.bincount(assignment[assignment >= 0], minlength=len(labels))
+    return label_counts(counts, labels)
+
+
+def label_counts(counts, labels):
+    """Label the point counts of each polygon and sort them, as count_by_polygon does."""
+    counts = pd.Series(counts, index=pd.Index(labels))
+    return counts.sort_values(ascending=False)
@@ -0,0 +1,116 @@
+"""
+Mergeable online aggregates, for reading large datasets a chunk at a time.
+
+GroupStats keeps, for every group (e.g. tree species), the number of rows,
+the count, mean and sum of squared deviations of a value (for the variance)
+and a fixed-bin histogram of it. Each chunk is summarized with a few
+bincounts and folded into the running totals with the pairwise form of
+Welford's update (Chan et al.), which is numerically stable and lets partial
+results from different chunks or processes be merged in any order. Memory
+depends on the number of groups and bins, not on the number of rows.
+"""
+import numpy as np
+import pandas as pd
+
+
+class GroupStats:
+    """Row counts, mean, variance and a histogram of a value for each group."""
+
+    def __init__(self, edges):
+        self.edges = np.asarray(edges, dtype=float)
+        self.labels = []
+        self.rows = {}
+        n_bins = len(self.edges) - 1
+        # Rows per group, including rows where the value is missing
+        self.size = np.zeros(0, dtype=np.int64)
+        # Rows per group with a value, and their mean and sum of squared deviations
+        self.count = np.zeros(0, dtype=np.int64)
+        self.mean = np.zeros(0)
+        self.m2 = np.zeros(0)
+        self.histogram = np.zeros((0, n_bins), dtype=np.int64)
+
+    def positions(self, labels):
+        """Get the position of each group label, adding any new ones."""
+        new = [label for label in labels if label not in self.rows]
+        for label in new:
+            self.rows[label] = len(self.labels)
+            self.labels.append(label)
+        if new:
+            n = len(new)
+            self.size = np.append(self.size, np.zeros(n, dtype=np.int64))
+            self.count = np.append(self.count, np.zeros(n, dtype=np.int64))
+            self.mean = np.append(self.mean, np.zeros(n))
+            self.m2 = np.append(self.m2, np.zeros(n))
+            self.histogram = np.vstack([self.histogram,
+                                        np.zeros((n, self.histogram.shape[1]), dtype=np.int64)])
+        return np.array([self.rows[label] for label in labels], dtype=np.intp)
+
+    def update(self, groups, values):
+        """Add a chunk of rows: a group label and a value (NaN if missing) for each."""
+        codes, labels = pd.factorize(pd.Series(groups), sort=False)
+        values = np.asarray(values, dtype=float)
+        n_groups = len(labels)
+        grouped = codes >= 0
+        size = np.bincount(codes[grouped], minlength=n_groups)
+
+        valid = grouped & ~np.isnan(values)
+        codes, values = codes[valid], values[valid]
+        count = np.bincount(codes, minlength=n_groups)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.bincount(codes, values, minlength=n_groups) / count
+        mean[count == 0] = 0
+        m2 = np.bincount(codes, (values - mean[codes])**2, minlength=n_groups)
+
+        # Fixed bins, like np.histogram: the last bin includes its right edge
+        # and values outside the edges aren't counted
+        n_bins = len(self.edges) - 1
+        bins = np.searchsorted(self.edges, values, side='right') - 1
+        bins[values == self.edges[-1]] = n_bins - 1
+        inside = (bins >= 0) & (bins < n_bins)
+        histogram = np.bincount(codes[inside]*n_bins + bins[inside], minlength=n_groups*n_bins)
+
+        self.combine(self.positions(list(labels)), size, count, mean, m2,
+                     histogram.reshape(n_groups, n_bins))
+        return self
+
+    def combine(self, rows, size, count, mean, m2, histogram):
+        """Fold in partial results for the groups at the given positions."""
+        total = self.count[rows] + count
+        delta = mean - self.mean[rows]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weight = np.where(total > 0, count / total, 0)
+        self.m2[rows] += m2 + delta**2 * self.count[rows] * weight
+        self.mean[rows] += delta * weight
+        self.count[rows] = total
+        self.size[rows] += size
+        self.histogram[rows] += histogram
+
+    def merge(self, other):
+        """Add another GroupStats (with the same bins) into this one."""
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError('Can only merge GroupStats with the same histogram bins')
+        self.combine(self.positions(other.labels), other.size, other.count,
+                     other.mean, other.m2, other.histogram)
+        return self
+
+    def frame(self):
+        """
+        Get the statistics as a DataFrame indexed by group (sorted).
+
+        The columns are the number of rows ('size'), the number with a value
+        ('count'), and the 'mean' and sample standard deviation ('std') of the
+        value, like groupby(...).agg(['size', 'count', 'mean', 'std']).
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt(self.m2 / (self.count - 1))
+        std[self.count < 2] = np.nan
+        mean = np.where(self.count > 0, self.mean, np.nan)
+        frame = pd.DataFrame({'size': self.size, 'count': self.count, 'mean': mean, 'std': std},
+                             index=pd.Index(self.labels))
+        return frame.sort_index()
+
+    def histograms(self):
+        """Get the histogram of each group as a DataFrame, one column per bin."""
+        columns = pd.IntervalIndex.from_breaks(self.edges, closed='left')
+        return pd.DataFrame(self.histogram, index=pd.Index(self.labels),
+                            columns=columns).sort_index()
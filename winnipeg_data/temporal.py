@@ -0,0 +1,198 @@
+"""
+Single-pass temporal breakdowns of event data (e.g. transit pass-ups).
+
+The timestamps are turned into integer keys (second of day, hour, month,
+year, day of week, day number) with plain integer arithmetic, and the counts
+for every breakdown and every category are filled by one bincount each. The
+results come back as Series shaped like the equivalent
+groupby(index.hour).size() or resample('D').size() calls, so they can be
+plotted the same way.
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from winnipeg_data.daily import DailyIndex
+
+NS_PER_SECOND = 10**9
+SECONDS_PER_DAY = 86400
+
+BREAKDOWNS = ('time', 'hour', 'month', 'year', 'dayofweek', 'day')
+
+
+class TemporalCounts:
+    """Event counts by time of day, hour, month, year, day of week and day."""
+
+    def __init__(self, times, categories=None):
+        times = pd.DatetimeIndex(times)
+        self.name = times.name
+        valid = ~times.isna()
+        ns = times.asi8[valid]
+
+        if categories is None:
+            codes = np.zeros(len(ns), dtype=np.intp)
+            self.categories = pd.Index([None])
+        else:
+            categories = pd.Categorical(categories)
+            codes = categories.codes[valid].astype(np.intp)
+            self.categories = categories.categories
+            # Rows without a category are left out
+            ns, codes = ns[codes >= 0], codes[codes >= 0]
+
+        seconds = ns // NS_PER_SECOND
+        days = seconds // SECONDS_PER_DAY
+        months = ns.astype('datetime64[ns]').astype('datetime64[M]').astype(np.int64)
+        self.first_year = int(months.min() // 12 + 1970) if len(months) else 1970
+        self.first_day = int(days.min()) if len(days) else 0
+
+        keys = {
+            'time': (seconds % SECONDS_PER_DAY, SECONDS_PER_DAY),
+            'hour': (seconds % SECONDS_PER_DAY // 3600, 24),
+            'month': (months % 12, 12),
+            'year': (months // 12 + 1970 - self.first_year, None),
+            # 1970-01-01 was a Thursday
+            'dayofweek': ((days + 3) % 7, 7),
+            'day': (days - self.first_day, None),
+        }
+
+        n_categories = len(self.categories)
+        self.tables = {}
+        for breakdown, (key, size) in keys.items():
+            if size is None:
+                size = int(key.max()) + 1 if len(key) else 0
+            counts = np.bincount(codes*size + key, minlength=n_categories*size)
+            self.tables[breakdown] = counts.reshape(n_categories, size)
+
+    def merge(self, other):
+        """
+        Add the counts from another TemporalCounts into this one.
+
+        This is how the stored counts are kept up to date when new events are
+        appended: only the new events need to be counted.
+        """
+        new = [c for c in other.categories if c not in self.categories]
+        categories = self.categories.append(pd.Index(new, dtype=self.categories.dtype))
+        rows_self = np.arange(len(self.categories))
+        rows_other = categories.get_indexer(other.categories)
+
+        starts = {'year': (self.first_year, other.first_year),
+                  'day': (self.first_day, other.first_day)}
+        for breakdown in BREAKDOWNS:
+            mine, theirs = self.tables[breakdown], other.tables[breakdown]
+            start_self = start_other = start = 0
+            size = max(mine.shape[1], theirs.shape[1])
+            if breakdown in starts:
+                start_self, start_other = starts[breakdown]
+                # Empty tables don't constrain the range
+                spans = [(s, t.shape[1]) for s, t in zip((start_self, start_other), (mine, theirs))
+                         if t.shape[1]]
+                start = min((s for s, _ in spans), default=0)
+                size = max((s + w for s, w in spans), default=0) - start
+
+            table = np.zeros((len(categories), size), dtype=np.int64)
+            offset = start_self - start
+            table[rows_self, offset:offset + mine.shape[1]] += mine
+            offset = start_other - start
+            table[rows_other[:, None], np.arange(offset, offset + theirs.shape[1])] += theirs
+            self.tables[breakdown] = table
+            if breakdown == 'year':
+                self.first_year = start
+            elif breakdown == 'day':
+                self.first_day = start
+        self.categories = categories
+        return self
+
+    def save(self, path):
+        """Store the counts in an .npz file."""
+        has_categories = not (len(self.categories) == 1 and self.categories[0] is None)
+        np.savez(path, categories=np.array(list(self.categories) if has_categories else [], dtype=str),
+                 has_categories=has_categories, name=str(self.name or ''),
+                 first_year=self.first_year, first_day=self.first_day,
+                 **{f'table_{b}': self.tables[b] for b in BREAKDOWNS})
+
+    @classmethod
+    def load(cls, path):
+        """Read counts stored with save."""
+        with np.load(path) as data:
+            counts = cls.__new__(cls)
+            counts.name = str(data['name']) or None
+            counts.categories = (pd.Index(data['categories'].tolist()) if data['has_categories']
+                                 else pd.Index([None]))
+            counts.first_year = int(data['first_year'])
+            counts.first_day = int(data['first_day'])
+            counts.tables = {b: data[f'table_{b}'] for b in BREAKDOWNS}
+        return counts
+
+    def counts(self, breakdown, category=None):
+        """Get the raw count array for a breakdown (all categories if None)."""
+        table = self.tables[breakdown]
+        if category is None:
+            return table.sum(axis=0)
+        return table[self.categories.get_loc(category)]
+
+    def daily(self, category=None):
+        """Get the daily counts as a DailyIndex, from the first to the last day with any events."""
+        return DailyIndex.from_counts(self.counts('day', category), self.first_day, self.name)
+
+    def get(self, breakdown, category=None):
+        """
+        Get the event counts for one breakdown as a Series.
+
+        Like groupby(...).size(), only the observed keys are included, except
+        for 'day' which (like resample('D').size()) covers every day between
+        the first and last event, including days with none.
+        """
+        if breakdown == 'day':
+            return self.daily(category).series()
+
+        counts = self.counts(breakdown, category)
+        keys = np.flatnonzero(counts)
+        values = counts[keys]
+        if breakdown == 'time':
+            keys = [datetime.time(k // 3600, k // 60 % 60, k % 60) for k in keys]
+            return pd.Series(values, index=pd.Index(keys, dtype=object))
+        if breakdown == 'month':
+            keys = keys + 1
+        elif breakdown == 'year':
+            keys = keys + self.first_year
+        return pd.Series(values, index=pd.Index(keys, name=self.name))
+
+
+def count_partition(rows, context):
+    """Count one partition of events (times as int64 nanoseconds, category codes)."""
+    times = pd.DatetimeIndex(rows['time'].view('datetime64[ns]'), name=context['name'])
+    categories = context['categories']
+    if categories is not None:
+        categories = pd.Categorical.from_codes(rows['category'], categories)
+    return TemporalCounts(times, categories)
+
+
+def count_events(times, categories=None, processes=None):
+    """
+    Get the TemporalCounts of events, counted a year at a time in parallel.
+
+    The events are partitioned by year, each partition is counted in a worker
+    process (see winnipeg_data.parallel) and the counts are merged. The
+    result is the same as TemporalCounts(times, categories).
+    """
+    from winnipeg_data.parallel import default_processes, run_partitioned, split
+
+    processes = processes or default_processes()
+    if processes == 1:
+        return TemporalCounts(times, categories)
+
+    times = pd.DatetimeIndex(times)
+    columns = {'time': times.asi8}
+    context = {'name': times.name, 'categories': None}
+    if categories is not None:
+        categories = pd.Categorical(categories)
+        columns['category'] = categories.codes
+        context['categories'] = categories.categories
+    order, partitions = split(len(times), processes, keys=times.year.fillna(0).to_numpy())
+    partials = run_partitioned(count_partition, columns, partitions, order, context, processes)
+
+    counts = partials[0]
+    for partial in partials[1:]:
+        counts.merge(partial)
+    return counts
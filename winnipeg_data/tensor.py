@@ -0,0 +1,160 @@
+"""
+Sparse count tensors of events over several categorical dimensions.
+
+The incident tables (by year and type, by year and library, by year, library
+and type, serious incidents by type, by month, ...) used to be separate
+groupby and pivot_table scans of the incidents. A CountTensor counts the
+events once, over every observed combination of all the dimensions (e.g.
+year, month, day of week, hour, library, type and seriousness): each event's
+codes are combined into one integer and the distinct ones are counted with a
+single np.unique. Only the combinations that occur are stored, as one code
+array per dimension and a count for each.
+
+Any of the tables is then a slice (select) and a sum over the other
+dimensions (marginal, table, mode) of the stored cells, with no further
+passes over the events; the number of cells is at most the number of events,
+and usually far smaller.
+
+A missing value in a dimension has its own code, so events with (say) no
+type still count towards the totals by library; like groupby(...,
+observed=True), a table leaves out the events missing any of the dimensions
+it is broken down by.
+"""
+import numpy as np
+import pandas as pd
+
+# The parts of the timestamps that can be dimensions
+TIME_PARTS = ('year', 'month', 'dayofweek', 'hour')
+
+
+class CountTensor:
+    """Event counts over the observed combinations of several dimensions."""
+
+    def __init__(self, levels, coords, counts):
+        # Dimension -> Index of its values; code len(level) means missing
+        self.levels = dict(levels)
+        # Dimension -> the code of each stored cell
+        self.coords = dict(coords)
+        self.counts = np.asarray(counts)
+
+    @classmethod
+    def from_events(cls, columns, times=None, time_parts=TIME_PARTS):
+        """
+        Count events by the given columns (name -> values) and parts of their times.
+
+        The time parts (e.g. 'year', 'hour') become dimensions with those
+        names, ahead of the columns.
+        """
+        levels, codes = {}, {}
+        if times is not None:
+            times = pd.DatetimeIndex(times)
+            missing = times.isna()
+            for part in time_parts:
+                values = np.asarray(getattr(times, part))
+                values = np.where(missing, 0, values).astype(np.int64)
+                first = values[~missing].min() if (~missing).any() else 0
+                last = values[~missing].max() if (~missing).any() else -1
+                levels[part] = pd.Index(np.arange(first, last + 1), name=part)
+                codes[part] = np.where(missing, len(levels[part]), values - first)
+        for name, values in columns.items():
+            categorical = pd.Categorical(values)
+            levels[name] = pd.CategoricalIndex(categorical.categories, categories=categorical.categories,
+                                               ordered=categorical.ordered, name=name)
+            codes[name] = np.where(categorical.codes < 0, len(levels[name]), categorical.codes)
+
+        # Combine the codes of each event into one integer and count them
+        sizes = [len(level) + 1 for level in levels.values()]
+        combined = np.ravel_multi_index(list(codes.values()), sizes)
+        cells, counts = np.unique(combined, return_counts=True)
+        coords = dict(zip(levels, np.unravel_index(cells, sizes)))
+        return cls(levels, coords, counts)
+
+    @property
+    def dims(self):
+        return list(self.levels)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def total(self):
+        return int(self.counts.sum())
+
+    def select(self, **conditions):
+        """
+        Get the cells with the given value (or any of a list of values) in each dimension.
+
+        e.g. select(Serious='Yes', year=range(2013, 2024))
+        """
+        keep = np.ones(len(self.counts), dtype=bool)
+        for dim, values in conditions.items():
+            if isinstance(values, (str, int, np.integer)) or not np.iterable(values):
+                values = [values]
+            positions = self.levels[dim].get_indexer(list(values))
+            keep &= np.isin(self.coords[dim], positions[positions >= 0])
+        return CountTensor(self.levels, {dim: coords[keep] for dim, coords in self.coords.items()},
+                           self.counts[keep])
+
+    def group(self, dims):
+        """
+        Combine the cells by their codes in dims, leaving out cells missing any of them.
+
+        Returns (keep, inverse, positions): the cells kept, the group of each
+        kept cell, and the codes of each group in each of dims.
+        """
+        keep = np.ones(len(self.counts), dtype=bool)
+        for dim in dims:
+            keep &= self.coords[dim] < len(self.levels[dim])
+        sizes = [len(self.levels[dim]) for dim in dims]
+        combined = np.ravel_multi_index([self.coords[dim][keep] for dim in dims], sizes)
+        groups, inverse = np.unique(combined, return_inverse=True)
+        return keep, inverse, np.unravel_index(groups, sizes)
+
+    def index(self, dims, positions):
+        """Label groups by their codes in dims."""
+        values = [self.levels[dim].take(p) for dim, p in zip(dims, positions)]
+        if len(dims) == 1:
+            return values[0]
+        return pd.MultiIndex.from_arrays(values, names=dims)
+
+    def marginal(self, *dims):
+        """
+        Get the counts by the given dimensions, summed over the others.
+
+        Like groupby(dims, observed=True).size(): only the observed
+        combinations are included, sorted by the dimensions' values.
+        """
+        if not dims:
+            return self.total()
+        keep, inverse, positions = self.group(dims)
+        counts = np.bincount(inverse, weights=self.counts[keep], minlength=len(positions[0]))
+        return pd.Series(counts.astype(np.int64), index=self.index(dims, positions))
+
+    def table(self, index, columns):
+        """
+        Get the counts with the index dimensions down the rows and the columns dimensions across.
+
+        Like pivot_table(index=..., columns=..., aggfunc='size',
+        observed=True).fillna(0).
+        """
+        index = [index] if isinstance(index, str) else list(index)
+        columns = [columns] if isinstance(columns, str) else list(columns)
+        counts = self.marginal(*index, *columns)
+        # (unstack leaves combinations first seen in later rows at the end)
+        table = counts.unstack(list(range(len(index), len(index) + len(columns)))).fillna(0)
+        return table.sort_index(axis=1)
+
+    def mode(self, groups, dim):
+        """
+        Get the most common value of dim in each group (the first one in category order, if tied).
+
+        Like grouping.group_mode: every observed group is included, even if
+        none of its events has a value for dim.
+        """
+        groups = [groups] if isinstance(groups, str) else list(groups)
+        keep, inverse, positions = self.group(groups)
+        values = self.coords[dim][keep]
+        counted = values < len(self.levels[dim])
+        table = np.zeros((len(positions[0]), len(self.levels[dim])), dtype=np.int64)
+        np.add.at(table, (inverse[counted], values[counted]), self.counts[keep][counted])
+        mode = np.asarray(self.levels[dim], dtype=object)[table.argmax(axis=1)]
+        return pd.Series(mode, index=self.index(groups, positions))
\ No newline at end of file
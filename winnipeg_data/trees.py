@@ -0,0 +1,446 @@
+"""
+The "Tree Inventory" analysis (dataset h923-dxid), in stages.
+
+load gets the trees and the ward and neighbourhood boundaries (all at once,
+see winnipeg_data.layers), summarize works out the tables, report prints them
+and figures describes the charts and maps (see winnipeg_data.render). The
+tree densities need the trees matched to the boundary polygons, so the
+boundaries are parsed with shapely and geopandas as they arrive; the
+bandwidth search and density map (scipy) only run for the figures.
+"""
+import numpy as np
+
+from winnipeg_data.grouping import top_n
+from winnipeg_data.layers import as_layer, load_all
+from winnipeg_data.memo import memoize
+from winnipeg_data.points import PointTable
+from winnipeg_data.raster import PointRaster
+from winnipeg_data.render import FigureSpec
+
+# Dataset ids on the open data portal
+TREE_ID = 'h923-dxid'
+WARD_ID = 't4cg-yaxs'
+NBHD_ID = 'xaux-29zr'
+
+# Reference layers the maps need: the city boundary (winnipeg_data.geometry)
+# The CLI starts fetching them in the background
+FIGURE_LAYERS = ('2nyq-f444',)
+
+# Histogram bins for the tree diameters (cm)
+DBH_EDGES = np.linspace(0, 125, 101)
+
+# The inventory columns the analysis keeps with the tree locations
+TREE_COLUMNS = ['common', 'ward', 'nbhd', 'dbh']
+
+
+def load():
+    """Load the trees and the ward and neighbourhood boundaries."""
+    # Load the trees dataset, and the ward and neighbourhood boundaries
+    # (we'll need these for calculating tree density) at the same time
+    # The 'x', 'y', 'ded_tag_no' and street columns of the trees and the
+    # councillor contact columns of the wards are never read
+    return load_all([TREE_ID], [WARD_ID, NBHD_ID])
+
+
+def load_boundaries():
+    """Load the ward and neighbourhood boundaries."""
+    # Both are fetched at once, and parsed once per process
+    return load_all([], [WARD_ID, NBHD_ID])
+
+
+def get_most_treed_nbhds(trees, by, n=5):
+    """Get the n-most treed neighbourhoods in each group of trees."""
+    keys = [trees[k] for k in by] if isinstance(by, list) else trees[by]
+    return top_n(keys, trees['nbhd'], n)
+
+
+def get_most_common_trees(trees, by, n=5):
+    """Get the top n tree species in each group of trees."""
+    keys = [trees[k] for k in by] if isinstance(by, list) else trees[by]
+    return top_n(keys, trees['common'], n)
+
+
+def boundaries(wards, nbhd):
+    """Convert the ward and neighbourhood boundaries to GeoDataFrames (latitude/longitude)."""
+    # (they already are if they came from load)
+    return as_layer(wards), as_layer(nbhd)
+
+
+def density_tables(results, wards, nbhd, trees_by_ward, trees_by_neighbourhood):
+    """Work out the tree density of each ward and neighbourhood, adding them to results."""
+    from winnipeg_data.boundary_store import PROJECTED, with_crs
+
+    # Switch to a projected crs for Manitoba (approximately), with the area of
+    # the neighbourhoods and wards (in square kilometres)
+    # Both are precomputed for the boundaries from the boundary store
+    nbhd = with_crs(nbhd, PROJECTED)
+    wards = with_crs(wards, PROJECTED)
+
+    # The wards from the tree inventory and the ward dataset match
+    # Merge the trees_by_ward data to the ward dataset
+    wards = wards.merge(trees_by_ward.rename('Number of trees'),
+                        left_on='Name', right_index=True)
+
+    # Add a column for the density of trees per ward
+    wards['Density'] = wards['Number of trees'].div(wards['Area'])
+
+    # Let's check if the city neighbourhood list matches the neighbourhood list
+    # from the tree inventory data
+    # The neighbourhoods in the tree inventory are in all caps. Change to lower case.
+    nbhd.Name = nbhd.Name.str.lower()
+    trees_by_neighbourhood.index = trees_by_neighbourhood.index.str.lower()
+
+    # Get the neighbourhoods in the tree inventory that aren't in the city neighbourhood list
+    results['unknown_nbhds'] = trees_by_neighbourhood[~trees_by_neighbourhood.index.isin(nbhd.Name)].index.to_list()
+
+    # Get the neighbourhoods in the city neighbourhood list that aren't in the tree inventory data
+    # (five aren't, unless the trees are assigned by geometry, which covers every neighbourhood)
+    results['missing_nbhds'] = nbhd[~nbhd.Name.isin(trees_by_neighbourhood.index)].Name.to_list()
+
+    # Merge the trees_by_neighbourhood data to the city neighbourhood dataset
+    nbhd = nbhd.merge(trees_by_neighbourhood.rename('Number of trees'),
+                      left_on='Name', right_index=True)
+
+    # Add a column for the density of trees per neighbourhood
+    nbhd['Density'] = nbhd['Number of trees'].div(nbhd['Area'])
+
+    # Get the top 10 most tree dense neighbourhoods
+    results['densest_nbhds'] = nbhd.sort_values(by='Density', ascending=False)[['Name', 'Density']][:10]
+
+    results.update(wards=wards, nbhd=nbhd, trees_by_ward=trees_by_ward,
+                   trees_by_neighbourhood=trees_by_neighbourhood)
+
+
+def tree_columns(points):
+    """
+    Get the tree columns the per-partition step needs as numpy arrays, from a PointTable.
+
+    Returns the columns (diameters, coordinates and the species, ward and
+    neighbourhood codes) and the labels for the codes.
+    """
+    columns = {'dbh': points.values['dbh'].astype(float),
+               'x': points.x.astype(float, copy=False), 'y': points.y.astype(float, copy=False)}
+    labels = {}
+    for name in ['common', 'ward', 'nbhd']:
+        columns[name], categories = points.codes[name]
+        labels[name] = categories.to_numpy(dtype=object)
+    return columns, labels
+
+
+def decode_labels(codes, labels):
+    """Get the label for each code (None for -1)."""
+    values = labels[codes]
+    values[codes < 0] = None
+    return values
+
+
+def partition_stats(rows, context):
+    """
+    Match one partition of trees to the wards and neighbourhoods and fold them into statistics.
+
+    Returns GroupStats of the diameters by species, ward and neighbourhood,
+    and the number of trees outside every ward and every neighbourhood.
+    """
+    from winnipeg_data.spatial_join import points_in_polygons
+    from winnipeg_data.streaming import GroupStats
+
+    edges, labels = context['edges'], context['labels']
+    by_species, by_ward, by_nbhd = GroupStats(edges), GroupStats(edges), GroupStats(edges)
+    dbh = rows['dbh']
+    by_species.update(decode_labels(rows['common'], labels['common']), dbh)
+
+    # Find the ward and neighbourhood polygons containing each tree (-1 if none)
+    ward_index = points_in_polygons(rows['x'], rows['y'], context['ward_polygons'])
+    nbhd_index = points_in_polygons(rows['x'], rows['y'], context['nbhd_polygons'])
+
+    # Group by polygon position (missing if outside them all), or by label
+    if context['assign_by_geometry']:
+        by_ward.update(np.where(ward_index >= 0, ward_index, np.nan), dbh)
+        by_nbhd.update(np.where(nbhd_index >= 0, nbhd_index, np.nan), dbh)
+    else:
+        by_ward.update(decode_labels(rows['ward'], labels['ward']), dbh)
+        by_nbhd.update(decode_labels(rows['nbhd'], labels['nbhd']), dbh)
+    return by_species, by_ward, by_nbhd, (ward_index < 0).sum(), (nbhd_index < 0).sum()
+
+
+def merge_stats(partials):
+    """Merge the results of partition_stats for several partitions."""
+    by_species, by_ward, by_nbhd, outside_wards, outside_nbhds = partials[0]
+    for species, ward, nbhd, outside_ward, outside_nbhd in partials[1:]:
+        by_species.merge(species)
+        by_ward.merge(ward)
+        by_nbhd.merge(nbhd)
+        outside_wards += outside_ward
+        outside_nbhds += outside_nbhd
+    return by_species, by_ward, by_nbhd, outside_wards, outside_nbhds
+
+
+def stats_tables(results, wards, nbhd, stats, assign_by_geometry=True):
+    """Work out the count, density and diameter tables from merged partition_stats, adding them to results."""
+    from winnipeg_data.spatial_join import label_counts
+
+    by_species, by_ward, by_nbhd, results['outside_wards'], results['outside_nbhds'] = stats
+    ward_stats, nbhd_stats = by_ward.frame(), by_nbhd.frame()
+    if assign_by_geometry:
+        # Get the number of trees per polygon, sorted, as count_by_polygon does
+        counts = np.zeros(len(wards), dtype=np.int64)
+        counts[ward_stats.index.astype(int)] = ward_stats['size']
+        trees_by_ward = label_counts(counts, wards['Name'])
+        counts = np.zeros(len(nbhd), dtype=np.int64)
+        counts[nbhd_stats.index.astype(int)] = nbhd_stats['size']
+        trees_by_neighbourhood = label_counts(counts, nbhd['Name'])
+
+        # Label the statistics with the polygon names
+        ward_stats.index = wards['Name'].to_numpy()[ward_stats.index.astype(int)]
+        nbhd_stats.index = nbhd['Name'].to_numpy()[nbhd_stats.index.astype(int)]
+    else:
+        trees_by_ward = ward_stats['size'].sort_values(ascending=False).rename_axis('ward')
+        trees_by_neighbourhood = nbhd_stats['size'].sort_values(ascending=False).rename_axis('nbhd')
+
+    # Get the tree density of each ward and neighbourhood
+    density_tables(results, wards, nbhd, trees_by_ward.rename(None), trees_by_neighbourhood.rename(None))
+
+    # Get the diameter statistics for each tree species, ward and neighbourhood
+    species_stats = by_species.frame()
+    results['tree_species_stats'] = species_stats[['mean', 'std']]
+    results['tree_species_by_mean_diameter'] = species_stats['mean'].sort_values(ascending=False)
+    results['tree_species_by_stddev'] = species_stats['std'].sort_values(ascending=False)
+    results['ward_stats'] = ward_stats
+    results['nbhd_stats'] = nbhd_stats
+
+    # Get the diameter histogram of each species
+    results['dbh_histograms'] = by_species.histograms()
+
+
+@memoize(ignore=('processes', 'partition_by'))
+def summarize(trees, wards, nbhd, assign_by_geometry=True, processes=None, partition_by=None):
+    """
+    Work out the tree tables. Returns a dict of them by name.
+
+    With assign_by_geometry, trees are counted by the ward/neighbourhood
+    polygon they fall in, rather than by the ward/neighbourhood labels in the
+    inventory.
+
+    The matching to polygons and the counts and diameter statistics are
+    worked out for partitions of the trees (row ranges, or the trees of each
+    value of the partition_by column, e.g. 'ward') in `processes` worker
+    processes, and merged (see winnipeg_data.parallel). The tables are kept
+    on disk and reused while the inputs are the same (see winnipeg_data.memo).
+    """
+    from winnipeg_data.geometry import decode_points
+    from winnipeg_data.parallel import default_processes, run_partitioned, split
+
+    results = {}
+
+    # Get the coordinates from the GPS data
+    # Invalid GPS data is left missing and counted
+    x, y, _, results['errors'] = decode_points(trees['the_geom'])
+
+    # Keep the tree locations (latitude/longitude) in a compact table with
+    # the species, ward and neighbourhood as codes, rather than a
+    # GeoDataFrame of shapely points
+    trees = PointTable.from_frame(trees, x, y, TREE_COLUMNS)
+
+    # Convert the neighbourhood and ward data to GeoDataFrames
+    # Set the crs to latitude/longitude
+    wards, nbhd = boundaries(wards, nbhd)
+
+    # Split the trees into partitions, find the ward and neighbourhood
+    # polygons containing the trees of each one and count them and work out
+    # their diameter statistics by species, ward and neighbourhood, then merge
+    # the partial results
+    columns, labels = tree_columns(trees)
+    context = {'edges': DBH_EDGES, 'labels': labels, 'assign_by_geometry': assign_by_geometry,
+               'ward_polygons': wards.geometry.to_numpy(), 'nbhd_polygons': nbhd.geometry.to_numpy()}
+    processes = processes or default_processes()
+    keys = columns[partition_by] if partition_by else None
+    order, partitions = split(len(trees), processes, keys)
+    stats = merge_stats(run_partitioned(partition_stats, columns, partitions, order, context, processes))
+
+    # Get the number of trees per ward and neighbourhood and their tree
+    # density, and the diameter statistics for each tree species
+    stats_tables(results, wards, nbhd, stats, assign_by_geometry)
+
+    # Get neighbourhoods with the most trees in each ward
+    # (every (ward, neighbourhood) pair is counted at once, and the top ones
+    # in each ward are picked with a single sort)
+    results['most_treed_neighbourhoods'] = get_most_treed_nbhds(trees, 'ward')
+
+    # Get most common tree type by ward
+    results['most_common_trees_by_ward'] = get_most_common_trees(trees, 'ward')
+
+    # Get most common tree type by ward and neighbourhood
+    results['most_common_trees_by_ward_neighbourhood'] = get_most_common_trees(trees, ['ward', 'nbhd'])
+
+    # Keep the trees for the maps (the table's coordinates are its
+    # 'Longitude' and 'Latitude' columns)
+    results['trees'] = trees
+    return results
+
+
+def stream(chunksize=100000, source=None, wards=None, nbhd=None, assign_by_geometry=True,
+           edges=DBH_EDGES):
+    """
+    Work out the tree counts and diameter statistics a chunk at a time.
+
+    The inventory CSV (by default, straight from the portal) is read
+    `chunksize` rows at a time and folded into running counts, means,
+    variances and diameter histograms per species, ward and neighbourhood
+    (see winnipeg_data.streaming), so memory use doesn't grow with the size
+    of the inventory. Returns the same tables as summarize where it can
+    (everything but the per-tree ones and the top-n rankings), plus the
+    diameter statistics and histograms by species, ward and neighbourhood.
+    """
+    from winnipeg_data.cache import dataset_url
+    from winnipeg_data.geometry import decode_points
+    from winnipeg_data.schemas import SCHEMAS
+
+    if wards is None or nbhd is None:
+        wards, nbhd = load_boundaries()
+    wards, nbhd = boundaries(wards, nbhd)
+    context = {'edges': edges, 'assign_by_geometry': assign_by_geometry,
+               'ward_polygons': wards.geometry.to_numpy(), 'nbhd_polygons': nbhd.geometry.to_numpy()}
+
+    # Each chunk is matched to the polygons and folded into running
+    # statistics, the same way as a partition in summarize
+    stats = None
+    results = {'errors': 0}
+    for chunk in SCHEMAS[TREE_ID].iter_csv(source or dataset_url(TREE_ID), chunksize):
+        x, y, _, errors = decode_points(chunk['the_geom'])
+        results['errors'] += errors
+        columns, context['labels'] = tree_columns(PointTable.from_frame(chunk, x, y, TREE_COLUMNS))
+        partial = partition_stats(columns, context)
+        stats = partial if stats is None else merge_stats([stats, partial])
+
+    # Get the number of trees per ward and neighbourhood and their tree
+    # density, and the diameter statistics for each tree species
+    stats_tables(results, wards, nbhd, stats, assign_by_geometry)
+    return results
+
+
+def report(results):
+    """Print the text summary."""
+    print(f"{results['errors']} tree locations could not be parsed")
+    print(f"{results['outside_wards']} trees are outside every ward")
+    print(f"{results['outside_nbhds']} trees are outside every neighbourhood")
+    print(results['unknown_nbhds'])
+    print(results['missing_nbhds'])
+    print(results['densest_nbhds'])
+
+
+@memoize
+def best_bandwidth(x, y, bandwidths):
+    """
+    Search the bandwidths for the best KDE of the points. Returns the best parameters.
+
+    The search is kept on disk and reused while the points are the same.
+    """
+    from winnipeg_data.bandwidth import select_bandwidth
+    return select_bandwidth(x, y, bandwidths).best_params_
+
+
+def density_grid(trees, wpg_borders, size=200):
+    """
+    Estimate the density of the tree locations on a grid over the city map.
+
+    Returns the grid coordinates (as from np.meshgrid) and the density.
+    """
+    from winnipeg_data.boundary_store import total_bounds
+    from winnipeg_data.kde import binned_kde
+
+    # Use kernel density estimation on the tree locations
+    # Search a range of bandwidths, scoring each by its leave-one-out likelihood
+    # on the binned tree locations (an exact 3-fold grid search over
+    # [0.0001, 0.0005, 0.001] took an hour on my PC and picked 0.0005)
+    bandwidths = np.geomspace(0.0001, 0.002, 25)
+    best_params = best_bandwidth(trees.x, trees.y, bandwidths)
+    print(best_params)
+
+    # Choose the best bandwidth
+    bandwidth = best_params['bandwidth']
+
+    # Use the limits for the city map (its bounds plus matplotlib's 5% margins)
+    xmin, ymin, xmax, ymax = total_bounds(wpg_borders)
+    xmin, xmax = xmin - 0.05*(xmax - xmin), xmax + 0.05*(xmax - xmin)
+    ymin, ymax = ymin - 0.05*(ymax - ymin), ymax + 0.05*(ymax - ymin)
+
+    # Create a set of points to predict the density
+    x = np.linspace(xmin, xmax, size)
+    y = np.linspace(ymin, ymax, size)
+    xx, yy = np.meshgrid(x, y)
+
+    # Get a set of density predictions
+    # The trees are binned and convolved with the kernel rather than evaluating
+    # the exact KDE at every grid point (see winnipeg_data.kde for the error bound)
+    pred = binned_kde(trees['Longitude'], trees['Latitude'], bandwidth, x, y)
+    return xx, yy, pred
+
+
+def figures(results):
+    """Describe the charts and maps."""
+    from winnipeg_data.boundary_store import LayerPlot
+    from winnipeg_data.geometry import load_boundary
+
+    figures = []
+    trees = results.get('trees')
+
+    # Plot the tree density over the ward map
+    # (the maps draw simplified boundaries, as detailed as the figure needs)
+    figures.append(FigureSpec('ward_density',
+                              [(LayerPlot(results['wards']), {'column': 'Density', 'legend': True, 'cmap': 'Greens'})],
+                              axis_off=True, title='Tree Density by Ward (km$^{-2}$)'))
+
+    # Plot the tree density over the neighbourhood map
+    figures.append(FigureSpec('neighbourhood_density',
+                              [(LayerPlot(results['nbhd']), {'column': 'Density', 'legend': True, 'cmap': 'Greens'})],
+                              axis_off=True, title='Tree Density by Neighbourhood (km$^{-2}$)'))
+
+    # Show the relationship between mean measured diameter and standard deviation
+    # in measured diameter
+    figures.append(FigureSpec('species_diameter_stats',
+                              [(results['tree_species_stats'],
+                                {'kind': 'scatter', 'x': 'mean', 'y': 'std', 'c': 'b'})],
+                              xlabel='Mean diameter (cm)',
+                              ylabel='Standard deviation in diameter (cm)',
+                              title='Mean and Standard Deviation in Measured Diameter by Tree Species'))
+
+    # Show the distribution of diameters for American Elm (e.g.)
+    # (when streaming, from the binned diameters)
+    if trees is None:
+        elm = results['dbh_histograms'].loc['American Elm']
+        layers = []
+        edges = np.append(elm.index.left, elm.index.right[-1])
+        calls = [('stairs', (elm.to_numpy(), edges), {'fill': True})]
+    else:
+        layers = [(trees[trees['common'] == 'American Elm']['dbh'],
+                   {'kind': 'hist', 'bins': 100, 'range': (0, 125)})]
+        calls = []
+    figures.append(FigureSpec('american_elm_diameters', layers, calls=calls,
+                              xlabel='Diameter (cm)', ylabel='Number of occurrences',
+                              title='Distribution of American Elm Diameters'))
+    if trees is None:
+        # The tree locations weren't kept
+        return figures
+
+    # Overlay the tree distribution on a city of Winnipeg boundary map
+    wpg_borders = load_boundary()
+
+    boundary = (LayerPlot(wpg_borders, outline=True), {'edgecolor': 'k'})
+
+    # Only the trees with a location can be mapped
+    # (the ones that couldn't be parsed are kept in the table with missing
+    # coordinates, and counted in the report)
+    trees = trees.take(np.isfinite(trees.x) & np.isfinite(trees.y))
+
+    # First, plot all individual trees
+    # (binned into the map's pixels and drawn as one image)
+    locations = PointRaster(trees['Longitude'], trees['Latitude'], color='g')
+    figures.append(FigureSpec('tree_locations', [boundary, (locations, {})], axis_off=True))
+
+    # Now, show the tree distribution
+    xx, yy, pred = density_grid(trees, wpg_borders)
+    levels = np.linspace(pred.min(), pred.max(), 100)
+    figures.append(FigureSpec('tree_density', [boundary], axis_off=True,
+                              calls=[('contourf', (xx, yy, pred),
+                                      {'alpha': 0.3, 'levels': levels, 'cmap': 'inferno'})]))
+    return figures